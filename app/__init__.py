@@ -8,9 +8,10 @@ from logging.handlers import RotatingFileHandler
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
+from app.db_routing import RoutingSession
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def create_app(config_class=Config):
     """
@@ -28,7 +29,10 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
     
     # Initialize extensions with app
-    db.init_app(app)
+    init_database(app)
+    
+    # Initialize application services
+    init_services(app)
     
     # Setup logging
     setup_logging(app)
@@ -45,11 +49,41 @@ def create_app(config_class=Config):
     # Register template filters
     register_filters(app)
     
+    # Register CLI commands
+    register_commands(app)
+    
     # Log startup
     app.logger.info('Educational Institute Website startup')
     
     return app
 
+def init_database(app):
+    """Create the primary and replica engines with pool sizing and SQLite tuning"""
+    from app.utils.database import configure_engine_options, init_sqlite_pragmas
+    from app.db_routing import configure_replicas
+    
+    configure_engine_options(app)
+    configure_replicas(app)
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            init_sqlite_pragmas(app, engine)
+
+def init_services(app):
+    """Initialize application services with the app"""
+    from app.services import (progress_buffer, fragment_cache, certificate_renderer, session_store,
+                              password_hasher)
+    from app.utils.query_profiles import init_lazy_load_detector
+    from app.utils.metrics import request_metrics
+    
+    progress_buffer.init_app(app)
+    fragment_cache.init_app(app)
+    init_lazy_load_detector(app)
+    request_metrics.init_app(app)
+    certificate_renderer.init_app(app)
+    session_store.init_app(app)
+    password_hasher.init_app(app)
+
 def setup_logging(app):
     """Configure application logging"""
     if not app.debug and not app.testing:
@@ -73,11 +107,28 @@ def setup_logging(app):
         app.logger.setLevel(logging.INFO)
         app.logger.info('Application startup')
 
+def _project_path(app, path):
+    """Absolute path, with relative paths taken from the project root rather than the working directory"""
+    return os.path.abspath(os.path.join(os.path.dirname(app.root_path), path))
+
 def create_directories(app):
     """Create necessary directories for uploads"""
+    static_folder = os.path.abspath(app.static_folder)
+    upload_folder = _project_path(app, app.config['UPLOAD_FOLDER'])
+    if os.path.commonpath([upload_folder, static_folder]) != static_folder:
+        # Thumbnails and certificates are linked by their URL under the static route
+        raise RuntimeError(f'UPLOAD_FOLDER {upload_folder} is not inside the static folder {static_folder}')
+    app.config['UPLOAD_FOLDER'] = upload_folder
+    
+    media_folder = _project_path(app, app.config.get('MEDIA_FOLDER') or os.path.join(app.instance_path, 'media'))
+    if os.path.commonpath([media_folder, static_folder]) == static_folder:
+        raise RuntimeError(f'MEDIA_FOLDER {media_folder} is inside the public static folder')
+    app.config['MEDIA_FOLDER'] = media_folder
+    
     directories = [
         app.config['UPLOAD_FOLDER'],
-        os.path.join(app.config['UPLOAD_FOLDER'], 'videos'),
+        os.path.join(media_folder, 'videos'),
+        os.path.join(media_folder, 'hls'),
         os.path.join(app.config['UPLOAD_FOLDER'], 'thumbnails'),
         os.path.join(app.config['UPLOAD_FOLDER'], 'certificates'),
         'logs'
@@ -94,7 +145,9 @@ def register_blueprints(app):
         faculty_bp,
         admin_bp,
         management_bp,
-        payment_bp
+        payment_bp,
+        media_bp,
+        search_bp
     )
     
     app.register_blueprint(auth_bp)
@@ -103,6 +156,8 @@ def register_blueprints(app):
     app.register_blueprint(admin_bp)
     app.register_blueprint(management_bp)
     app.register_blueprint(payment_bp)
+    app.register_blueprint(media_bp)
+    app.register_blueprint(search_bp)
     
     app.logger.info('Blueprints registered successfully')
 
@@ -117,7 +172,15 @@ def register_error_handlers(app):
 def register_filters(app):
     """Register custom Jinja2 filters"""
     from app.utils.filters import format_currency, time_ago, format_duration
+    from app.services import image_url
     
     app.jinja_env.filters['currency'] = format_currency
     app.jinja_env.filters['timeago'] = time_ago
     app.jinja_env.filters['duration'] = format_duration
+    app.jinja_env.filters['resized'] = image_url
+
+def register_commands(app):
+    """Register custom Flask CLI commands"""
+    from app.commands import register_commands as register_cli_commands
+    
+    register_cli_commands(app)
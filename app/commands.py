@@ -0,0 +1,162 @@
+"""
+CLI Commands
+Maintenance commands available through the flask CLI
+"""
+import click
+
+
+def register_commands(app):
+    """Attach maintenance commands to the app CLI"""
+    
+    @app.cli.command('reconcile-stats')
+    def reconcile_stats():
+        """Rebuild the dashboard statistics snapshot from the base tables"""
+        from app.services import reconcile_dashboard_stats
+        
+        stats = reconcile_dashboard_stats()
+        click.echo(f'Dashboard statistics reconciled at {stats.reconciled_at:%Y-%m-%d %H:%M:%S}')
+    
+    @app.cli.command('create-indexes')
+    def create_indexes():
+        """Add indexes declared on the models to an existing database"""
+        from app.services import ensure_indexes, ensure_search_index
+        
+        created = ensure_indexes()
+        if created:
+            click.echo(f'Created {len(created)} indexes: {", ".join(created)}')
+        else:
+            click.echo('All indexes already exist')
+        indexed = ensure_search_index()
+        if indexed:
+            click.echo(f'Created the search index with {indexed} documents')
+    
+    @app.cli.command('refresh-report-cube')
+    @click.option('--full', is_flag=True, help='Rebuild every month instead of refreshing from the watermarks')
+    def refresh_report_cube(full):
+        """Aggregate new enrollments, payments and tickets into the report cube"""
+        from app.services import refresh_report_cube
+        
+        state = refresh_report_cube(full=full)
+        click.echo(f'Report cube refreshed at {state.refreshed_at:%Y-%m-%d %H:%M:%S}')
+    
+    @app.cli.command('clear-fragment-cache')
+    def clear_fragment_cache():
+        """Drop every cached page fragment"""
+        from app.services import fragment_cache
+        
+        fragment_cache.clear()
+        click.echo('Fragment cache cleared')
+    
+    @app.cli.command('sweep-sessions')
+    def sweep_sessions():
+        """Delete expired server-side sessions"""
+        from app.services import session_store
+        
+        removed = session_store.sweep()
+        click.echo(f'Removed {removed} expired sessions')
+    
+    @app.cli.command('calibrate-password-hash')
+    @click.option('--target-ms', default=250, show_default=True, help='Desired time for one hash')
+    def calibrate_password_hash(target_ms):
+        """Suggest PASSWORD_HASH_ITERATIONS for this machine"""
+        from app.services import calibrate_iterations
+        
+        iterations, elapsed_ms = calibrate_iterations(target_ms)
+        click.echo(f'PASSWORD_HASH_ITERATIONS={iterations}  (about {elapsed_ms:.0f} ms per hash here, '
+                   f'currently {app.config["PASSWORD_HASH_ITERATIONS"]})')
+    
+    @app.cli.command('recompute-counters')
+    def recompute_counters():
+        """Add missing counter columns and recount course enrollments and videos"""
+        from app.services import ensure_columns, recompute_course_counters
+        
+        added = ensure_columns()
+        if added:
+            click.echo(f'Added columns: {", ".join(added)}')
+        drifted = recompute_course_counters()
+        click.echo(f'Corrected counters on {drifted} courses')
+    
+    @app.cli.command('purge-uploads')
+    @click.option('--hours', type=int, default=None, help='Idle hours before an unfinished upload is purged')
+    def purge_uploads(hours):
+        """Delete unfinished video uploads and their partial files"""
+        from app.services import purge_stale_uploads
+        
+        purged = purge_stale_uploads(hours)
+        click.echo(f'Purged {purged} stale uploads')
+    
+    @app.cli.command('transcode-worker')
+    @click.option('--workers', type=int, default=1, help='Number of worker processes')
+    @click.option('--once', is_flag=True, help='Exit when the queue is empty')
+    def transcode_worker(workers, once):
+        """Transcode queued videos into HLS renditions"""
+        from flask import current_app
+        from app.services import run_worker, run_worker_processes
+        
+        if workers > 1:
+            run_worker_processes(current_app._get_current_object(), workers, once=once)
+        else:
+            processed = run_worker(once=once)
+            click.echo(f'Processed {processed} transcode jobs')
+    
+    @app.cli.command('enqueue-transcodes')
+    def enqueue_transcodes():
+        """Queue uploaded videos that have not been transcoded yet"""
+        from app.services import enqueue_missing_transcodes
+        
+        queued = enqueue_missing_transcodes()
+        click.echo(f'Queued {queued} videos for transcoding')
+
+    @app.cli.command('move-private-media')
+    def move_private_media():
+        """Move uploaded videos and HLS renditions from the static folder to MEDIA_FOLDER"""
+        import os
+        import shutil
+
+        upload_root = os.path.abspath(app.config['UPLOAD_FOLDER'])
+        media_root = app.config['MEDIA_FOLDER']
+        moved = 0
+        for folder in ('videos', 'hls'):
+            source_dir = os.path.join(upload_root, folder)
+            if not os.path.isdir(source_dir):
+                continue
+            target_dir = os.path.join(media_root, folder)
+            os.makedirs(target_dir, exist_ok=True)
+            for name in os.listdir(source_dir):
+                target = os.path.join(target_dir, name)
+                if os.path.exists(target):
+                    click.echo(f'Skipped {folder}/{name}: already in {media_root}')
+                    continue
+                shutil.move(os.path.join(source_dir, name), target)
+                moved += 1
+            if not os.listdir(source_dir):
+                os.rmdir(source_dir)
+        click.echo(f'Moved {moved} entries to {media_root}')
+
+    @app.cli.command('issue-certificates')
+    def issue_certificates():
+        """Issue certificates for completed enrollments and render missing PDFs"""
+        from app.services import certificate_renderer
+        
+        rendered, failed = certificate_renderer.render_pending()
+        certificate_renderer.shutdown()
+        click.echo(f'Rendered {rendered} certificate PDFs ({failed} failed)')
+    
+    @app.cli.command('backfill-completion')
+    def backfill_completion():
+        """Recount completed videos per enrollment and issue certificates for finished courses"""
+        from app.services import backfill_completion, certificate_renderer
+        
+        corrected, finished = backfill_completion()
+        click.echo(f'Corrected {corrected} enrollments, {finished} newly completed')
+        rendered, failed = certificate_renderer.render_pending()
+        certificate_renderer.shutdown()
+        click.echo(f'Rendered {rendered} certificate PDFs ({failed} failed)')
+    
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Reindex every course and support ticket for full-text search"""
+        from app.services import rebuild_search_index
+        
+        indexed = rebuild_search_index()
+        click.echo(f'Indexed {indexed} search documents')
@@ -0,0 +1,127 @@
+"""
+Read Replica Routing
+Session that sends the queries of read-only requests to replica databases
+and everything else to the primary
+"""
+import logging
+import random
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.expression import FromClause, TextClause
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+READ_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+# Holds the time until which a client that just wrote reads from the primary
+STICKY_COOKIE = 'db_primary_until'
+
+
+def _is_read(clause):
+    """Whether a statement only reads and can safely run on a replica"""
+    if clause is None:
+        # A bare session.connection() may be used for anything
+        return False
+    if getattr(clause, 'is_select', False):
+        return getattr(clause, '_for_update_arg', None) is None
+    if isinstance(clause, TextClause):
+        words = clause.text.split(None, 1)
+        return bool(words) and words[0].upper() in ('SELECT', 'EXPLAIN')
+    return isinstance(clause, FromClause)
+
+
+def _read_only_request():
+    """Whether the current request may read from a replica"""
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    if g.get('_db_use_primary'):
+        return False
+    until = request.cookies.get(STICKY_COOKIE)
+    if until:
+        try:
+            return float(until) <= time.time()
+        except ValueError:
+            pass
+    return True
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from a replica during read-only requests
+
+    A session serves one request. Its queries go to one randomly chosen
+    replica while the request is a GET/HEAD/OPTIONS without use_primary and
+    no sticky-primary cookie. The first write (flush, DML, locking read or
+    raw connection) moves the session to the primary for the rest of its
+    life, so the request reads its own writes. Outside requests (CLI,
+    background threads) everything runs on the primary.
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._replica_key = None
+        self._on_primary = False
+
+    def use_primary(self):
+        """Run the rest of this session on the primary, for reads that feed writes"""
+        self._on_primary = True
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self._on_primary:
+            return engine
+        replicas = current_app.extensions.get('db_replicas')
+        if not replicas:
+            return engine
+        engines = self._db.engines
+        if engine is not engines.get(None):
+            return engine
+        if self._flushing or not _is_read(clause):
+            self._on_primary = True
+            return engine
+        if not _read_only_request():
+            return engine
+        if self._replica_key is None:
+            self._replica_key = random.choice(replicas)
+        return engines[self._replica_key]
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    """Flag the request so its client is pinned to the primary for a while"""
+    if session._on_primary and has_request_context():
+        g._db_wrote = True
+
+
+def configure_replicas(app):
+    """
+    Register each URL in SQLALCHEMY_REPLICA_URLS as an engine bind
+
+    Must run before db.init_app so the replicas get the same engine options
+    as the primary.
+    """
+    urls = app.config.get('SQLALCHEMY_REPLICA_URLS') or []
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    keys = []
+    for index, url in enumerate(urls):
+        key = f'{REPLICA_BIND_PREFIX}{index}'
+        binds[key] = url
+        keys.append(key)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['db_replicas'] = keys
+
+    if keys:
+        app.after_request(_set_sticky_cookie)
+        logger.info(f"Routing read-only requests to {len(keys)} replica(s)")
+
+
+def _set_sticky_cookie(response):
+    """Pin a client that just wrote to the primary until replicas catch up"""
+    if g.get('_db_wrote'):
+        window = current_app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
+        response.set_cookie(STICKY_COOKIE, str(time.time() + window), max_age=window,
+                            httponly=True, samesite='Lax',
+                            secure=current_app.config.get('SESSION_COOKIE_SECURE', False))
+    return response
@@ -6,16 +6,21 @@ Centralized imports for all database models
 # Import all models for easy access
 from app.models.user import User
 from app.models.course import Course
-from app.models.video import Video
+from app.models.video import Video, VideoUpload, TranscodeJob
 from app.models.enrollment import Enrollment, Payment, StudyHistory
 from app.models.schedule import OnlineClass, TodoItem
 from app.models.support import SupportTicket, TicketResponse, Certificate
+from app.models.stats import DashboardStats
+from app.models.report import ReportCube, ReportCubeState
+from app.models.media import ImageAsset
 
 # Export all models
 __all__ = [
     'User',
     'Course',
     'Video',
+    'VideoUpload',
+    'TranscodeJob',
     'Enrollment',
     'Payment',
     'StudyHistory',
@@ -23,5 +28,9 @@ __all__ = [
     'TodoItem',
     'SupportTicket',
     'TicketResponse',
-    'Certificate'
+    'Certificate',
+    'DashboardStats',
+    'ReportCube',
+    'ReportCubeState',
+    'ImageAsset'
 ]
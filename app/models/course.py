@@ -24,6 +24,10 @@ class Course(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Denormalized counters, kept in sync by app.services.course_counters
+    enrollment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    video_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     instructor = db.relationship('User', foreign_keys=[instructor_id], backref='courses_taught')
     videos = db.relationship('Video', backref='course', lazy='dynamic', cascade='all, delete-orphan')
@@ -33,16 +37,6 @@ class Course(db.Model):
     def __repr__(self):
         return f'<Course {self.title}>'
     
-    @property
-    def enrollment_count(self):
-        """Get total number of enrollments"""
-        return self.enrollments.count()
-    
-    @property
-    def video_count(self):
-        """Get total number of videos"""
-        return self.videos.count()
-    
     def to_dict(self):
         """Convert course object to dictionary"""
         return {
@@ -15,9 +15,19 @@ class Enrollment(db.Model):
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     enrollment_date = db.Column(db.DateTime, default=datetime.utcnow)
     completion_percentage = db.Column(db.Float, default=0.0)
+    # Videos of the course the student has completed; maintained by app.services.completion
+    completed_video_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     status = db.Column(db.String(20), default='active')  # active, completed, suspended
+    # Lets the report cube find older months whose enrollments changed
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('student_id', 'course_id', name='_student_course_uc'),)
+    # student_id lookups use the leading column of _student_course_uc
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'course_id', name='_student_course_uc'),
+        db.Index('ix_enrollment_course_id', 'course_id'),
+        db.Index('ix_enrollment_enrollment_date', 'enrollment_date'),
+        db.Index('ix_enrollment_updated_at', 'updated_at'),
+    )
     
     def __repr__(self):
         return f'<Enrollment Student:{self.student_id} Course:{self.course_id}>'
@@ -35,6 +45,13 @@ class Payment(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, completed, failed
     payment_date = db.Column(db.DateTime, default=datetime.utcnow)
     transaction_id = db.Column(db.String(100), unique=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_payment_status_payment_date', 'status', 'payment_date'),
+        db.Index('ix_payment_payment_date', 'payment_date'),
+        db.Index('ix_payment_updated_at', 'updated_at'),
+    )
     
     def __repr__(self):
         return f'<Payment {self.transaction_id}>'
@@ -53,5 +70,11 @@ class StudyHistory(db.Model):
     completed = db.Column(db.Boolean, default=False)
     last_watched = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # One history row per student and video; a unique index (rather than a
+    # table constraint) so it can be added to existing SQLite databases
+    __table_args__ = (
+        db.Index('uq_study_history_student_video', 'student_id', 'video_id', unique=True),
+    )
+    
     def __repr__(self):
         return f'<StudyHistory Student:{self.student_id} Video:{self.video_id}>'
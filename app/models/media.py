@@ -0,0 +1,21 @@
+"""
+Media Models
+Source images that resized derivatives are generated from
+"""
+from datetime import datetime
+from app import db
+
+
+class ImageAsset(db.Model):
+    """Content hash of an image URL, naming the derivatives generated from it"""
+    __tablename__ = 'image_asset'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source_url = db.Column(db.String(500), unique=True, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the source bytes
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow)  # when the source was last fetched
+    
+    def __repr__(self):
+        return f'<ImageAsset {self.source_url}>'
@@ -0,0 +1,52 @@
+"""
+Report Cube Models
+Pre-aggregated report facts by course, month and category
+"""
+from datetime import datetime
+from app import db
+
+
+class ReportCube(db.Model):
+    """
+    One cell of the report cube
+
+    Course rows carry enrollment, completion and revenue facts under the
+    course's category; ticket rows have no course and use the ticket category.
+    """
+    __tablename__ = 'report_cube'
+
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'))
+    month = db.Column(db.Date, nullable=False)  # first day of the month
+    category = db.Column(db.String(100), nullable=False)
+    enrollments = db.Column(db.Integer, nullable=False, default=0)
+    completed_enrollments = db.Column(db.Integer, nullable=False, default=0)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    tickets = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_report_cube_month', 'month'),
+        db.Index('ix_report_cube_course_id_month', 'course_id', 'month'),
+    )
+
+    def __repr__(self):
+        return f'<ReportCube Course:{self.course_id} {self.month} {self.category}>'
+
+
+class ReportCubeState(db.Model):
+    """Single-row refresh watermarks for the report cube"""
+    __tablename__ = 'report_cube_state'
+
+    SINGLETON_ID = 1
+
+    id = db.Column(db.Integer, primary_key=True)
+    enrollment_watermark = db.Column(db.DateTime)  # latest enrollment_date aggregated
+    payment_watermark = db.Column(db.DateTime)  # latest payment_date aggregated
+    ticket_watermark = db.Column(db.DateTime)  # latest ticket created_at aggregated
+    change_watermark = db.Column(db.DateTime)  # rows updated before this are aggregated
+    rebuilt_at = db.Column(db.DateTime)  # last full rebuild
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReportCubeState refreshed {self.refreshed_at}>'
@@ -20,6 +20,10 @@ class OnlineClass(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
+    __table_args__ = (
+        db.Index('ix_online_class_course_id_scheduled_at', 'course_id', 'scheduled_at'),
+    )
+    
     # Relationships
     course = db.relationship('Course', backref='online_classes')
     creator = db.relationship('User', backref='created_classes')
@@ -0,0 +1,44 @@
+"""
+DashboardStats Model
+Materialized counters for the admin and management dashboards
+"""
+from datetime import datetime
+from app import db
+
+
+class DashboardStats(db.Model):
+    """Single-row snapshot of dashboard totals, kept current by ORM hooks"""
+    __tablename__ = 'dashboard_stats'
+    
+    SINGLETON_ID = 1
+    
+    id = db.Column(db.Integer, primary_key=True)
+    total_users = db.Column(db.Integer, nullable=False, default=0)
+    total_students = db.Column(db.Integer, nullable=False, default=0)
+    total_faculty = db.Column(db.Integer, nullable=False, default=0)
+    total_courses = db.Column(db.Integer, nullable=False, default=0)
+    total_enrollments = db.Column(db.Integer, nullable=False, default=0)
+    total_revenue = db.Column(db.Float, nullable=False, default=0.0)
+    total_tickets = db.Column(db.Integer, nullable=False, default=0)
+    open_tickets = db.Column(db.Integer, nullable=False, default=0)
+    in_progress_tickets = db.Column(db.Integer, nullable=False, default=0)
+    closed_tickets = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DashboardStats reconciled {self.reconciled_at}>'
+    
+    def to_dict(self):
+        """Convert stats snapshot to dictionary"""
+        return {
+            'total_users': self.total_users,
+            'total_students': self.total_students,
+            'total_faculty': self.total_faculty,
+            'total_courses': self.total_courses,
+            'total_enrollments': self.total_enrollments,
+            'total_revenue': self.total_revenue,
+            'total_tickets': self.total_tickets,
+            'open_tickets': self.open_tickets,
+            'in_progress_tickets': self.in_progress_tickets,
+            'closed_tickets': self.closed_tickets
+        }
@@ -21,6 +21,11 @@ class SupportTicket(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_support_ticket_status_created_at', 'status', 'created_at'),
+        db.Index('ix_support_ticket_created_at', 'created_at'),
+    )
+    
     student = db.relationship('User', foreign_keys=[student_id], backref='submitted_tickets')
     assigned_user = db.relationship('User', foreign_keys=[assigned_to], backref='assigned_tickets')
     
@@ -56,7 +61,14 @@ class Certificate(db.Model):
     issue_date = db.Column(db.DateTime, default=datetime.utcnow)
     completion_date = db.Column(db.DateTime)
     grade = db.Column(db.String(10))  # A+, A, B+, B, C+, C
-    certificate_url = db.Column(db.String(500))
+    certificate_url = db.Column(db.String(500))  # static URL of the PDF once rendered
+    pdf_generated_at = db.Column(db.DateTime)
+    pdf_error = db.Column(db.String(500))
+    
+    __table_args__ = (
+        db.Index('uq_certificate_student_course', 'student_id', 'course_id', unique=True),
+        db.Index('ix_certificate_pdf_generated_at', 'pdf_generated_at'),
+    )
     
     # Relationships
     student = db.relationship('User', backref='certificates')
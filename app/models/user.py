@@ -17,7 +17,7 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False)  # student, admin, faculty, management
     full_name = db.Column(db.String(100), nullable=False)
     profile_picture = db.Column(db.String(300))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     is_active = db.Column(db.Boolean, default=True)
     
     # Relationships
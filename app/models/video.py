@@ -1,6 +1,6 @@
 """
-Video Model
-Handles video content and metadata
+Video Models
+Handles video content, metadata and uploads
 """
 from datetime import datetime
 from app import db
@@ -14,14 +14,119 @@ class Video(db.Model):
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     video_url = db.Column(db.String(300), nullable=False)
+    file_path = db.Column(db.String(300))  # relative to MEDIA_FOLDER for uploaded files
+    hls_path = db.Column(db.String(300))  # HLS master playlist relative to MEDIA_FOLDER, once transcoded
+    thumbnail_path = db.Column(db.String(300))  # relative to UPLOAD_FOLDER
     duration_minutes = db.Column(db.Integer)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     order = db.Column(db.Integer, default=0)
     is_free = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_video_course_id_order', 'course_id', 'order'),
+    )
+    
     # Relationships
-    study_histories = db.relationship('StudyHistory', backref='video', lazy='dynamic')
+    study_histories = db.relationship('StudyHistory', backref='video', lazy='dynamic',
+                                      cascade='all, delete-orphan')
+    transcode_jobs = db.relationship('TranscodeJob', backref='video', lazy='dynamic',
+                                     cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Video {self.title}>'
+
+
+class VideoUpload(db.Model):
+    """Resumable chunked upload of a video file, assembled before the Video row exists"""
+    __tablename__ = 'video_upload'
+    
+    STATUS_UPLOADING = 'uploading'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    upload_id = db.Column(db.String(32), unique=True, nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)  # original client filename
+    stored_filename = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    checksum = db.Column(db.String(64))  # expected SHA-256 hex digest, if supplied
+    status = db.Column(db.String(20), nullable=False, default=STATUS_UPLOADING)
+    error = db.Column(db.String(255))
+    
+    # Video details applied when the upload completes
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    duration_minutes = db.Column(db.Integer)
+    order = db.Column(db.Integer, default=0)
+    is_free = db.Column(db.Boolean, default=False)
+    
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    course = db.relationship('Course')
+    uploader = db.relationship('User')
+    # Deleting a video keeps its upload records and clears their video_id
+    video = db.relationship('Video', backref=db.backref('uploads', lazy='dynamic'))
+    
+    def __repr__(self):
+        return f'<VideoUpload {self.upload_id} {self.received_bytes}/{self.total_size}>'
+    
+    def to_dict(self):
+        """Convert upload state to dictionary"""
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'total_size': self.total_size,
+            'received_bytes': self.received_bytes,
+            'status': self.status,
+            'error': self.error,
+            'video_id': self.video_id
+        }
+
+
+class TranscodeJob(db.Model):
+    """Queued conversion of an uploaded video into HLS renditions, run by transcode workers"""
+    __tablename__ = 'transcode_job'
+    
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False)
+    status = db.Column(db.String(20), default=STATUS_QUEUED, nullable=False)
+    progress = db.Column(db.Integer, default=0, nullable=False)  # percent
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_transcode_job_status_id', 'status', 'id'),
+        db.Index('ix_transcode_job_video_id', 'video_id'),
+    )
+    
+    def to_dict(self):
+        """Convert job state to dictionary"""
+        return {
+            'id': self.id,
+            'video_id': self.video_id,
+            'status': self.status,
+            'progress': self.progress,
+            'attempts': self.attempts,
+            'error': self.error
+        }
+    
+    def __repr__(self):
+        return f'<TranscodeJob {self.id} video={self.video_id} {self.status}>'
@@ -9,6 +9,8 @@ from app.routes.faculty import bp as faculty_bp
 from app.routes.admin import bp as admin_bp
 from app.routes.management import bp as management_bp
 from app.routes.payment import bp as payment_bp
+from app.routes.media import bp as media_bp
+from app.routes.search import bp as search_bp
 
 __all__ = [
     'auth_bp',
@@ -16,5 +18,7 @@ __all__ = [
     'faculty_bp',
     'admin_bp',
     'management_bp',
-    'payment_bp'
+    'payment_bp',
+    'media_bp',
+    'search_bp'
 ]
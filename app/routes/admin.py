@@ -2,12 +2,16 @@
 Admin Routes Blueprint
 Handles administrative functionality
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort, jsonify
 from app import db
 from app.models import User, Course, Enrollment, Payment, Video, OnlineClass, SupportTicket
-from app.utils.decorators import login_required, admin_required
+from app.utils.decorators import login_required, admin_required, get_current_user
+from app.services import (get_dashboard_stats, get_revenue_series, export_response,
+                          get_report_summary, get_recent_payments, fragment_cache,
+                          certificate_renderer, count_pending_certificates, search_request,
+                          revoke_user_sessions, hash_password)
+from app.utils.pagination import paginate_request
+from app.utils.query_profiles import with_profile
 import logging
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -18,11 +22,12 @@ logger = logging.getLogger(__name__)
 def profile():
     """Admin profile page"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
+        snapshot = get_dashboard_stats()
         stats = {
-            'total_users': User.query.count(),
-            'total_courses': Course.query.count(),
-            'total_tickets': SupportTicket.query.count() if SupportTicket else 0
+            'total_users': snapshot.total_users,
+            'total_courses': snapshot.total_courses,
+            'total_tickets': snapshot.total_tickets
         }
         return render_template('shared/profile.html', user=user, stats=stats)
     except Exception as e:
@@ -35,54 +40,29 @@ def profile():
 def dashboard():
     """Admin dashboard with statistics"""
     try:
-        # Get counts
-        total_users = User.query.count()
-        total_students = User.query.filter_by(role='student').count()
-        total_faculty = User.query.filter_by(role='faculty').count()
-        total_courses = Course.query.count()
-        total_enrollments = Enrollment.query.count()
-        
-        # Calculate revenue
-        total_revenue = db.session.query(db.func.sum(Payment.amount_npr)).filter(
-            Payment.status == 'completed'
-        ).scalar() or 0
+        # Get counts and revenue from the materialized snapshot
+        stats = get_dashboard_stats()
         
         # Recent activity
         recent_enrollments = Enrollment.query.order_by(Enrollment.enrollment_date.desc()).limit(10).all()
         recent_payments = Payment.query.order_by(Payment.payment_date.desc()).limit(10).all()
         
-        # Monthly revenue (last 6 months)
-        monthly_revenue = []
-        for i in range(6):
-            start_date = datetime.utcnow().replace(day=1) - timedelta(days=30*i)
-            end_date = (start_date + timedelta(days=32)).replace(day=1)
-            
-            revenue = db.session.query(db.func.sum(Payment.amount_npr)).filter(
-                Payment.status == 'completed',
-                Payment.payment_date >= start_date,
-                Payment.payment_date < end_date
-            ).scalar() or 0
-            
-            monthly_revenue.append({
-                'month': start_date.strftime('%b %Y'),
-                'revenue': revenue
-            })
-        
-        monthly_revenue.reverse()
+        # Monthly revenue (last 6 calendar months)
+        monthly_revenue = get_revenue_series(6, 'month')
         
         # Get recent users for dashboard
         recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
         
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         
         return render_template('shared/dashboard.html',
                              user=user,
-                             total_users=total_users,
-                             total_students=total_students,
-                             total_faculty=total_faculty,
-                             total_courses=total_courses,
-                             total_enrollments=total_enrollments,
-                             total_revenue=total_revenue,
+                             total_users=stats.total_users,
+                             total_students=stats.total_students,
+                             total_faculty=stats.total_faculty,
+                             total_courses=stats.total_courses,
+                             total_enrollments=stats.total_enrollments,
+                             total_revenue=stats.total_revenue,
                              recent_users=recent_users,
                              recent_enrollments=recent_enrollments,
                              recent_payments=recent_payments,
@@ -99,12 +79,20 @@ def users():
     try:
         role_filter = request.args.get('role', 'all')
         
+        query = User.query
         if role_filter != 'all':
-            users_list = User.query.filter_by(role=role_filter).all()
-        else:
-            users_list = User.query.all()
+            query = query.filter_by(role=role_filter)
+        page = paginate_request(query, User.created_at, User.id)
         
-        return render_template('shared/users.html', users=users_list, role_filter=role_filter)
+        role_counts = dict(
+            db.session.query(User.role, db.func.count(User.id)).group_by(User.role).all()
+        )
+        
+        return render_template('shared/users.html',
+                             users=page.items,
+                             page=page,
+                             role_counts=role_counts,
+                             role_filter=role_filter)
     except Exception as e:
         logger.error(f"Admin users error: {str(e)}", exc_info=True)
         flash('An error occurred loading users.', 'danger')
@@ -135,7 +123,7 @@ def create_user():
                 flash('Email already exists.', 'danger')
                 return render_template('shared/create_user.html')
             
-            hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+            hashed_password = hash_password(password)
             new_user = User(
                 username=username,
                 email=email,
@@ -165,6 +153,7 @@ def toggle_user(user_id):
     try:
         user = User.query.get_or_404(user_id)
         user.is_active = not user.is_active
+        # Deactivating revokes the user's sessions on commit (services.session_store)
         db.session.commit()
         
         status = 'activated' if user.is_active else 'deactivated'
@@ -215,8 +204,9 @@ def delete_course(course_id):
 def enrollments():
     """View all enrollments"""
     try:
-        enrollments_list = Enrollment.query.order_by(Enrollment.enrollment_date.desc()).all()
-        return render_template('shared/enrollments.html', enrollments=enrollments_list)
+        page = paginate_request(with_profile(Enrollment.query, 'enrollment_list'),
+                                Enrollment.enrollment_date, Enrollment.id)
+        return render_template('shared/enrollments.html', enrollments=page.items, page=page)
     except Exception as e:
         logger.error(f"Admin enrollments error: {str(e)}", exc_info=True)
         flash('An error occurred loading enrollments.', 'danger')
@@ -227,40 +217,58 @@ def enrollments():
 def payments():
     """View all payments"""
     try:
-        payments_list = Payment.query.order_by(Payment.payment_date.desc()).all()
-        return render_template('shared/payments.html', payments=payments_list)
+        page = paginate_request(with_profile(Payment.query, 'payment_list'), Payment.payment_date, Payment.id)
+        return render_template('shared/payments.html', payments=page.items, page=page)
     except Exception as e:
         logger.error(f"Admin payments error: {str(e)}", exc_info=True)
         flash('An error occurred loading payments.', 'danger')
         return redirect(url_for('admin.dashboard'))
 
+@bp.route('/export/<kind>.<fmt>')
+@admin_required
+def export(kind, fmt):
+    """Stream payments, enrollments or study history as CSV or JSONL"""
+    response = export_response(kind, fmt, request.args)
+    if response is None:
+        abort(404)
+    logger.info(f"{session.get('username')} exported {kind} as {fmt}")
+    return response
+
+@bp.route('/cache-stats')
+@admin_required
+def cache_stats():
+    """Fragment cache hit/miss counters for this worker"""
+    return jsonify(fragment_cache.stats())
+
 @bp.route('/reports')
 @admin_required
 def reports():
     """View reports and analytics"""
     try:
-        # Course popularity
-        popular_courses = db.session.query(
-            Course, db.func.count(Enrollment.id).label('enrollment_count')
-        ).join(Enrollment).group_by(Course.id).order_by(
-            db.func.count(Enrollment.id).desc()
-        ).limit(10).all()
-        
-        # Revenue by course
-        revenue_by_course = db.session.query(
-            Course, db.func.sum(Payment.amount_npr).label('revenue')
-        ).join(Payment).filter(Payment.status == 'completed').group_by(
-            Course.id
-        ).order_by(db.func.sum(Payment.amount_npr).desc()).limit(10).all()
-        
         return render_template('shared/reports.html',
-                             popular_courses=popular_courses,
-                             revenue_by_course=revenue_by_course)
+                             report=get_report_summary(),
+                             recent_payments=get_recent_payments(),
+                             monthly_revenue=get_revenue_series(12, 'month'),
+                             pending_certificates=count_pending_certificates())
     except Exception as e:
         logger.error(f"Admin reports error: {str(e)}", exc_info=True)
         flash('An error occurred loading reports.', 'danger')
         return redirect(url_for('admin.dashboard'))
 
+@bp.route('/certificates/issue', methods=['POST'])
+@admin_required
+def issue_certificates():
+    """Issue and render certificates for every completed enrollment in the background"""
+    try:
+        pending = count_pending_certificates()
+        certificate_renderer.issue_all_pending()
+        logger.info(f"{session.get('username')} queued {pending} certificates")
+        flash(f'Issuing {pending} certificates in the background.', 'success')
+    except Exception as e:
+        logger.error(f"Issue certificates error: {str(e)}", exc_info=True)
+        flash('An error occurred issuing certificates.', 'danger')
+    return redirect(url_for('admin.reports'))
+
 @bp.route('/management')
 @admin_required
 def management():
@@ -296,14 +304,21 @@ def management_remove(user_id):
 @admin_required
 def support():
     """View all support tickets"""
-    tickets = SupportTicket.query.order_by(SupportTicket.created_at.desc()).all()
-    return render_template('shared/support.html', tickets=tickets)
+    query = with_profile(SupportTicket.query, 'ticket_list')
+    page = search_request('ticket', query)
+    if page is None:
+        page = paginate_request(query, SupportTicket.created_at, SupportTicket.id)
+    return render_template('shared/support.html',
+                          search_kind='ticket',
+                          tickets=page.items,
+                          page=page,
+                          ticket_stats=get_dashboard_stats())
 
 @bp.route('/support/<int:ticket_id>')
 @admin_required
 def support_detail(ticket_id):
     """View support ticket detail"""
-    ticket = SupportTicket.query.get_or_404(ticket_id)
+    ticket = with_profile(SupportTicket.query, 'ticket_detail').filter_by(id=ticket_id).first_or_404()
     return render_template('shared/support_detail.html', ticket=ticket)
 
 @bp.route('/support/<int:ticket_id>/respond', methods=['POST'])
@@ -358,7 +373,7 @@ def add_user():
                 flash('Email already exists.', 'danger')
                 return render_template('shared/add_user.html')
             
-            hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+            hashed_password = hash_password(password)
             new_user = User(
                 username=username,
                 email=email,
@@ -397,7 +412,7 @@ def edit_user(user_id):
             # Only update password if provided
             password = request.form.get('password', '').strip()
             if password:
-                edit_user.password = generate_password_hash(password, method='pbkdf2:sha256')
+                edit_user.password = hash_password(password)
             
             db.session.commit()
             
@@ -426,6 +441,7 @@ def delete_user(user_id):
         username = user.username
         db.session.delete(user)
         db.session.commit()
+        revoke_user_sessions(user_id)
         
         logger.info(f"Admin deleted user: {username}")
         flash(f'🗑️ User "{username}" deleted successfully!', 'success')
@@ -3,10 +3,11 @@ Authentication Routes Blueprint
 Handles login, logout, and registration
 """
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import User, Course
 from app.utils.helpers import validate_email, sanitize_string
+from app.services import fragment_cache, search_request, hash_password, verify_password, HashingBusy
 import logging
 
 bp = Blueprint('auth', __name__)
@@ -20,8 +21,21 @@ def index():
 @bp.route('/courses')
 def courses():
     """Public courses listing page"""
-    courses_list = Course.query.filter_by(is_active=True).all()
-    return render_template('courses.html', courses=courses_list)
+    published = Course.query.options(joinedload(Course.instructor)).filter_by(is_published=True)
+    page = search_request('course', published)
+    if page is not None:
+        # Search results depend on the query, so they bypass the fragment cache
+        catalog_html = render_template('_course_catalog.html', courses=page.items)
+        return render_template('courses.html', catalog_html=catalog_html, page=page, search_kind='course')
+    
+    def render_catalog():
+        courses_list = Course.query.options(joinedload(Course.instructor)).filter_by(is_published=True).all()
+        return render_template('_course_catalog.html', courses=courses_list)
+    
+    # The catalog only varies by whether the visitor is logged in
+    variant = 'auth' if session.get('user_id') else 'anon'
+    catalog_html = fragment_cache.get_or_render('catalog:public', variant, render_catalog)
+    return render_template('courses.html', catalog_html=catalog_html, search_kind='course')
 
 @bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -63,7 +77,7 @@ def register():
                 return render_template('register.html')
             
             # Create new user
-            hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+            hashed_password = hash_password(password)
             new_user = User(
                 username=username,
                 email=email,
@@ -79,6 +93,9 @@ def register():
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('auth.login'))
             
+        except HashingBusy:
+            flash('We are handling a lot of sign-ups right now. Please try again in a moment.', 'warning')
+            return render_template('register.html'), 503
         except Exception as e:
             db.session.rollback()
             logger.error(f"Registration error: {str(e)}", exc_info=True)
@@ -101,11 +118,19 @@ def login():
             
             user = User.query.filter_by(username=username).first()
             
-            if user and check_password_hash(user.password, password):
+            if user and verify_password(user, password):
                 if not user.is_active:
                     flash('Your account has been deactivated. Contact support.', 'danger')
                     return render_template('login.html')
                 
+                # Save a hash upgraded to the current cost
+                if db.session.is_modified(user):
+                    try:
+                        db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Password rehash error: {str(e)}", exc_info=True)
+                
                 # Set session
                 session['user_id'] = user.id
                 session['username'] = user.username
@@ -128,6 +153,9 @@ def login():
                 flash('Invalid username or password.', 'danger')
                 logger.warning(f"Failed login attempt for username: {username}")
                 
+        except HashingBusy:
+            flash('We are handling a lot of sign-ins right now. Please try again in a moment.', 'warning')
+            return render_template('login.html'), 503
         except Exception as e:
             logger.error(f"Login error: {str(e)}", exc_info=True)
             flash('An error occurred during login. Please try again.', 'danger')
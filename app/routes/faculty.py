@@ -2,13 +2,16 @@
 Faculty Routes Blueprint
 Handles instructor/teacher functionality
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, current_app
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from app import db
-from app.models import User, Course, Video, Enrollment, OnlineClass
-from app.utils.decorators import login_required, faculty_required
+from app.models import User, Course, Video, VideoUpload, Enrollment, OnlineClass
+from app.utils.decorators import login_required, faculty_required, get_current_user
 from app.utils.helpers import allowed_file, generate_unique_filename
+from app.utils.query_profiles import with_profile
+from app.services import (UploadError, start_upload, write_chunk, complete_upload, enqueue_transcode,
+                          get_latest_jobs)
 import logging
 import os
 
@@ -20,7 +23,7 @@ logger = logging.getLogger(__name__)
 def profile():
     """Faculty profile page"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         my_courses = Course.query.filter_by(instructor_id=user.id).all()
         total_students = sum(course.enrollment_count for course in my_courses)
         total_videos = sum(course.video_count for course in my_courses)
@@ -40,7 +43,7 @@ def profile():
 def support():
     """Faculty support tickets"""
     from app.models import SupportTicket
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     tickets = SupportTicket.query.filter_by(user_id=user.id).order_by(SupportTicket.created_at.desc()).all()
     return render_template('shared/support.html', tickets=tickets)
 
@@ -49,7 +52,7 @@ def support():
 def support_detail(ticket_id):
     """View support ticket detail"""
     from app.models import SupportTicket
-    ticket = SupportTicket.query.get_or_404(ticket_id)
+    ticket = with_profile(SupportTicket.query, 'ticket_detail').filter_by(id=ticket_id).first_or_404()
     return render_template('shared/support_detail.html', ticket=ticket)
 
 @bp.route('/support/<int:ticket_id>/respond', methods=['POST'])
@@ -79,7 +82,7 @@ def add_course():
 def dashboard():
     """Faculty dashboard"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         my_courses = Course.query.filter_by(instructor_id=user.id).all()
         
         # Calculate stats
@@ -103,7 +106,7 @@ def dashboard():
 def courses():
     """View my courses"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         my_courses = Course.query.filter_by(instructor_id=user.id).all()
         
         return render_template('shared/courses.html', courses=my_courses)
@@ -118,7 +121,7 @@ def create_course():
     """Create new course"""
     if request.method == 'POST':
         try:
-            user = User.query.get(session['user_id'])
+            user = get_current_user()
             
             title = request.form.get('title', '').strip()
             description = request.form.get('description', '').strip()
@@ -161,7 +164,7 @@ def course_detail(course_id):
     """View course details and manage content"""
     try:
         course = Course.query.get_or_404(course_id)
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         
         # Check ownership
         if course.instructor_id != user.id and user.role != 'admin':
@@ -170,22 +173,63 @@ def course_detail(course_id):
         
         videos = Video.query.filter_by(course_id=course_id).order_by(Video.order).all()
         enrollments = Enrollment.query.filter_by(course_id=course_id).all()
+        transcode_jobs = get_latest_jobs([video.id for video in videos if video.file_path])
         
         return render_template('shared/course_detail.html',
                              course=course,
                              videos=videos,
-                             enrollments=enrollments)
+                             enrollments=enrollments,
+                             transcode_jobs=transcode_jobs)
     except Exception as e:
         logger.error(f"Faculty course detail error: {str(e)}", exc_info=True)
         flash('An error occurred loading the course.', 'danger')
         return redirect(url_for('faculty.courses'))
 
+@bp.route('/course/<int:course_id>/transcode-status')
+@faculty_required
+def transcode_status(course_id):
+    """Latest transcode job of each uploaded video, polled by course_detail"""
+    course = Course.query.get_or_404(course_id)
+    user = get_current_user()
+    
+    if course.instructor_id != user.id and user.role != 'admin':
+        return jsonify({'success': False, 'error': 'You do not have permission to view this course.'}), 403
+    
+    video_ids = [video_id for (video_id,) in db.session.query(Video.id).filter(
+        Video.course_id == course_id, Video.file_path.isnot(None)
+    )]
+    jobs = get_latest_jobs(video_ids)
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs.values()]})
+
+@bp.route('/video/<int:video_id>/transcode', methods=['POST'])
+@faculty_required
+def retry_transcode(video_id):
+    """Queue an uploaded video for transcoding again"""
+    video = Video.query.get_or_404(video_id)
+    user = get_current_user()
+    
+    if video.course.instructor_id != user.id and user.role != 'admin':
+        flash('You do not have permission to modify this video.', 'danger')
+        return redirect(url_for('faculty.courses'))
+    
+    if not video.file_path:
+        flash('Only uploaded videos can be transcoded.', 'warning')
+    else:
+        try:
+            enqueue_transcode(video)
+            flash('Video queued for processing.', 'success')
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Retry transcode error: {str(e)}", exc_info=True)
+            flash('An error occurred queueing the video.', 'danger')
+    return redirect(url_for('faculty.course_detail', course_id=video.course_id))
+
 @bp.route('/course/<int:course_id>/add-video', methods=['GET', 'POST'])
 @faculty_required
 def add_video(course_id):
     """Add video to course"""
     course = Course.query.get_or_404(course_id)
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     
     # Check ownership
     if course.instructor_id != user.id and user.role != 'admin':
@@ -229,12 +273,115 @@ def add_video(course_id):
     
     return render_template('shared/add_video.html', course=course)
 
+@bp.route('/course/<int:course_id>/uploads', methods=['POST'])
+@faculty_required
+def start_video_upload(course_id):
+    """Start a resumable video upload (JSON: filename, size, title, optional sha256 and video details)"""
+    course = Course.query.get_or_404(course_id)
+    user = get_current_user()
+    
+    if course.instructor_id != user.id and user.role != 'admin':
+        return jsonify({'success': False, 'error': 'You do not have permission to modify this course.'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = start_upload(
+            course,
+            user,
+            filename=data.get('filename', ''),
+            total_size=data.get('size'),
+            title=(data.get('title') or '').strip(),
+            checksum=data.get('sha256'),
+            description=(data.get('description') or '').strip(),
+            duration_minutes=int(data.get('duration_minutes') or 0),
+            order=int(data.get('order') or 0),
+            is_free=bool(data.get('is_free'))
+        )
+        return jsonify({
+            'success': True,
+            'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+            **upload.to_dict()
+        }), 201
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid upload details.'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Start upload error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Could not start the upload.'}), 500
+
+def _get_own_upload(upload_id):
+    """Load an upload that belongs to the current user (admins may access any), or None"""
+    upload = VideoUpload.query.filter_by(upload_id=upload_id).first_or_404()
+    user = get_current_user()
+    if upload.uploader_id != user.id and user.role != 'admin':
+        return None
+    return upload
+
+UPLOAD_FORBIDDEN = {'success': False, 'error': 'You do not have permission to access this upload.'}
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+@faculty_required
+def video_upload_status(upload_id):
+    """Upload state, used by clients to resume from received_bytes"""
+    upload = _get_own_upload(upload_id)
+    if upload is None:
+        return jsonify(UPLOAD_FORBIDDEN), 403
+    return jsonify({'success': True, **upload.to_dict()})
+
+@bp.route('/uploads/<upload_id>', methods=['PUT'])
+@faculty_required
+def upload_video_chunk(upload_id):
+    """Append one chunk (raw request body) at ?offset=N"""
+    upload = _get_own_upload(upload_id)
+    if upload is None:
+        return jsonify(UPLOAD_FORBIDDEN), 403
+    try:
+        upload = write_chunk(
+            upload,
+            offset=request.args.get('offset', type=int),
+            stream=request.stream,
+            length=request.content_length,
+            chunk_checksum=request.headers.get('X-Chunk-SHA256')
+        )
+        return jsonify({'success': True, **upload.to_dict()})
+    except UploadError as e:
+        return jsonify({**upload.to_dict(), 'success': False, 'error': str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Upload chunk error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Could not store the chunk.'}), 500
+
+@bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@faculty_required
+def complete_video_upload(upload_id):
+    """Verify the assembled file and create the video"""
+    upload = _get_own_upload(upload_id)
+    if upload is None:
+        return jsonify(UPLOAD_FORBIDDEN), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        video = complete_upload(upload, checksum=data.get('sha256'))
+        logger.info(f"Faculty {get_current_user().username} uploaded video {video.id} to course {upload.course_id}")
+        return jsonify({
+            'success': True,
+            'video_id': video.id,
+            'redirect': url_for('faculty.course_detail', course_id=upload.course_id)
+        })
+    except UploadError as e:
+        return jsonify({**upload.to_dict(), 'success': False, 'error': str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Complete upload error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Could not complete the upload.'}), 500
+
 @bp.route('/course/<int:course_id>/edit', methods=['GET', 'POST'])
 @faculty_required
 def edit_course(course_id):
     """Edit course details"""
     course = Course.query.get_or_404(course_id)
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     
     # Check ownership
     if course.instructor_id != user.id and user.role != 'admin':
@@ -270,7 +417,7 @@ def delete_video(video_id):
     """Delete a video"""
     try:
         video = Video.query.get_or_404(video_id)
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         
         # Check ownership
         if video.course.instructor_id != user.id and user.role != 'admin':
@@ -295,20 +442,20 @@ def delete_video(video_id):
 def students():
     """View all enrolled students"""
     try:
-        user = User.query.get(session['user_id'])
-        my_courses = Course.query.filter_by(instructor_id=user.id).all()
+        user = get_current_user()
+        enrollments = with_profile(Enrollment.query, 'enrollment_list').join(
+            Course, Enrollment.course_id == Course.id
+        ).filter(Course.instructor_id == user.id).order_by(Course.id, Enrollment.id).all()
         
         students_data = {}
-        for course in my_courses:
-            enrollments = Enrollment.query.filter_by(course_id=course.id).all()
-            for enrollment in enrollments:
-                student = enrollment.student
-                if student.id not in students_data:
-                    students_data[student.id] = {
-                        'student': student,
-                        'courses': []
-                    }
-                students_data[student.id]['courses'].append(course.title)
+        for enrollment in enrollments:
+            student = enrollment.student
+            if student.id not in students_data:
+                students_data[student.id] = {
+                    'student': student,
+                    'courses': []
+                }
+            students_data[student.id]['courses'].append(enrollment.course.title)
         
         return render_template('shared/faculty_students.html', students_data=students_data.values())
     except Exception as e:
@@ -320,7 +467,7 @@ def students():
 @faculty_required
 def schedule_class():
     """Schedule an online class"""
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     my_courses = Course.query.filter_by(instructor_id=user.id).all()
     
     if request.method == 'POST':
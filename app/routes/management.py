@@ -2,11 +2,15 @@
 Management Routes Blueprint
 Handles management/support functionality
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort
 from datetime import datetime
 from app import db
 from app.models import User, SupportTicket, TicketResponse, Payment, Enrollment, Course
-from app.utils.decorators import login_required, management_required
+from app.utils.decorators import login_required, management_required, get_current_user
+from app.services import (get_dashboard_stats, get_revenue_series, export_response,
+                          get_report_summary, get_recent_payments, search_request)
+from app.utils.pagination import paginate_request
+from app.utils.query_profiles import with_profile
 import logging
 
 bp = Blueprint('management', __name__, url_prefix='/management')
@@ -17,11 +21,12 @@ logger = logging.getLogger(__name__)
 def profile():
     """Management profile page"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
+        snapshot = get_dashboard_stats()
         stats = {
-            'total_students': User.query.filter_by(role='student').count(),
-            'total_courses': Course.query.count(),
-            'total_tickets': SupportTicket.query.count()
+            'total_students': snapshot.total_students,
+            'total_courses': snapshot.total_courses,
+            'total_tickets': snapshot.total_tickets
         }
         return render_template('shared/profile.html', user=user, stats=stats)
     except Exception as e:
@@ -34,19 +39,11 @@ def profile():
 def dashboard():
     """Management dashboard"""
     try:
-        # Get statistics
-        total_students = User.query.filter_by(role='student').count()
-        total_faculty = User.query.filter_by(role='faculty').count()
-        total_courses = Course.query.count()
-        total_tickets = SupportTicket.query.count()
-        
-        # Get ticket statistics
-        open_tickets = SupportTicket.query.filter_by(status='open').count()
-        in_progress_tickets = SupportTicket.query.filter_by(status='in_progress').count()
-        closed_tickets = SupportTicket.query.filter_by(status='closed').count()
+        # Get user, course and ticket statistics from the materialized snapshot
+        stats = get_dashboard_stats()
         
         # Get my assigned tickets
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         my_tickets = SupportTicket.query.filter_by(assigned_to=user.id).all()
         
         # Recent tickets
@@ -61,16 +58,17 @@ def dashboard():
         
         return render_template('shared/dashboard.html',
                              user=user,
-                             total_students=total_students,
-                             total_faculty=total_faculty,
-                             total_courses=total_courses,
-                             total_tickets=total_tickets,
-                             open_tickets=open_tickets,
-                             in_progress_tickets=in_progress_tickets,
-                             closed_tickets=closed_tickets,
+                             total_students=stats.total_students,
+                             total_faculty=stats.total_faculty,
+                             total_courses=stats.total_courses,
+                             total_tickets=stats.total_tickets,
+                             open_tickets=stats.open_tickets,
+                             in_progress_tickets=stats.in_progress_tickets,
+                             closed_tickets=stats.closed_tickets,
                              my_tickets=my_tickets,
                              recent_tickets=recent_tickets,
-                             recent_enrollments=recent_enrollments)
+                             recent_enrollments=recent_enrollments,
+                             monthly_revenue=get_revenue_series(6, 'month'))
     except Exception as e:
         logger.error(f"Management dashboard error: {str(e)}", exc_info=True)
         flash('An error occurred loading the dashboard.', 'danger')
@@ -83,17 +81,17 @@ def tickets():
     try:
         status_filter = request.args.get('status', 'all')
         
+        query = with_profile(SupportTicket.query, 'ticket_list')
         if status_filter != 'all':
-            tickets_list = SupportTicket.query.filter_by(status=status_filter).order_by(
-                SupportTicket.created_at.desc()
-            ).all()
-        else:
-            tickets_list = SupportTicket.query.order_by(
-                SupportTicket.created_at.desc()
-            ).all()
+            query = query.filter_by(status=status_filter)
+        page = search_request('ticket', query)
+        if page is None:
+            page = paginate_request(query, SupportTicket.created_at, SupportTicket.id)
         
         return render_template('shared/tickets.html', 
-                             tickets=tickets_list, 
+                             search_kind='ticket',
+                             tickets=page.items, 
+                             page=page,
                              status_filter=status_filter)
     except Exception as e:
         logger.error(f"Management tickets error: {str(e)}", exc_info=True)
@@ -105,10 +103,8 @@ def tickets():
 def ticket_detail(ticket_id):
     """View ticket details and responses"""
     try:
-        ticket = SupportTicket.query.get_or_404(ticket_id)
-        responses = TicketResponse.query.filter_by(ticket_id=ticket_id).order_by(
-            TicketResponse.created_at
-        ).all()
+        ticket = with_profile(SupportTicket.query, 'ticket_detail').filter_by(id=ticket_id).first_or_404()
+        responses = sorted(ticket.responses, key=lambda r: (r.created_at is None, r.created_at))
         
         # Get available management users for assignment
         management_users = User.query.filter(
@@ -130,7 +126,7 @@ def respond_to_ticket(ticket_id):
     """Add response to ticket"""
     try:
         ticket = SupportTicket.query.get_or_404(ticket_id)
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         
         message = request.form.get('message', '').strip()
         if not message:
@@ -192,7 +188,7 @@ def assign_ticket(ticket_id):
 def payments():
     """View payment transactions"""
     try:
-        payments_list = Payment.query.order_by(Payment.payment_date.desc()).all()
+        page = paginate_request(with_profile(Payment.query, 'payment_list'), Payment.payment_date, Payment.id)
         
         # Calculate total revenue
         total_revenue = db.session.query(db.func.sum(Payment.amount_npr)).filter(
@@ -204,7 +200,8 @@ def payments():
         ).scalar() or 0
         
         return render_template('shared/payments.html',
-                             payments=payments_list,
+                             payments=page.items,
+                             page=page,
                              total_revenue=total_revenue,
                              pending_revenue=pending_revenue)
     except Exception as e:
@@ -217,9 +214,20 @@ def payments():
 def students():
     """View all students"""
     try:
-        students_list = User.query.filter_by(role='student').all()
+        # The student total is this page's headline figure
+        page = paginate_request(User.query.filter_by(role='student'), User.created_at, User.id, with_total=True)
         
-        return render_template('shared/students.html', students=students_list)
+        # One grouped count for the page instead of loading each student's enrollments
+        enrollment_counts = dict(db.session.query(
+            Enrollment.student_id, db.func.count(Enrollment.id)
+        ).filter(
+            Enrollment.student_id.in_([student.id for student in page.items])
+        ).group_by(Enrollment.student_id).all()) if page.items else {}
+        
+        return render_template('shared/students.html',
+                             students=page.items,
+                             page=page,
+                             enrollment_counts=enrollment_counts)
     except Exception as e:
         logger.error(f"Management students error: {str(e)}", exc_info=True)
         flash('An error occurred loading students.', 'danger')
@@ -232,15 +240,24 @@ def courses():
     courses_list = Course.query.all()
     return render_template('shared/courses.html', courses=courses_list)
 
+@bp.route('/export/<kind>.<fmt>')
+@management_required
+def export(kind, fmt):
+    """Stream payments, enrollments or study history as CSV or JSONL"""
+    response = export_response(kind, fmt, request.args)
+    if response is None:
+        abort(404)
+    logger.info(f"{session.get('username')} exported {kind} as {fmt}")
+    return response
+
 @bp.route('/reports')
 @management_required
 def reports():
     """Reports and analytics"""
-    courses = Course.query.all()
-    payments = Payment.query.filter_by(status='completed').all()
-    return render_template('shared/reports.html', 
-                          courses=courses,
-                          payments=payments)
+    return render_template('shared/reports.html',
+                          report=get_report_summary(),
+                          recent_payments=get_recent_payments(),
+                          monthly_revenue=get_revenue_series(12, 'month'))
 
 @bp.route('/support')
 @management_required
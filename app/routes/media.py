@@ -0,0 +1,51 @@
+"""
+Media Routes Blueprint
+Serves resized image derivatives
+"""
+from flask import Blueprint, request, redirect, url_for, send_from_directory, current_app, jsonify
+from werkzeug.exceptions import NotFound
+from app import db
+from app.utils.decorators import use_primary
+from app.services import IMAGE_PRESETS, resolve_derivative, verify_image_signature, derivative_folder
+import logging
+
+bp = Blueprint('media', __name__, url_prefix='/media')
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_MAX_AGE = 365 * 24 * 3600  # derivative names change with the source content
+
+@bp.route('/image/<preset>')
+@use_primary
+def image(preset):
+    """Redirect to a resized variant of ?src=, generating it on first request"""
+    src = request.args.get('src', '')
+    if preset not in IMAGE_PRESETS or not src or not verify_image_signature(src, preset, request.args.get('sig')):
+        return jsonify({'success': False, 'error': 'Invalid image request'}), 404
+
+    fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg'
+    try:
+        name = resolve_derivative(src, preset, fmt)
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Image derivative error for {src}: {str(e)}")
+        # Fall back to the original so the page still shows the image
+        response = redirect(src)
+        response.cache_control.max_age = 300
+        return response
+
+    response = redirect(url_for('media.derivative', filename=name))
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('IMAGE_SOURCE_TTL', 86400)
+    response.vary.add('Accept')
+    return response
+
+@bp.route('/d/<filename>')
+def derivative(filename):
+    """Serve a generated derivative with immutable caching"""
+    try:
+        response = send_from_directory(derivative_folder(), filename, max_age=DERIVATIVE_MAX_AGE)
+    except NotFound:
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -6,7 +6,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from datetime import datetime
 from app import db
 from app.models import User, Course, Payment, Enrollment
-from app.utils.decorators import login_required
+from app.utils.decorators import login_required, use_primary, get_current_user
 import logging
 
 bp = Blueprint('payment', __name__, url_prefix='/payment')
@@ -17,7 +17,7 @@ logger = logging.getLogger(__name__)
 def initiate(method, course_id):
     """Initiate payment process"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         course = Course.query.get_or_404(course_id)
         
         if method == 'esewa':
@@ -91,6 +91,7 @@ def initiate_khalti(user, course):
                          course=course)
 
 @bp.route('/esewa/success')
+@use_primary
 @login_required
 def esewa_success():
     """Handle eSewa payment success"""
@@ -108,7 +109,7 @@ def esewa_success():
             return redirect(url_for('student.courses'))
         
         course_id = payment_transaction['course_id']
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         course = Course.query.get_or_404(course_id)
         
         # Check if already enrolled
@@ -173,7 +174,7 @@ def khalti_verify():
             return {'success': False, 'message': 'Transaction not found'}, 400
         
         course_id = payment_transaction['course_id']
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         course = Course.query.get_or_404(course_id)
         
         # In production, verify with Khalti API here
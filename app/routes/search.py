@@ -0,0 +1,36 @@
+"""
+Search Routes Blueprint
+Autocomplete suggestions for the course and ticket search boxes
+"""
+from flask import Blueprint, request, jsonify
+from app import db
+from app.models import Course, SupportTicket
+from app.services import search_suggestions
+from app.utils.decorators import get_current_role
+import logging
+
+bp = Blueprint('search', __name__, url_prefix='/search')
+logger = logging.getLogger(__name__)
+
+@bp.route('/suggest/<kind>')
+def suggest(kind):
+    """Titles of the best matches for the typed prefix"""
+    if kind == 'course':
+        query = Course.query.filter(Course.is_published == True)
+    elif kind == 'ticket' and get_current_role() in ('admin', 'management'):
+        query = SupportTicket.query
+    else:
+        return jsonify({'success': False, 'error': 'Unknown search'}), 404
+
+    try:
+        suggestions = search_suggestions(kind, request.args.get('q', ''), query)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Search suggestion error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': 'Search failed'}), 500
+
+    response = jsonify({'success': True, 'suggestions': suggestions})
+    if kind == 'course':
+        response.cache_control.public = True
+        response.cache_control.max_age = 60
+    return response
@@ -2,12 +2,18 @@
 Student Routes Blueprint
 Handles all student-related functionality
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, current_app
 from datetime import datetime
+from werkzeug.utils import safe_join
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import User, Course, Video, Enrollment, Payment, StudyHistory, OnlineClass, TodoItem, Certificate, SupportTicket, TicketResponse
-from app.utils.decorators import login_required, student_required
+from app.utils.decorators import login_required, student_required, use_primary, get_current_user
+from app.utils.query_profiles import with_profile
+from app.utils.file_streaming import send_file_range
+from app.services import progress_buffer, fragment_cache, get_course_progress, get_watch_states, search_request
 import logging
+import os
 
 bp = Blueprint('student', __name__, url_prefix='/student')
 logger = logging.getLogger(__name__)
@@ -17,12 +23,16 @@ logger = logging.getLogger(__name__)
 def profile():
     """Student profile page"""
     try:
-        user = User.query.get(session['user_id'])
-        enrollments = Enrollment.query.filter_by(student_id=user.id).all()
+        user = get_current_user()
+        enrollments = Enrollment.query.options(
+            joinedload(Enrollment.course)
+        ).filter_by(student_id=user.id).all()
+        course_progress = get_course_progress(user.id)
         stats = {
             'enrolled_courses': len(enrollments),
+            'completed_courses': len([p for p in course_progress.values() if p['progress'] >= 100]),
             'certificates': Certificate.query.filter_by(student_id=user.id).count() if Certificate else 0,
-            'videos_watched': len(user.study_history.all()) if user.study_history else 0
+            'videos_watched': user.study_history.count()
         }
         return render_template('shared/profile.html', user=user, enrollments=enrollments, stats=stats)
     except Exception as e:
@@ -34,14 +44,14 @@ def profile():
 @login_required
 def settings():
     """Student settings page"""
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     return render_template('shared/settings.html', user=user, enrollments=[])
 
 @bp.route('/support')
 @login_required
 def support():
     """Student support tickets"""
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     tickets = SupportTicket.query.filter_by(user_id=user.id).order_by(SupportTicket.created_at.desc()).all()
     return render_template('shared/support.html', tickets=tickets)
 
@@ -50,7 +60,7 @@ def support():
 def support_new():
     """Create new support ticket"""
     if request.method == 'POST':
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         ticket = SupportTicket(
             user_id=user.id,
             subject=request.form.get('subject'),
@@ -67,7 +77,7 @@ def support_new():
 @login_required
 def support_detail(ticket_id):
     """View support ticket detail"""
-    ticket = SupportTicket.query.get_or_404(ticket_id)
+    ticket = with_profile(SupportTicket.query, 'ticket_detail').filter_by(id=ticket_id).first_or_404()
     return render_template('shared/support_detail.html', ticket=ticket)
 
 @bp.route('/support/<int:ticket_id>/respond', methods=['POST'])
@@ -90,13 +100,16 @@ def support_respond(ticket_id):
 def dashboard():
     """Student dashboard with overview"""
     try:
-        user = User.query.get(session['user_id'])
-        enrollments = Enrollment.query.filter_by(student_id=user.id).all()
+        user = get_current_user()
+        enrollments = Enrollment.query.options(
+            joinedload(Enrollment.course)
+        ).filter_by(student_id=user.id).all()
         payments = Payment.query.filter_by(student_id=user.id).order_by(Payment.payment_date.desc()).limit(5).all()
+        course_progress = get_course_progress(user.id)
         
         # Calculate statistics
         total_courses = len(enrollments)
-        completed_courses = len([e for e in enrollments if e.completion_percentage >= 100])
+        completed_courses = len([p for p in course_progress.values() if p['progress'] >= 100])
         in_progress = total_courses - completed_courses
         
         # Get recent activity
@@ -105,6 +118,7 @@ def dashboard():
         return render_template('shared/dashboard.html', 
                              user=user, 
                              enrollments=enrollments,
+                             course_progress=course_progress,
                              payments=payments,
                              total_payments=len(payments),
                              total_courses=total_courses,
@@ -121,14 +135,45 @@ def dashboard():
 def courses():
     """Browse available courses"""
     try:
-        user = User.query.get(session['user_id'])
-        enrolled_course_ids = [e.course_id for e in user.enrollments]
-        available_courses = Course.query.filter(
-            ~Course.id.in_(enrolled_course_ids),
-            Course.is_published == True
-        ).all()
+        user = get_current_user()
+        enrolled_course_ids = {course_id for (course_id,) in db.session.query(
+            Enrollment.course_id
+        ).filter_by(student_id=user.id).all()}
+        available = Course.query.filter(
+            Course.is_published == True,
+            ~Course.id.in_(enrolled_course_ids)
+        )
+        
+        if session.get('role') in ('admin', 'management'):
+            # The stats and table view read course fields, so these roles get Course objects
+            available = available.options(joinedload(Course.instructor))
+            page = search_request('course', available)
+            available_courses = page.items if page is not None else available.all()
+            return render_template('shared/courses.html', courses=available_courses,
+                                   page=page, search_kind='course')
+        
+        def render_cards():
+            published = Course.query.options(joinedload(Course.instructor)).filter(
+                Course.is_published == True
+            ).all()
+            return [
+                [course.id, render_template('shared/_course_card.html', course=course)]
+                for course in published
+            ]
+        
+        # Cards are rendered once for every published course and shared by all users of a role
+        cards = fragment_cache.get_or_render('catalog', f"cards:{session.get('role')}", render_cards)
+        
+        page = search_request('course', available)
+        if page is not None:
+            # Reuse the cached cards, in rank order
+            card_html = dict(cards)
+            available_cards = [card_html[course.id] for course in page.items if course.id in card_html]
+        else:
+            available_cards = [html for course_id, html in cards if course_id not in enrolled_course_ids]
         
-        return render_template('shared/courses.html', courses=available_courses)
+        return render_template('shared/courses.html', courses=available_cards, prerendered=True,
+                               page=page, search_kind='course')
     except Exception as e:
         logger.error(f"Courses list error: {str(e)}", exc_info=True)
         flash('An error occurred loading courses.', 'danger')
@@ -140,16 +185,12 @@ def course_detail(course_id):
     """View course details"""
     try:
         course = Course.query.get_or_404(course_id)
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         enrollment = Enrollment.query.filter_by(student_id=user.id, course_id=course_id).first()
         videos = Video.query.filter_by(course_id=course_id).order_by(Video.order).all()
         
-        # Get study progress for each video if enrolled
-        video_progress = {}
-        if enrollment:
-            for video in videos:
-                history = StudyHistory.query.filter_by(student_id=user.id, video_id=video.id).first()
-                video_progress[video.id] = history
+        # Get study progress for every video in one query if enrolled
+        video_progress = get_watch_states(user.id, course_id) if enrollment else {}
         
         return render_template('shared/course_detail.html', 
                              course=course, 
@@ -166,7 +207,7 @@ def course_detail(course_id):
 def enroll(course_id):
     """Enroll in a course"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         course = Course.query.get_or_404(course_id)
         
         # Check if already enrolled
@@ -212,12 +253,13 @@ def enroll(course_id):
         return redirect(url_for('student.courses'))
 
 @bp.route('/video/<int:video_id>')
+@use_primary
 @login_required
 def watch_video(video_id):
     """Watch a video"""
     try:
         video = Video.query.get_or_404(video_id)
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         
         # Check enrollment
         enrollment = Enrollment.query.filter_by(
@@ -250,12 +292,73 @@ def watch_video(video_id):
         flash('An error occurred loading the video.', 'danger')
         return redirect(url_for('student.dashboard'))
 
+HLS_MIMETYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t'
+}
+
+def _streamable_video(video_id):
+    """
+    Uploaded file paths of a video the current user may watch
+    
+    Same rule as watch_video (enrolled or free video), in one query since
+    players issue a request for every seek and segment.
+    
+    Returns:
+        tuple: (row with file_path and hls_path, None) or (None, error response)
+    """
+    enrolled = db.session.query(Enrollment.id).filter(
+        Enrollment.student_id == session['user_id'],
+        Enrollment.course_id == Video.course_id
+    ).exists()
+    row = db.session.query(
+        Video.file_path, Video.hls_path, Video.is_free, enrolled.label('is_enrolled')
+    ).filter(Video.id == video_id).first()
+    
+    if row is None or not row.file_path:
+        return None, (jsonify({'success': False, 'error': 'Video not found'}), 404)
+    if not row.is_enrolled and not row.is_free:
+        return None, (jsonify({'success': False, 'error': 'You need to enroll in this course first.'}), 403)
+    return row, None
+
+def _send_media(relative_path, mimetype=None):
+    """Serve a file below MEDIA_FOLDER with Range support, or a JSON 404"""
+    path = safe_join(current_app.config['MEDIA_FOLDER'], relative_path)
+    try:
+        return send_file_range(path, mimetype=mimetype, max_age=current_app.config['VIDEO_STREAM_MAX_AGE'])
+    except (OSError, TypeError):
+        logger.error(f"Stream video error: file {relative_path} is missing")
+        return jsonify({'success': False, 'error': 'Video file not found'}), 404
+
+@bp.route('/video/<int:video_id>/stream')
+@login_required
+def stream_video(video_id):
+    """Stream an uploaded video file with HTTP Range support"""
+    video, error = _streamable_video(video_id)
+    if error:
+        return error
+    return _send_media(video.file_path)
+
+@bp.route('/video/<int:video_id>/hls/<path:name>')
+@login_required
+def stream_hls(video_id, name):
+    """Serve the HLS playlists and segments of a transcoded video"""
+    video, error = _streamable_video(video_id)
+    if error:
+        return error
+    if not video.hls_path:
+        return jsonify({'success': False, 'error': 'Video has not been transcoded yet'}), 404
+    relative_path = safe_join(os.path.dirname(video.hls_path), name)
+    if relative_path is None:
+        return jsonify({'success': False, 'error': 'Video file not found'}), 404
+    return _send_media(relative_path, HLS_MIMETYPES.get(os.path.splitext(name)[1]))
+
 @bp.route('/update_progress/<int:video_id>', methods=['POST'])
 @login_required
 def update_progress(video_id):
     """Update video watch progress via AJAX"""
     try:
-        user = User.query.get(session['user_id'])
+        student_id = session['user_id']
         data = request.json
         
         watch_duration = data.get('watch_duration', 0)
@@ -263,20 +366,14 @@ def update_progress(video_id):
         
         completion_percentage = (watch_duration / total_duration) * 100 if total_duration > 0 else 0
         
-        history = StudyHistory.query.filter_by(student_id=user.id, video_id=video_id).first()
-        
-        if history:
-            history.watch_duration = watch_duration
-            history.completion_percentage = completion_percentage
-            history.is_completed = completion_percentage >= 70
-            history.completed = completion_percentage >= 95
-            history.last_watched = datetime.utcnow()
-            db.session.commit()
+        if progress_buffer.history_exists(student_id, video_id):
+            # Buffered; written to study_history in bulk by the progress buffer
+            state = progress_buffer.add(student_id, video_id, watch_duration, completion_percentage)
             
             return jsonify({
                 'success': True, 
                 'completion_percentage': round(completion_percentage, 2),
-                'is_completed': history.is_completed
+                'is_completed': state['is_completed']
             })
         
         return jsonify({'success': False, 'error': 'History not found'}), 404
@@ -290,28 +387,23 @@ def update_progress(video_id):
 def my_courses():
     """View enrolled courses"""
     try:
-        user = User.query.get(session['user_id'])
-        enrollments = Enrollment.query.filter_by(student_id=user.id).all()
+        user = get_current_user()
+        enrollments = Enrollment.query.options(
+            joinedload(Enrollment.course)
+        ).filter_by(student_id=user.id).all()
+        
+        course_progress = get_course_progress(user.id)
         
         courses_data = []
         for enrollment in enrollments:
-            course = enrollment.course
-            total_videos = course.videos.count()
-            completed_videos = StudyHistory.query.join(Video).filter(
-                StudyHistory.student_id == user.id,
-                Video.course_id == course.id,
-                StudyHistory.is_completed == True
-            ).count()
-            
-            progress = (completed_videos / total_videos * 100) if total_videos > 0 else 0
-            enrollment.completion_percentage = progress
+            progress = course_progress.get(enrollment.course_id, {})
             
             courses_data.append({
                 'enrollment': enrollment,
-                'course': course,
-                'total_videos': total_videos,
-                'completed_videos': completed_videos,
-                'progress': round(progress, 1)
+                'course': enrollment.course,
+                'total_videos': progress.get('total_videos', 0),
+                'completed_videos': progress.get('completed_videos', 0),
+                'progress': progress.get('progress', 0.0)
             })
         
         return render_template('shared/my_courses.html', courses_data=courses_data)
@@ -325,7 +417,7 @@ def my_courses():
 def certificates():
     """View earned certificates"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         certificates = Certificate.query.filter_by(student_id=user.id).all()
         eligible_courses = []
         
@@ -335,12 +427,23 @@ def certificates():
         flash('An error occurred loading certificates.', 'danger')
         return redirect(url_for('student.dashboard'))
 
+@bp.route('/certificate/<int:certificate_id>')
+@login_required
+def view_certificate(certificate_id):
+    """View one of the student's certificates"""
+    user = get_current_user()
+    certificate = Certificate.query.filter_by(id=certificate_id, student_id=user.id).first()
+    if certificate is None:
+        flash('Certificate not found.', 'danger')
+        return redirect(url_for('student.certificates'))
+    return render_template('shared/certificate_view.html', certificate=certificate)
+
 @bp.route('/todo')
 @login_required
 def todo():
     """View todo list"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         pending_todos = TodoItem.query.filter_by(
             student_id=user.id, 
             is_completed=False
@@ -364,7 +467,7 @@ def todo():
 def add_todo():
     """Add new todo item"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         
         title = request.form.get('title', '').strip()
         if not title:
@@ -404,7 +507,7 @@ def add_todo():
 def toggle_todo(todo_id):
     """Toggle todo completion status"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         todo = TodoItem.query.get_or_404(todo_id)
         
         if todo.student_id != user.id:
@@ -427,7 +530,7 @@ def toggle_todo(todo_id):
 def delete_todo(todo_id):
     """Delete todo item"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         todo = TodoItem.query.get_or_404(todo_id)
         
         if todo.student_id != user.id:
@@ -450,7 +553,7 @@ def delete_todo(todo_id):
 def online_classes():
     """View scheduled online classes"""
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         enrolled_course_ids = [e.course_id for e in user.enrollments]
         
         now = datetime.utcnow()
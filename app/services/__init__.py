@@ -0,0 +1,94 @@
+"""
+Services Package
+Domain services shared across route blueprints
+"""
+
+from app.services.progress_buffer import ProgressBuffer, progress_buffer
+from app.services.fragment_cache import FragmentCache, fragment_cache
+from app.services.progress import get_course_progress, get_watch_states
+from app.services.dashboard_stats import get_dashboard_stats, reconcile_dashboard_stats
+from app.services.revenue import get_revenue_series, get_recent_payments
+from app.services.schema import (ensure_columns, ensure_indexes, merge_duplicate_certificates,
+                                 merge_duplicate_study_history)
+from app.services.course_counters import recompute_course_counters
+from app.services.transcoding import (enqueue_transcode, enqueue_missing_transcodes, get_latest_jobs,
+                                      run_worker, run_worker_processes)
+from app.services.uploads import (UploadError, start_upload, write_chunk, complete_upload,
+                                  purge_stale_uploads)
+from app.services.images import (IMAGE_PRESETS, ImageError, image_url, resolve_derivative,
+                                 verify_image_signature, derivative_folder)
+from app.services.certificates import (CertificateRenderer, certificate_renderer, issue_certificates,
+                                       issue_pending_certificates, count_pending_certificates,
+                                       render_certificates)
+from app.services.completion import apply_completions, claim_completions, backfill_completion
+from app.services.search import (SEARCH_KINDS, RankedPage, ensure_search_index, rebuild_search_index,
+                                 search_query, search_page, search_request, search_suggestions)
+from app.services.exports import export_response, generate_export
+from app.services.report_cube import get_report_summary, refresh_report_cube
+from app.services.session_store import SessionStore, session_store, revoke_user_sessions
+from app.services.passwords import (HashingBusy, PasswordHasher, password_hasher, hash_password,
+                                    verify_password, calibrate_iterations)
+
+__all__ = [
+    'ProgressBuffer',
+    'progress_buffer',
+    'FragmentCache',
+    'fragment_cache',
+    'get_course_progress',
+    'get_watch_states',
+    'get_dashboard_stats',
+    'reconcile_dashboard_stats',
+    'get_revenue_series',
+    'get_recent_payments',
+    'ensure_columns',
+    'ensure_indexes',
+    'merge_duplicate_certificates',
+    'merge_duplicate_study_history',
+    'recompute_course_counters',
+    'enqueue_transcode',
+    'enqueue_missing_transcodes',
+    'get_latest_jobs',
+    'run_worker',
+    'run_worker_processes',
+    'UploadError',
+    'start_upload',
+    'write_chunk',
+    'complete_upload',
+    'purge_stale_uploads',
+    'IMAGE_PRESETS',
+    'ImageError',
+    'image_url',
+    'resolve_derivative',
+    'verify_image_signature',
+    'derivative_folder',
+    'CertificateRenderer',
+    'certificate_renderer',
+    'issue_certificates',
+    'issue_pending_certificates',
+    'count_pending_certificates',
+    'render_certificates',
+    'apply_completions',
+    'claim_completions',
+    'backfill_completion',
+    'SEARCH_KINDS',
+    'RankedPage',
+    'ensure_search_index',
+    'rebuild_search_index',
+    'search_query',
+    'search_page',
+    'search_request',
+    'search_suggestions',
+    'export_response',
+    'generate_export',
+    'get_report_summary',
+    'refresh_report_cube',
+    'SessionStore',
+    'session_store',
+    'revoke_user_sessions',
+    'HashingBusy',
+    'PasswordHasher',
+    'password_hasher',
+    'hash_password',
+    'verify_password',
+    'calibrate_iterations'
+]
@@ -0,0 +1,477 @@
+"""
+Certificate PDFs
+Issues certificates for completed enrollments and renders them to PDF files
+in a process pool, off the request path
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import chain
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from app import db
+from app.constants import EnrollmentStatus
+from app.models import Certificate, Course, Enrollment
+from app.utils.helpers import generate_certificate_number
+
+logger = logging.getLogger(__name__)
+
+_COMPLETED_ENROLLMENTS = 'certificate_completed_enrollments'
+_PENDING = 'pending'  # queue marker for "issue every pending certificate"
+
+
+def _draw_certificate(pdf, payload, fonts):
+    """Lay out one landscape A4 certificate on a reportlab canvas"""
+    from reportlab.lib.colors import HexColor
+
+    width, height = pdf._pagesize
+    regular, bold, serif = fonts
+    gold, ink, muted, accent = HexColor('#FFD700'), HexColor('#333333'), HexColor('#666666'), HexColor('#667EEA')
+
+    pdf.setStrokeColor(gold)
+    pdf.setLineWidth(10)
+    pdf.rect(24, 24, width - 48, height - 48)
+    pdf.setLineWidth(1.5)
+    pdf.rect(42, 42, width - 84, height - 84)
+
+    center = width / 2
+    pdf.setFillColor(ink)
+    pdf.setFont(serif, 40)
+    pdf.drawCentredString(center, height - 130, 'Certificate of Completion')
+    pdf.setFillColor(muted)
+    pdf.setFont(regular, 14)
+    pdf.drawCentredString(center, height - 158, payload['issuer'])
+    pdf.setStrokeColor(gold)
+    pdf.line(center - 200, height - 178, center + 200, height - 178)
+
+    pdf.setFont(regular, 14)
+    pdf.drawCentredString(center, height - 220, 'This is to certify that')
+    pdf.setFillColor(ink)
+    pdf.setFont(serif, 34)
+    pdf.drawCentredString(center, height - 265, payload['student_name'])
+    pdf.setFillColor(muted)
+    pdf.setFont(regular, 14)
+    pdf.drawCentredString(center, height - 298, 'has successfully completed the course')
+    pdf.setFillColor(accent)
+    pdf.setFont(bold, 24)
+    pdf.drawCentredString(center, height - 335, payload['course_title'])
+
+    details = [
+        ('Certificate Number', payload['certificate_number']),
+        ('Date of Completion', payload['completion_date']),
+        ('Instructor', payload['instructor']),
+    ]
+    if payload['grade']:
+        details.append(('Grade', payload['grade']))
+    column = (width - 120) / len(details)
+    for i, (label, value) in enumerate(details):
+        x = 60 + column * (i + 0.5)
+        pdf.setFillColor(ink)
+        pdf.setFont(bold, 11)
+        pdf.drawCentredString(x, 150, label)
+        pdf.setFillColor(muted)
+        pdf.setFont(regular, 11)
+        pdf.drawCentredString(x, 134, value)
+
+    pdf.setStrokeColor(ink)
+    pdf.setLineWidth(1)
+    for x in (width * 0.3, width * 0.7):
+        pdf.line(x - 90, 95, x + 90, 95)
+    pdf.setFillColor(muted)
+    pdf.setFont(regular, 10)
+    pdf.drawCentredString(width * 0.3, 80, 'Instructor')
+    pdf.drawCentredString(width * 0.7, 80, 'Director')
+
+
+def render_certificate_pdf(payload, path):
+    """
+    Render one certificate to a PDF file
+
+    Runs in the pool's worker processes, so it only uses the payload and
+    never the application or the database.
+
+    Args:
+        payload: Certificate fields from _certificate_payloads
+        path: Destination file, replaced atomically
+    """
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfgen import canvas
+
+    fonts = ('Helvetica', 'Helvetica-Bold', 'Times-Bold')
+    if payload.get('font_path'):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        pdfmetrics.registerFont(TTFont('CertificateFont', payload['font_path']))
+        fonts = ('CertificateFont',) * 3
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        pdf = canvas.Canvas(temp_path, pagesize=landscape(A4))
+        pdf.setTitle(f"Certificate {payload['certificate_number']}")
+        pdf.setAuthor(payload['issuer'])
+        _draw_certificate(pdf, payload, fonts)
+        pdf.showPage()
+        pdf.save()
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _render_job(job):
+    """Pool entry point: (certificate id, error message or None)"""
+    payload, path = job
+    try:
+        render_certificate_pdf(payload, path)
+        return payload['id'], None
+    except Exception as e:
+        return payload['id'], f'{type(e).__name__}: {e}'[:500]
+
+
+def _certificate_folder():
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'certificates')
+
+
+def _static_url(path):
+    """URL the static route serves an uploaded file under"""
+    relative = os.path.relpath(path, current_app.static_folder).replace(os.sep, '/')
+    if relative.startswith('../'):
+        raise ValueError(f'{path} is outside the static folder')
+    return f'{current_app.static_url_path}/{relative}'
+
+
+def _needs_pdf():
+    """Certificates without a PDF, or whose URL points outside the static folder"""
+    return db.or_(Certificate.pdf_generated_at.is_(None), Certificate.certificate_url.like('%/../%'))
+
+
+def _certificate_payloads(certificate_ids):
+    """Plain data for rendering, with student, course and instructor loaded up front"""
+    certificates = Certificate.query.options(
+        joinedload(Certificate.student),
+        joinedload(Certificate.course).joinedload(Course.instructor)
+    ).filter(Certificate.id.in_(certificate_ids)).all()
+
+    config = current_app.config
+    payloads = []
+    for certificate in certificates:
+        completed = certificate.completion_date or certificate.issue_date or datetime.utcnow()
+        instructor = certificate.course.instructor if certificate.course else None
+        payloads.append({
+            'id': certificate.id,
+            'certificate_number': certificate.certificate_number,
+            'student_name': certificate.student.full_name if certificate.student else '',
+            'course_title': certificate.course.title if certificate.course else '',
+            'instructor': instructor.full_name if instructor else 'Expert Faculty',
+            'completion_date': completed.strftime('%B %d, %Y'),
+            'grade': certificate.grade,
+            'issuer': config.get('CERTIFICATE_ISSUER', 'The Innovative Group'),
+            'font_path': config.get('CERTIFICATE_FONT_PATH')
+        })
+    return payloads
+
+
+def render_certificates(certificate_ids, executor=None):
+    """
+    Render certificate PDFs and record their static URLs
+
+    Args:
+        certificate_ids: IDs of the certificates to render
+        executor: Process pool to render in (renders in this thread when None)
+
+    Returns:
+        tuple: (rendered, failed) counts
+    """
+    folder = _certificate_folder()
+    os.makedirs(folder, exist_ok=True)
+    batch_size = current_app.config.get('CERTIFICATE_BATCH_SIZE', 200)
+    certificate_ids = list(certificate_ids)
+    rendered = failed = 0
+
+    for start in range(0, len(certificate_ids), batch_size):
+        payloads = _certificate_payloads(certificate_ids[start:start + batch_size])
+        paths = {p['id']: os.path.join(folder, f"{p['certificate_number']}.pdf") for p in payloads}
+        jobs = [(payload, paths[payload['id']]) for payload in payloads]
+        if executor is not None:
+            results = list(executor.map(_render_job, jobs, chunksize=max(1, len(jobs) // 32)))
+        else:
+            results = [_render_job(job) for job in jobs]
+
+        now = datetime.utcnow()
+        updates = []
+        for certificate_id, error in results:
+            if error:
+                failed += 1
+                logger.error(f"Certificate {certificate_id} PDF failed: {error}")
+                updates.append({'id': certificate_id, 'pdf_error': error})
+            else:
+                rendered += 1
+                updates.append({
+                    'id': certificate_id,
+                    'certificate_url': _static_url(paths[certificate_id]),
+                    'pdf_generated_at': now,
+                    'pdf_error': None
+                })
+        db.session.bulk_update_mappings(Certificate, updates)
+        db.session.commit()
+
+    if certificate_ids:
+        logger.info(f"Rendered {rendered} certificate PDFs ({failed} failed)")
+    return rendered, failed
+
+
+def issue_certificates(enrollments):
+    """
+    Create certificates for completed enrollments that do not have one yet
+
+    Args:
+        enrollments: Iterable of (student_id, course_id) pairs
+
+    Returns:
+        list: IDs of certificates for those enrollments still lacking a PDF
+    """
+    pairs = set(enrollments)
+    if not pairs:
+        return []
+
+    missing = pairs - _certificates_for(pairs).keys()
+    if missing:
+        now = datetime.utcnow()
+
+        def new_certificate(student_id, course_id):
+            return Certificate(student_id=student_id, course_id=course_id,
+                               certificate_number=generate_certificate_number(),
+                               issue_date=now, completion_date=now)
+
+        db.session.add_all([new_certificate(*pair) for pair in missing])
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker issued some of them first; insert one at a time and keep theirs
+            db.session.rollback()
+            for pair in missing:
+                db.session.add(new_certificate(*pair))
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+
+    return [c.id for c in _certificates_for(pairs).values()
+            if c.pdf_generated_at is None or '/../' in (c.certificate_url or '')]
+
+
+def _certificates_for(pairs):
+    """Existing certificates of (student_id, course_id) pairs, keyed by pair"""
+    student_ids = {student_id for student_id, _ in pairs}
+    return {
+        (c.student_id, c.course_id): c
+        for c in Certificate.query.filter(Certificate.student_id.in_(student_ids))
+        if (c.student_id, c.course_id) in pairs
+    }
+
+
+def issue_pending_certificates():
+    """
+    Create missing certificates for every completed enrollment
+
+    Returns:
+        list: IDs of all certificates that still need a PDF
+    """
+    missing = db.session.query(Enrollment.student_id, Enrollment.course_id).outerjoin(
+        Certificate,
+        (Certificate.student_id == Enrollment.student_id) & (Certificate.course_id == Enrollment.course_id)
+    ).filter(
+        Enrollment.status == EnrollmentStatus.COMPLETED,
+        Certificate.id.is_(None)
+    ).all()
+    issue_certificates(tuple(row) for row in missing)
+
+    return [certificate_id for (certificate_id,) in db.session.query(Certificate.id).filter(
+        _needs_pdf()
+    ).order_by(Certificate.id)]
+
+
+def count_pending_certificates():
+    """
+    Certificates awaiting a PDF plus completed enrollments awaiting a certificate
+
+    Returns:
+        int: Number of PDFs a bulk issue would render
+    """
+    unrendered = Certificate.query.filter(_needs_pdf()).count()
+    uncertified = db.session.query(Enrollment.id).outerjoin(
+        Certificate,
+        (Certificate.student_id == Enrollment.student_id) & (Certificate.course_id == Enrollment.course_id)
+    ).filter(
+        Enrollment.status == EnrollmentStatus.COMPLETED,
+        Certificate.id.is_(None)
+    ).count()
+    return unrendered + uncertified
+
+
+class CertificateRenderer:
+    """
+    Issues and renders certificates in the background
+
+    Requests are queued and handled by a dispatcher thread, which creates
+    certificate rows and hands batches to a process pool of
+    CERTIFICATE_WORKERS processes (0 renders in the dispatcher thread).
+    The pool uses spawned processes so it is safe to start from threaded
+    servers. With CERTIFICATE_RENDER_ASYNC off, requests are handled
+    synchronously in the caller.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.asynchronous = True
+        self.workers = 2
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the renderer to an application and read its settings"""
+        self.app = app
+        self.asynchronous = app.config.get('CERTIFICATE_RENDER_ASYNC', True)
+        self.workers = app.config.get('CERTIFICATE_WORKERS', 2)
+        app.extensions['certificate_renderer'] = self
+        atexit.register(self.shutdown)
+
+    def issue(self, enrollments):
+        """Issue and render certificates for (student_id, course_id) pairs"""
+        self._submit(list(enrollments))
+
+    def issue_all_pending(self):
+        """Issue and render every pending certificate"""
+        self._submit(_PENDING)
+
+    def render_pending(self):
+        """
+        Issue and render every pending certificate in the calling thread
+
+        Returns:
+            tuple: (rendered, failed) counts
+        """
+        return render_certificates(issue_pending_certificates(), self._pool())
+
+    def _submit(self, request):
+        if self.app is None or not request:
+            return
+        if not self.asynchronous:
+            self._handle(request)
+            return
+        self._queue.put(request)
+        self._ensure_thread()
+
+    def _handle(self, request):
+        with self.app.app_context():
+            try:
+                if request == _PENDING:
+                    self.render_pending()
+                else:
+                    render_certificates(issue_certificates(request), self._pool())
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Certificate rendering error: {str(e)}", exc_info=True)
+
+    def _pool(self):
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _ensure_thread(self):
+        """Start the dispatcher thread in this process if it is not running"""
+        # Threads and pools do not survive fork(), so track the owning pid
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._thread_pid != os.getpid():
+                self._executor = None
+            self._thread = threading.Thread(target=self._run, name='certificate-renderer', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        """Dispatcher loop; merges queued enrollment batches into one pass"""
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            if request != _PENDING:
+                while True:
+                    try:
+                        extra = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if extra is None or extra == _PENDING:
+                        self._queue.put(extra)
+                        break
+                    request = request + extra
+            self._handle(request)
+
+    def shutdown(self):
+        """Stop the dispatcher after queued work and release the pool"""
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=30)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+certificate_renderer = CertificateRenderer()
+
+
+def issue_after_commit(session, enrollments):
+    """
+    Issue certificates for enrollments once the session's transaction commits
+
+    For writes that complete enrollments without changing a loaded
+    Enrollment (Core UPDATEs), which the flush hook cannot see.
+
+    Args:
+        session: Session whose commit triggers issuance
+        enrollments: Iterable of (student_id, course_id) pairs
+    """
+    session.info.setdefault(_COMPLETED_ENROLLMENTS, set()).update(enrollments)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_completed_enrollments(session, flush_context):
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Enrollment) and obj.status == EnrollmentStatus.COMPLETED:
+            if inspect(obj).attrs.status.history.added:
+                issue_after_commit(session, [(obj.student_id, obj.course_id)])
+
+
+@event.listens_for(Session, 'after_commit')
+def _issue_for_completed_enrollments(session):
+    enrollments = session.info.pop(_COMPLETED_ENROLLMENTS, None)
+    if enrollments:
+        certificate_renderer.issue(enrollments)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_completed_enrollments(session):
+    session.info.pop(_COMPLETED_ENROLLMENTS, None)
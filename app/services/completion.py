@@ -0,0 +1,327 @@
+"""
+Course Completion
+Keeps Enrollment.completed_video_count and completion_percentage in step
+with completed study history, and completes enrollments whose videos are
+all done
+"""
+import logging
+from collections import Counter
+from sqlalchemy import and_, case, event, inspect, or_, select, tuple_, update
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.constants import EnrollmentStatus
+from app.models import Course, Enrollment, StudyHistory, Video
+from app.services.certificates import issue_after_commit
+from app.services.tracking import old_value, track_old_values
+
+logger = logging.getLogger(__name__)
+
+
+def _percentage(completed, total):
+    """SQL expression for completed / total as a percentage capped at 100"""
+    return case(
+        (total <= 0, 0.0),
+        (completed >= total, 100.0),
+        else_=db.cast(completed, db.Float) * 100 / total
+    )
+
+
+def _not_completed(table):
+    return or_(table.c.is_completed == False, table.c.is_completed.is_(None))
+
+
+def claim_completions(connection, pairs):
+    """
+    Mark study history rows completed, returning the ones this call changed
+
+    Rows are flipped with one conditional UPDATE each, so two writers racing
+    on the same row never both count the completion.
+
+    Args:
+        connection: Connection of the current transaction
+        pairs: Iterable of (student_id, video_id) that reached completion
+
+    Returns:
+        list: (student_id, video_id) pairs that were not completed before
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+
+    table = StudyHistory.__table__
+    candidates = connection.execute(
+        select(table.c.student_id, table.c.video_id).where(
+            tuple_(table.c.student_id, table.c.video_id).in_(pairs),
+            _not_completed(table)
+        )
+    ).all()
+
+    claimed = []
+    for student_id, video_id in candidates:
+        result = connection.execute(
+            update(table).where(
+                table.c.student_id == student_id,
+                table.c.video_id == video_id,
+                _not_completed(table)
+            ).values(is_completed=True)
+        )
+        if result.rowcount:
+            claimed.append((student_id, video_id))
+    return claimed
+
+
+def _refresh_loaded(session, row):
+    """Keep an already loaded enrollment consistent without reloading it mid-flush"""
+    loaded = session.identity_map.get(inspect(Enrollment).identity_key_from_primary_key((row.id,)))
+    if loaded is None:
+        return
+    for column in ('completed_video_count', 'completion_percentage', 'status'):
+        if column in loaded.__dict__:
+            set_committed_value(loaded, column, getattr(row, column))
+
+
+def apply_completions(connection, completions, session=None):
+    """
+    Apply completed-video changes to the students' enrollments
+
+    Each change costs a constant number of statements: the counter moves by
+    the delta and the percentage is recomputed from it and
+    Course.video_count. Enrollments that reach every video are marked
+    completed and, when a session is given, certificates are issued once it
+    commits.
+
+    Args:
+        connection: Connection of the transaction that changed study_history
+        completions: Iterable of (student_id, video_id, delta) with delta 1
+                     when a video became completed and -1 when it stopped being
+        session: Session whose commit issues certificates (optional)
+
+    Returns:
+        list: (student_id, course_id) pairs of enrollments that became completed
+    """
+    completions = list(completions)
+    if not completions:
+        return []
+
+    video = Video.__table__
+    course_of = dict(connection.execute(
+        select(video.c.id, video.c.course_id).where(video.c.id.in_({v for _, v, _ in completions}))
+    ).all())
+    deltas = Counter()
+    for student_id, video_id, delta in completions:
+        if video_id in course_of:
+            deltas[(student_id, course_of[video_id])] += delta
+
+    enrollment = Enrollment.__table__
+    course = Course.__table__
+    total = select(course.c.video_count).where(course.c.id == enrollment.c.course_id).scalar_subquery()
+
+    completed = []
+    for (student_id, course_id), delta in deltas.items():
+        if not delta:
+            continue
+        matches = (enrollment.c.student_id == student_id, enrollment.c.course_id == course_id)
+        count = case(
+            (enrollment.c.completed_video_count + delta > 0, enrollment.c.completed_video_count + delta),
+            else_=0
+        )
+        connection.execute(
+            update(enrollment).where(*matches).values(
+                completed_video_count=count,
+                completion_percentage=_percentage(count, total)
+            )
+        )
+        if delta > 0:
+            result = connection.execute(
+                update(enrollment).where(
+                    *matches,
+                    enrollment.c.status == EnrollmentStatus.ACTIVE,
+                    total > 0,
+                    enrollment.c.completed_video_count >= total
+                ).values(status=EnrollmentStatus.COMPLETED)
+            )
+            if result.rowcount:
+                completed.append((student_id, course_id))
+
+        if session is not None:
+            row = connection.execute(
+                select(enrollment.c.id, enrollment.c.completed_video_count,
+                       enrollment.c.completion_percentage, enrollment.c.status).where(*matches)
+            ).first()
+            if row is not None:
+                _refresh_loaded(session, row)
+
+    if completed:
+        logger.info(f"Completed {len(completed)} enrollments")
+        if session is not None:
+            issue_after_commit(session, completed)
+    return completed
+
+
+def backfill_completion():
+    """
+    Recount completed videos for every enrollment and complete finished ones
+
+    Repairs counters for data written before completion tracking existed or
+    by writes that bypassed it.
+
+    Returns:
+        tuple: (enrollments corrected, enrollments newly completed)
+    """
+    enrollment = Enrollment.__table__
+    history = StudyHistory.__table__
+    video = Video.__table__
+
+    completed = select(db.func.count(history.c.id)).select_from(
+        history.join(video, video.c.id == history.c.video_id)
+    ).where(
+        history.c.student_id == enrollment.c.student_id,
+        video.c.course_id == enrollment.c.course_id,
+        history.c.is_completed == True
+    ).scalar_subquery()
+    total = select(db.func.count(video.c.id)).where(video.c.course_id == enrollment.c.course_id).scalar_subquery()
+    percentage = _percentage(completed, total)
+
+    try:
+        corrected = db.session.execute(
+            update(enrollment).where(or_(
+                enrollment.c.completed_video_count != completed,
+                enrollment.c.completion_percentage.is_(None),
+                enrollment.c.completion_percentage != percentage
+            )).values(completed_video_count=completed, completion_percentage=percentage)
+        ).rowcount
+        finished = db.session.execute(
+            update(enrollment).where(
+                enrollment.c.status == EnrollmentStatus.ACTIVE,
+                total > 0,
+                enrollment.c.completed_video_count >= total
+            ).values(status=EnrollmentStatus.COMPLETED)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Loaded enrollments still hold the old values
+    db.session.expire_all()
+
+    if corrected or finished:
+        logger.info(f"Backfilled completion on {corrected} enrollments, {finished} newly completed")
+    return corrected, finished
+
+
+def _rescale(connection, course_id, session=None):
+    """
+    Recompute a course's enrollment percentages and statuses after its video count changed
+
+    A new video reopens completed enrollments; removing the last unwatched
+    one completes active enrollments, issuing certificates when a session
+    is given.
+    """
+    enrollment = Enrollment.__table__
+    video = Video.__table__
+    total = select(db.func.count(video.c.id)).where(video.c.course_id == course_id).scalar_subquery()
+    count = enrollment.c.completed_video_count
+    connection.execute(
+        update(enrollment).where(enrollment.c.course_id == course_id).values(
+            completion_percentage=_percentage(count, total)
+        )
+    )
+    connection.execute(
+        update(enrollment).where(
+            enrollment.c.course_id == course_id,
+            enrollment.c.status == EnrollmentStatus.COMPLETED,
+            count < total
+        ).values(status=EnrollmentStatus.ACTIVE)
+    )
+
+    finished = and_(enrollment.c.course_id == course_id,
+                    enrollment.c.status == EnrollmentStatus.ACTIVE,
+                    total > 0,
+                    count >= total)
+    student_ids = connection.execute(select(enrollment.c.student_id).where(finished)).scalars().all()
+    if student_ids:
+        connection.execute(update(enrollment).where(finished).values(status=EnrollmentStatus.COMPLETED))
+        logger.info(f"Completed {len(student_ids)} enrollments of course {course_id}")
+        if session is not None:
+            issue_after_commit(session, [(student_id, course_id) for student_id in student_ids])
+
+
+# Load the previous is_completed on assignment so flips are detected
+track_old_values(StudyHistory.is_completed)
+
+
+@event.listens_for(StudyHistory, 'after_insert')
+def _history_inserted(mapper, connection, target):
+    if target.is_completed:
+        apply_completions(connection, [(target.student_id, target.video_id, 1)], object_session(target))
+
+
+@event.listens_for(StudyHistory, 'after_update')
+def _history_updated(mapper, connection, target):
+    if not inspect(target).attrs['is_completed'].history.has_changes():
+        return
+    was_completed = bool(old_value(target, 'is_completed'))
+    if was_completed != bool(target.is_completed):
+        delta = 1 if target.is_completed else -1
+        apply_completions(connection, [(target.student_id, target.video_id, delta)], object_session(target))
+
+
+@event.listens_for(StudyHistory, 'after_delete')
+def _history_deleted(mapper, connection, target):
+    if target.is_completed:
+        apply_completions(connection, [(target.student_id, target.video_id, -1)], object_session(target))
+
+
+@event.listens_for(Enrollment, 'after_insert')
+def _enrollment_inserted(mapper, connection, target):
+    """Count videos completed before enrolling, such as watched free previews"""
+    enrollment = Enrollment.__table__
+    history = StudyHistory.__table__
+    video = Video.__table__
+    completed = connection.execute(
+        select(db.func.count(history.c.id)).select_from(
+            history.join(video, video.c.id == history.c.video_id)
+        ).where(
+            history.c.student_id == target.student_id,
+            video.c.course_id == target.course_id,
+            history.c.is_completed == True
+        )
+    ).scalar()
+    if not completed:
+        return
+
+    total = select(Course.video_count).where(Course.id == target.course_id).scalar_subquery()
+    was_active = target.status in (None, EnrollmentStatus.ACTIVE)
+    connection.execute(
+        update(enrollment).where(enrollment.c.id == target.id).values(
+            completed_video_count=completed,
+            completion_percentage=_percentage(db.literal(completed), total),
+            status=case(
+                (and_(enrollment.c.status == EnrollmentStatus.ACTIVE, total > 0, total <= completed),
+                 EnrollmentStatus.COMPLETED),
+                else_=enrollment.c.status
+            )
+        )
+    )
+    row = connection.execute(
+        select(enrollment.c.completed_video_count, enrollment.c.completion_percentage,
+               enrollment.c.status).where(enrollment.c.id == target.id)
+    ).first()
+    # The target is not in the identity map yet, so refresh it directly
+    for column in ('completed_video_count', 'completion_percentage', 'status'):
+        set_committed_value(target, column, getattr(row, column))
+
+    session = object_session(target)
+    if was_active and row.status == EnrollmentStatus.COMPLETED and session is not None:
+        issue_after_commit(session, [(target.student_id, target.course_id)])
+
+
+@event.listens_for(Video, 'after_insert')
+def _video_inserted(mapper, connection, target):
+    _rescale(connection, target.course_id, object_session(target))
+
+
+@event.listens_for(Video, 'after_delete')
+def _video_deleted(mapper, connection, target):
+    _rescale(connection, target.course_id, object_session(target))
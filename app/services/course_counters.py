@@ -0,0 +1,100 @@
+"""
+Course Counters
+Keeps Course.enrollment_count and Course.video_count in step with the
+enrollment and video tables
+"""
+import logging
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.models import Course, Enrollment, Video
+from app.services.tracking import add_deltas, old_value, track_old_values
+
+logger = logging.getLogger(__name__)
+
+# Child model -> counter column on course
+COUNTERS = {
+    Enrollment: 'enrollment_count',
+    Video: 'video_count'
+}
+
+
+def recompute_course_counters():
+    """
+    Recount enrollments and videos for every course and fix any drift
+
+    Repairs counters changed by writes that bypassed the ORM hooks.
+
+    Returns:
+        int: Number of courses whose counters were corrected
+    """
+    course = Course.__table__
+    counts = {
+        column: select(db.func.count(model.id)).where(model.course_id == course.c.id).scalar_subquery()
+        for model, column in COUNTERS.items()
+    }
+
+    drifted = db.session.execute(
+        select(db.func.count(course.c.id)).where(db.or_(
+            *(course.c[column] != count for column, count in counts.items())
+        ))
+    ).scalar()
+
+    if drifted:
+        try:
+            db.session.execute(
+                update(course).where(db.or_(
+                    *(course.c[column] != count for column, count in counts.items())
+                )).values(updated_at=course.c.updated_at, **counts)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        # Loaded courses still hold the old counts
+        db.session.expire_all()
+        logger.info(f"Corrected counters on {drifted} courses")
+
+    return drifted
+
+
+def _apply(connection, session, course_id, column, delta):
+    """Add delta to a course counter inside the current transaction"""
+    if course_id is None or not delta:
+        return
+
+    course = Course.__table__
+    # Keep updated_at as is; a counter change is not an edit of the course
+    add_deltas(connection, course, course.c.id == course_id, {column: delta}, updated_at=course.c.updated_at)
+
+    # Keep an already loaded course consistent without reloading it mid-flush
+    if session is not None:
+        loaded = session.identity_map.get(inspect(Course).identity_key_from_primary_key((course_id,)))
+        if loaded is not None and column in loaded.__dict__:
+            set_committed_value(loaded, column, (loaded.__dict__[column] or 0) + delta)
+
+
+def _make_hooks(model, column):
+    # Load the previous course_id on assignment so moves between courses are counted
+    track_old_values(model.course_id)
+
+    @event.listens_for(model, 'after_insert')
+    def inserted(mapper, connection, target):
+        _apply(connection, object_session(target), target.course_id, column, 1)
+
+    @event.listens_for(model, 'after_delete')
+    def deleted(mapper, connection, target):
+        _apply(connection, object_session(target), target.course_id, column, -1)
+
+    @event.listens_for(model, 'after_update')
+    def updated(mapper, connection, target):
+        old_course_id = old_value(target, 'course_id')
+        if old_course_id != target.course_id:
+            session = object_session(target)
+            _apply(connection, session, old_course_id, column, -1)
+            _apply(connection, session, target.course_id, column, 1)
+
+
+for _model, _column in COUNTERS.items():
+    _make_hooks(_model, _column)
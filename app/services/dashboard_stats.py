@@ -0,0 +1,204 @@
+"""
+Dashboard Statistics
+Incrementally maintained totals for the admin and management dashboards
+"""
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event
+from app import db
+from app.constants import UserRole, PaymentStatus, TicketStatus
+from app.models import User, Course, Enrollment, Payment, SupportTicket, DashboardStats
+from app.services.tracking import add_deltas, old_value, track_old_values
+
+logger = logging.getLogger(__name__)
+
+TICKET_STATUS_COLUMNS = {
+    TicketStatus.OPEN: 'open_tickets',
+    TicketStatus.IN_PROGRESS: 'in_progress_tickets',
+    TicketStatus.CLOSED: 'closed_tickets'
+}
+
+ROLE_COLUMNS = {
+    UserRole.STUDENT: 'total_students',
+    UserRole.FACULTY: 'total_faculty'
+}
+
+
+def get_dashboard_stats():
+    """
+    Read the dashboard snapshot with a single primary-key lookup
+
+    The snapshot is rebuilt from the base tables when it does not exist yet
+    or when its last reconciliation is older than DASHBOARD_STATS_RECONCILE_INTERVAL.
+
+    Returns:
+        DashboardStats: Current snapshot
+    """
+    stats = db.session.get(DashboardStats, DashboardStats.SINGLETON_ID)
+    interval = current_app.config.get('DASHBOARD_STATS_RECONCILE_INTERVAL', 3600)
+
+    if stats is None or (
+        interval and stats.reconciled_at
+        and datetime.utcnow() - stats.reconciled_at > timedelta(seconds=interval)
+    ):
+        stats = reconcile_dashboard_stats()
+
+    return stats
+
+
+def reconcile_dashboard_stats():
+    """
+    Recompute every dashboard total from the base tables
+
+    Repairs any drift from writes that bypassed the ORM hooks.
+
+    Returns:
+        DashboardStats: Rebuilt snapshot
+    """
+    db.session().use_primary()
+    role_counts = dict(
+        db.session.query(User.role, db.func.count(User.id)).group_by(User.role).all()
+    )
+    ticket_counts = dict(
+        db.session.query(SupportTicket.status, db.func.count(SupportTicket.id)).group_by(SupportTicket.status).all()
+    )
+    total_revenue = db.session.query(db.func.sum(Payment.amount_npr)).filter(
+        Payment.status == PaymentStatus.COMPLETED
+    ).scalar() or 0
+
+    stats = db.session.get(DashboardStats, DashboardStats.SINGLETON_ID)
+    if stats is None:
+        stats = DashboardStats(id=DashboardStats.SINGLETON_ID)
+        db.session.add(stats)
+
+    stats.total_users = sum(role_counts.values())
+    stats.total_students = role_counts.get(UserRole.STUDENT, 0)
+    stats.total_faculty = role_counts.get(UserRole.FACULTY, 0)
+    stats.total_courses = Course.query.count()
+    stats.total_enrollments = Enrollment.query.count()
+    stats.total_revenue = total_revenue
+    stats.total_tickets = sum(ticket_counts.values())
+    stats.open_tickets = ticket_counts.get(TicketStatus.OPEN, 0)
+    stats.in_progress_tickets = ticket_counts.get(TicketStatus.IN_PROGRESS, 0)
+    stats.closed_tickets = ticket_counts.get(TicketStatus.CLOSED, 0)
+    stats.reconciled_at = datetime.utcnow()
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info("Dashboard statistics reconciled")
+    return stats
+
+
+def _apply(connection, deltas):
+    """Add deltas to the snapshot row inside the current transaction"""
+    table = DashboardStats.__table__
+    add_deltas(connection, table, table.c.id == DashboardStats.SINGLETON_ID, deltas)
+
+
+def _role_deltas(role, sign):
+    column = ROLE_COLUMNS.get(role)
+    return {column: sign} if column else {}
+
+
+def _ticket_deltas(status, sign):
+    column = TICKET_STATUS_COLUMNS.get(status)
+    return {column: sign} if column else {}
+
+
+def _revenue(status, amount):
+    return (amount or 0) if status == PaymentStatus.COMPLETED else 0
+
+
+def _merge(*parts):
+    merged = {}
+    for part in parts:
+        for column, delta in part.items():
+            merged[column] = merged.get(column, 0) + delta
+    return merged
+
+
+# Attributes whose previous values the after_update hooks compare against
+TRACKED_ATTRIBUTES = [User.role, Payment.status, Payment.amount_npr, SupportTicket.status]
+
+track_old_values(*TRACKED_ATTRIBUTES)
+
+
+# User hooks
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    _apply(connection, _merge({'total_users': 1}, _role_deltas(target.role, 1)))
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _apply(connection, _merge({'total_users': -1}, _role_deltas(target.role, -1)))
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    old_role = old_value(target, 'role')
+    if old_role != target.role:
+        _apply(connection, _merge(_role_deltas(old_role, -1), _role_deltas(target.role, 1)))
+
+
+# Course hooks
+@event.listens_for(Course, 'after_insert')
+def _course_inserted(mapper, connection, target):
+    _apply(connection, {'total_courses': 1})
+
+
+@event.listens_for(Course, 'after_delete')
+def _course_deleted(mapper, connection, target):
+    _apply(connection, {'total_courses': -1})
+
+
+# Enrollment hooks
+@event.listens_for(Enrollment, 'after_insert')
+def _enrollment_inserted(mapper, connection, target):
+    _apply(connection, {'total_enrollments': 1})
+
+
+@event.listens_for(Enrollment, 'after_delete')
+def _enrollment_deleted(mapper, connection, target):
+    _apply(connection, {'total_enrollments': -1})
+
+
+# Payment hooks
+@event.listens_for(Payment, 'after_insert')
+def _payment_inserted(mapper, connection, target):
+    _apply(connection, {'total_revenue': _revenue(target.status, target.amount_npr)})
+
+
+@event.listens_for(Payment, 'after_delete')
+def _payment_deleted(mapper, connection, target):
+    _apply(connection, {'total_revenue': -_revenue(target.status, target.amount_npr)})
+
+
+@event.listens_for(Payment, 'after_update')
+def _payment_updated(mapper, connection, target):
+    old = _revenue(old_value(target, 'status'), old_value(target, 'amount_npr'))
+    new = _revenue(target.status, target.amount_npr)
+    _apply(connection, {'total_revenue': new - old})
+
+
+# SupportTicket hooks
+@event.listens_for(SupportTicket, 'after_insert')
+def _ticket_inserted(mapper, connection, target):
+    _apply(connection, _merge({'total_tickets': 1}, _ticket_deltas(target.status, 1)))
+
+
+@event.listens_for(SupportTicket, 'after_delete')
+def _ticket_deleted(mapper, connection, target):
+    _apply(connection, _merge({'total_tickets': -1}, _ticket_deltas(target.status, -1)))
+
+
+@event.listens_for(SupportTicket, 'after_update')
+def _ticket_updated(mapper, connection, target):
+    old_status = old_value(target, 'status')
+    if old_status != target.status:
+        _apply(connection, _merge(_ticket_deltas(old_status, -1), _ticket_deltas(target.status, 1)))
@@ -0,0 +1,256 @@
+"""
+Streaming Exports
+CSV and JSONL exports of payments, enrollments and study history that are
+produced row by row, so memory stays flat regardless of table size
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import User, Course, Video, Enrollment, Payment, StudyHistory
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson'
+}
+
+CHUNK_ROWS = 1000
+
+# Leading characters that make spreadsheet applications evaluate a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _payments_statement():
+    student = aliased(User)
+    stmt = select(
+        Payment.id,
+        Payment.transaction_id,
+        Payment.student_id,
+        student.full_name.label('student_name'),
+        Payment.course_id,
+        Course.title.label('course_title'),
+        Payment.amount_npr,
+        Payment.payment_method,
+        Payment.status,
+        Payment.payment_date
+    ).join(student, Payment.student_id == student.id).join(Course, Payment.course_id == Course.id)
+    return stmt, Payment.payment_date, Payment.status, Payment.id
+
+
+def _enrollments_statement():
+    student = aliased(User)
+    stmt = select(
+        Enrollment.id,
+        Enrollment.student_id,
+        student.full_name.label('student_name'),
+        Enrollment.course_id,
+        Course.title.label('course_title'),
+        Enrollment.enrollment_date,
+        Enrollment.completion_percentage,
+        Enrollment.status
+    ).join(student, Enrollment.student_id == student.id).join(Course, Enrollment.course_id == Course.id)
+    return stmt, Enrollment.enrollment_date, Enrollment.status, Enrollment.id
+
+
+def _study_history_statement():
+    student = aliased(User)
+    stmt = select(
+        StudyHistory.id,
+        StudyHistory.student_id,
+        student.full_name.label('student_name'),
+        Video.course_id,
+        StudyHistory.video_id,
+        Video.title.label('video_title'),
+        StudyHistory.watch_duration,
+        StudyHistory.completion_percentage,
+        StudyHistory.is_completed,
+        StudyHistory.last_watched
+    ).join(student, StudyHistory.student_id == student.id).join(Video, StudyHistory.video_id == Video.id)
+    # study history has no status column; 'completed' / 'in_progress' map to is_completed
+    status_column = db.case((StudyHistory.is_completed == True, 'completed'), else_='in_progress')
+    return stmt, StudyHistory.last_watched, status_column, StudyHistory.id
+
+
+EXPORTS = {
+    'payments': _payments_statement,
+    'enrollments': _enrollments_statement,
+    'study_history': _study_history_statement
+}
+
+
+def parse_date(value, end_of_day=False):
+    """
+    Parse a YYYY-MM-DD query argument
+
+    Args:
+        value: Date string or None
+        end_of_day: Return the start of the following day instead
+
+    Returns:
+        datetime: Parsed date, or None if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None
+    return parsed + timedelta(days=1) if end_of_day else parsed
+
+
+def build_export_query(kind, start=None, end=None, status=None):
+    """
+    Build the SELECT for an export with date-range and status filters
+
+    Args:
+        kind: 'payments', 'enrollments' or 'study_history'
+        start: Include rows on or after this datetime
+        end: Include rows before this datetime
+        status: Only include rows with this status
+
+    Returns:
+        Select: Statement ordered by id
+    """
+    stmt, date_column, status_column, id_column = EXPORTS[kind]()
+    if start is not None:
+        stmt = stmt.where(date_column >= start)
+    if end is not None:
+        stmt = stmt.where(date_column < end)
+    if status:
+        stmt = stmt.where(status_column == status)
+    return stmt.order_by(id_column)
+
+
+def iter_export_rows(stmt):
+    """
+    Execute a statement with a server-side cursor and yield row mappings
+
+    Args:
+        stmt: SELECT statement
+
+    Yields:
+        dict-like: One mapping per row
+    """
+    result = db.session.execute(
+        stmt.execution_options(stream_results=True, yield_per=CHUNK_ROWS)
+    )
+    try:
+        for row in result.mappings():
+            yield row
+    finally:
+        result.close()
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    """Serialized CSV value, with text that would be read as a formula quoted by a leading apostrophe"""
+    value = _serialize(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def generate_csv(stmt):
+    """
+    Stream a statement's rows as CSV text chunks
+
+    Args:
+        stmt: SELECT statement
+
+    Text cells starting with =, +, -, @, tab or carriage return are
+    prefixed with an apostrophe so spreadsheets show them as text.
+
+    Yields:
+        str: CSV chunks of up to CHUNK_ROWS rows, header first
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in stmt.selected_columns])
+
+    for count, row in enumerate(iter_export_rows(stmt), start=1):
+        writer.writerow([_csv_cell(value) for value in row.values()])
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+def generate_jsonl(stmt):
+    """
+    Stream a statement's rows as JSON Lines chunks
+
+    Args:
+        stmt: SELECT statement
+
+    Yields:
+        str: Chunks of up to CHUNK_ROWS newline-delimited JSON objects
+    """
+    lines = []
+    for row in iter_export_rows(stmt):
+        lines.append(json.dumps({key: _serialize(value) for key, value in row.items()}, ensure_ascii=False))
+        if len(lines) >= CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def generate_export(kind, fmt, start=None, end=None, status=None):
+    """
+    Stream an export in the requested format
+
+    Args:
+        kind: 'payments', 'enrollments' or 'study_history'
+        fmt: 'csv' or 'jsonl'
+        start: Include rows on or after this datetime
+        end: Include rows before this datetime
+        status: Only include rows with this status
+
+    Returns:
+        generator: Text chunks
+    """
+    stmt = build_export_query(kind, start, end, status)
+    return generate_csv(stmt) if fmt == 'csv' else generate_jsonl(stmt)
+
+
+def export_response(kind, fmt, args):
+    """
+    Build a streaming download response from request arguments
+
+    Args:
+        kind: 'payments', 'enrollments' or 'study_history'
+        fmt: 'csv' or 'jsonl'
+        args: Request arguments with optional start, end (YYYY-MM-DD) and status
+
+    Returns:
+        Response: Chunked download, or None if kind or fmt is unknown
+    """
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        return None
+
+    chunks = generate_export(
+        kind,
+        fmt,
+        start=parse_date(args.get('start')),
+        end=parse_date(args.get('end'), end_of_day=True),
+        status=args.get('status') or None
+    )
+    filename = f"{kind}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
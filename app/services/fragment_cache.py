@@ -0,0 +1,262 @@
+"""
+Fragment Cache
+Rendered page fragments cached in-process (LRU) or in a SQLite file shared
+by all workers, invalidated when catalog models are committed
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Course, Video, Enrollment
+from app.utils.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Models whose commits invalidate a cache tag; a tag also covers the tags nested under it
+INVALIDATING_MODELS = {
+    Course: 'catalog',
+    Video: 'catalog',
+    Enrollment: 'catalog:public'  # only the public listing shows enrollment counts
+}
+
+_PENDING_TAGS = 'fragment_cache_tags'
+
+
+class LRUBackend:
+    """Per-process least-recently-used store with expiry"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend(SQLiteStore):
+    """
+    Store shared by every worker on the host through one SQLite file
+
+    Values are stored as JSON, so fragments must be strings, lists or dicts.
+    """
+
+    PRUNE_EVERY = 100  # writes between expiry sweeps
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS fragment_cache ('
+        'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_fragment_cache_expires_at ON fragment_cache (expires_at)',
+    )
+
+    def __init__(self, path, max_entries=512):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self._writes = 0
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM fragment_cache WHERE key = ? AND expires_at >= ?',
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO fragment_cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, json.dumps(value), time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        """Drop expired entries, then the soonest-expiring ones above max_entries"""
+        conn.execute('DELETE FROM fragment_cache WHERE expires_at < ?', (time.time(),))
+        conn.execute(
+            'DELETE FROM fragment_cache WHERE key IN ('
+            'SELECT key FROM fragment_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def delete_prefix(self, prefix):
+        # Range scan on the primary key instead of LIKE
+        self._connect().execute(
+            'DELETE FROM fragment_cache WHERE key >= ? AND key < ?',
+            (prefix, prefix + '\uffff')
+        )
+
+    def clear(self):
+        self._connect().execute('DELETE FROM fragment_cache')
+
+
+class FragmentCache:
+    """
+    Tagged cache for rendered fragments
+
+    Keys live under a tag ('catalog:public:anon' is key 'anon' of tag
+    'catalog:public', itself under 'catalog'); committing a change to a model
+    listed in INVALIDATING_MODELS drops every key under its tag. Backend
+    errors are logged and treated as misses so a broken cache never breaks a page.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Create the configured backend ('lru', 'sqlite' or 'none')
+
+        Invalidations only reach the process that committed, so a per-process
+        LRU would serve stale fragments from every other worker.
+        """
+        workers = app.config.get('WEB_WORKERS', 1)
+        kind = app.config.get('FRAGMENT_CACHE_BACKEND') or ('sqlite' if workers > 1 else 'lru')
+        if kind == 'lru' and workers > 1:
+            raise RuntimeError(f"FRAGMENT_CACHE_BACKEND 'lru' is per process and cannot be invalidated "
+                               f"across {workers} workers; use 'sqlite' or 'none', or set WEB_WORKERS=1")
+        max_entries = app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 512)
+        self.ttl = app.config.get('FRAGMENT_CACHE_TTL', 300)
+
+        if kind == 'sqlite':
+            path = app.config.get('FRAGMENT_CACHE_PATH') or os.path.join(app.instance_path, 'fragment_cache.sqlite')
+            self.backend = SQLiteBackend(path, max_entries)
+        elif kind == 'lru':
+            self.backend = LRUBackend(max_entries)
+        else:
+            self.backend = None
+        app.extensions['fragment_cache'] = self
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_or_render(self, tag, key, render, ttl=None):
+        """
+        Return a cached fragment, rendering and storing it on a miss
+
+        Args:
+            tag: Invalidation tag, e.g. 'catalog'
+            key: Key within the tag, including any variant such as login state
+            render: Zero-argument callable producing a JSON-serializable value
+            ttl: Seconds to keep the fragment (defaults to FRAGMENT_CACHE_TTL)
+
+        Returns:
+            The cached or freshly rendered value
+        """
+        if self.backend is None:
+            return render()
+
+        full_key = f'{tag}:{key}'
+        try:
+            value = self.backend.get(full_key)
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Fragment cache read failed for {full_key}: {str(e)}")
+            return render()
+
+        if value is not None:
+            self._count('hits')
+            return value
+
+        self._count('misses')
+        # Stored fragments outlive replica lag, so render them from the primary
+        db.session().use_primary()
+        value = render()
+        try:
+            self.backend.set(full_key, value, ttl or self.ttl)
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Fragment cache write failed for {full_key}: {str(e)}")
+        return value
+
+    def invalidate(self, tag):
+        """Drop every fragment stored under a tag"""
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete_prefix(f'{tag}:')
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Fragment cache invalidation failed for {tag}: {str(e)}")
+
+    def clear(self):
+        """Drop every fragment"""
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        """
+        Hit and miss counters for this process
+
+        Returns:
+            dict: backend, hits, misses, errors and hit_rate (percent)
+        """
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': round(self.hits * 100.0 / lookups, 1) if lookups else 0.0
+        }
+
+
+fragment_cache = FragmentCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_invalidations(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        tag = INVALIDATING_MODELS.get(type(obj))
+        if tag:
+            session.info.setdefault(_PENDING_TAGS, set()).add(tag)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    for tag in session.info.pop(_PENDING_TAGS, ()):
+        fragment_cache.invalidate(tag)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_TAGS, None)
@@ -0,0 +1,232 @@
+"""
+Image Derivatives
+Resized WebP/JPEG variants of course thumbnails, avatars and video posters,
+generated on first request and named by source content hash and preset
+"""
+import hashlib
+import hmac
+import io
+import ipaddress
+import logging
+import os
+import socket
+import tempfile
+import urllib.request
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from flask import current_app, url_for
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import safe_join
+from app import db
+from app.models import ImageAsset
+
+logger = logging.getLogger(__name__)
+
+# Preset -> (width, height, mode); 'cover' crops to fill the box, 'contain' fits inside it without upscaling
+IMAGE_PRESETS = {
+    'avatar': (128, 128, 'cover'),
+    'thumb': (160, 90, 'cover'),
+    'card': (480, 270, 'cover'),
+    'poster': (1280, 720, 'contain'),
+}
+
+# URL extension -> Pillow format
+IMAGE_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG'
+}
+
+
+class ImageError(Exception):
+    """A source image could not be fetched or resized"""
+
+
+def _signature(src, preset):
+    key = current_app.config['SECRET_KEY'].encode()
+    return hmac.new(key, f'{preset}:{src}'.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def verify_image_signature(src, preset, signature):
+    """Whether a derivative request was produced by image_url (so the resizer is not an open proxy)"""
+    return hmac.compare_digest(_signature(src, preset), signature or '')
+
+
+def image_url(src, preset='card'):
+    """
+    URL of a resized variant of an image, registered as the 'resized' template filter
+
+    Args:
+        src: Image URL as stored on the model (absolute or site-relative)
+        preset: Key of IMAGE_PRESETS
+
+    Returns:
+        str: Signed derivative URL, or src unchanged when it is empty
+    """
+    if not src:
+        return src
+    return url_for('media.image', preset=preset, src=src, sig=_signature(src, preset))
+
+
+def derivative_folder():
+    """Directory holding generated derivatives"""
+    return os.path.join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), 'thumbnails')
+
+
+def _check_public_url(url):
+    """Refuse non-http(s) sources and hosts on loopback, private or link-local addresses"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ImageError(f'Unsupported image source {url}')
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, None)}
+    except socket.gaierror as e:
+        raise ImageError(f'Cannot resolve {parsed.hostname}') from e
+    if not all(ipaddress.ip_address(address).is_global for address in addresses):
+        raise ImageError(f'{parsed.hostname} resolves to a non-public address')
+
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Apply the same host check to every redirect target"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_public_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(_PublicRedirectHandler)
+
+
+def _read_source(src):
+    """Bytes of a site-relative static file or a public http(s) URL"""
+    max_bytes = current_app.config.get('IMAGE_MAX_SOURCE_BYTES', 10 * 1024 * 1024)
+
+    static_prefix = current_app.static_url_path + '/'
+    if src.startswith(static_prefix):
+        path = safe_join(current_app.static_folder, src[len(static_prefix):].split('?')[0])
+        if path is None or not os.path.isfile(path):
+            raise ImageError(f'{src} not found')
+        if os.path.getsize(path) > max_bytes:
+            raise ImageError(f'{src} is larger than IMAGE_MAX_SOURCE_BYTES')
+        with open(path, 'rb') as f:
+            return f.read()
+
+    _check_public_url(src)
+    request = urllib.request.Request(src, headers={'User-Agent': 'image-derivatives'})
+    try:
+        with _opener.open(request, timeout=current_app.config.get('IMAGE_FETCH_TIMEOUT', 5)) as response:
+            data = response.read(max_bytes + 1)
+    except OSError as e:
+        raise ImageError(f'Fetching {src} failed: {e}') from e
+    if len(data) > max_bytes:
+        raise ImageError(f'{src} is larger than IMAGE_MAX_SOURCE_BYTES')
+    return data
+
+
+def _render(data, preset, fmt, destination):
+    """
+    Resize source bytes into a derivative file
+
+    Returns:
+        tuple: Width and height of the source image
+    """
+    from PIL import Image, ImageOps  # only needed when a derivative is missing
+
+    width, height, mode = IMAGE_PRESETS[preset]
+    Image.MAX_IMAGE_PIXELS = current_app.config.get('IMAGE_MAX_PIXELS', 40000000)
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            source_size = source.size
+            image = ImageOps.exif_transpose(source)
+            if mode == 'cover':
+                image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            else:
+                image.thumbnail((width, height), Image.Resampling.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError(f'Cannot decode image: {e}') from e
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if has_alpha and fmt == 'webp':
+        image = image.convert('RGBA')
+    elif has_alpha:
+        # JPEG has no alpha channel; flatten onto white
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, 'white')
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    else:
+        image = image.convert('RGB')
+
+    options = {'quality': current_app.config.get('IMAGE_QUALITY', 80)}
+    if fmt == 'webp':
+        options['method'] = 4
+    else:
+        options.update(optimize=True, progressive=True)
+
+    # Write beside the destination and rename, so concurrent requests never see a partial file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, IMAGE_FORMATS[fmt], **options)
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return source_size
+
+
+def _refresh_asset(asset, src, data):
+    """Record the source's current content hash, creating the asset row if needed"""
+    if asset is None:
+        asset = ImageAsset(source_url=src)
+        db.session.add(asset)
+    asset.content_hash = hashlib.sha256(data).hexdigest()
+    asset.checked_at = datetime.utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request registered the same source first
+        db.session.rollback()
+        asset = ImageAsset.query.filter_by(source_url=src).one()
+    return asset
+
+
+def resolve_derivative(src, preset, fmt):
+    """
+    File name of a resized variant of an image, generating it if needed
+
+    Sources are fetched again only after IMAGE_SOURCE_TTL, or when the
+    derivative for this preset and format does not exist yet.
+
+    Args:
+        src: Image URL
+        preset: Key of IMAGE_PRESETS
+        fmt: Key of IMAGE_FORMATS
+
+    Returns:
+        str: Derivative file name within derivative_folder()
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=current_app.config.get('IMAGE_SOURCE_TTL', 86400))
+    asset = ImageAsset.query.filter_by(source_url=src).first()
+
+    data = None
+    if asset is None or asset.checked_at < stale_before:
+        data = _read_source(src)
+        asset = _refresh_asset(asset, src, data)
+
+    name = f'{asset.content_hash[:32]}_{preset}.{fmt}'
+    destination = os.path.join(derivative_folder(), name)
+    if os.path.exists(destination):
+        return name
+
+    if data is None:
+        data = _read_source(src)
+        if hashlib.sha256(data).hexdigest() != asset.content_hash:
+            asset = _refresh_asset(asset, src, data)
+            name = f'{asset.content_hash[:32]}_{preset}.{fmt}'
+            destination = os.path.join(derivative_folder(), name)
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    asset.width, asset.height = _render(data, preset, fmt, destination)
+    db.session.commit()
+    logger.info(f"Generated {preset} {fmt} derivative of {src}")
+    return name
@@ -0,0 +1,173 @@
+"""
+Password Hashing
+PBKDF2 hashing on a bounded thread pool, with the iteration count stored in
+each hash so hashes made at an older cost are upgraded on login
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+HASH_ALGORITHM = 'pbkdf2:sha256'
+# OWASP's 2023 floor for PBKDF2-HMAC-SHA256; calibration never goes below it
+MIN_ITERATIONS = 600000
+
+
+class HashingBusy(RuntimeError):
+    """Raised when too many password hashes are already waiting"""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a small dedicated thread pool
+
+    PBKDF2 releases the GIL, so hashes run alongside request threads. The
+    pool size caps the cores a login burst can take from other requests,
+    and the admission limit turns excess logins away at once instead of
+    letting them queue until they time out.
+    """
+
+    def __init__(self, app=None):
+        self.iterations = MIN_ITERATIONS
+        self.concurrency = 1
+        self.queue_size = 16
+        self._slots = threading.BoundedSemaphore(self.concurrency + self.queue_size)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the hasher to an application and read its settings"""
+        self.iterations = app.config.get('PASSWORD_HASH_ITERATIONS', MIN_ITERATIONS)
+        self.concurrency = max(1, app.config.get('PASSWORD_HASH_CONCURRENCY', 1))
+        self.queue_size = max(0, app.config.get('PASSWORD_HASH_QUEUE', 16))
+        self._slots = threading.BoundedSemaphore(self.concurrency + self.queue_size)
+        self.shutdown()
+        app.extensions['password_hasher'] = self
+
+    @property
+    def method(self):
+        """werkzeug method string for new hashes, e.g. 'pbkdf2:sha256:600000'"""
+        return f'{HASH_ALGORITHM}:{self.iterations}'
+
+    def _pool(self):
+        """Thread pool for this process, recreated after fork"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                        thread_name_prefix='password-hash')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy('Too many password hashes in progress')
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """
+        Hash a password at the configured cost
+
+        Args:
+            password: Plain-text password
+
+        Returns:
+            str: werkzeug hash string carrying its method and iteration count
+
+        Raises:
+            HashingBusy: When the pool and its queue are full
+        """
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """
+        Check a password against a stored hash of any supported method
+
+        Args:
+            password_hash: Stored hash string
+            password: Plain-text password to check
+
+        Returns:
+            bool: True if the password matches
+
+        Raises:
+            HashingBusy: When the pool and its queue are full
+        """
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with a different method or cost"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        """Stop the pool; it is recreated on the next hash"""
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+            self._executor_pid = None
+
+
+password_hasher = PasswordHasher()
+
+
+def hash_password(password):
+    """Hash a password on the hashing pool; see PasswordHasher.hash"""
+    return password_hasher.hash(password)
+
+
+def verify_password(user, password):
+    """
+    Check a user's password, upgrading the stored hash if its cost is outdated
+
+    The new hash is assigned to user.password; the caller commits it.
+
+    Args:
+        user: User being authenticated
+        password: Plain-text password to check
+
+    Returns:
+        bool: True if the password matches
+
+    Raises:
+        HashingBusy: When the pool and its queue are full
+    """
+    if not password_hasher.verify(user.password, password):
+        return False
+    if password_hasher.needs_rehash(user.password):
+        try:
+            user.password = password_hasher.hash(password)
+            logger.info(f"Rehashed password for user {user.id} with {password_hasher.method}")
+        except HashingBusy:
+            # Upgrade on a later login rather than refuse this one
+            pass
+    return True
+
+
+def calibrate_iterations(target_ms=250, floor=MIN_ITERATIONS):
+    """
+    PBKDF2 iteration count that takes about target_ms on this machine
+
+    Args:
+        target_ms: Desired time for one hash in milliseconds
+        floor: Lowest count to return
+
+    Returns:
+        tuple: (iterations rounded to 10,000, measured milliseconds per hash)
+    """
+    sample = 100000
+    start = time.perf_counter()
+    generate_password_hash('calibration', f'{HASH_ALGORITHM}:{sample}')
+    per_iteration = (time.perf_counter() - start) / sample
+    iterations = max(floor, int(target_ms / 1000 / per_iteration) // 10000 * 10000)
+    return iterations, iterations * per_iteration * 1000
@@ -0,0 +1,66 @@
+"""
+Course Progress Aggregation
+Per-course video completion and watch history for a student
+"""
+from app import db
+from app.models import Course, Enrollment, Video, StudyHistory
+
+
+def get_course_progress(student_id, course_ids=None):
+    """
+    Get video completion for every course a student is enrolled in
+
+    Reads the counters kept by the completion engine, so the cost does not
+    grow with the number of videos watched.
+
+    Args:
+        student_id: ID of the student
+        course_ids: Optional iterable limiting the result to these courses
+
+    Returns:
+        dict: course_id -> {'total_videos', 'completed_videos', 'progress'}
+              with an entry for every matching enrollment
+    """
+    query = db.session.query(
+        Enrollment.course_id,
+        Course.video_count,
+        Enrollment.completed_video_count,
+        Enrollment.completion_percentage
+    ).join(
+        Course, Course.id == Enrollment.course_id
+    ).filter(
+        Enrollment.student_id == student_id
+    )
+    if course_ids is not None:
+        query = query.filter(Enrollment.course_id.in_(list(course_ids)))
+
+    progress = {}
+    for course_id, total_videos, completed_videos, percentage in query.all():
+        progress[course_id] = {
+            'total_videos': total_videos,
+            'completed_videos': min(completed_videos, total_videos),
+            'progress': round(percentage or 0.0, 1)
+        }
+
+    return progress
+
+
+def get_watch_states(student_id, course_id):
+    """
+    Load a student's watch history for every video in a course
+
+    Args:
+        student_id: ID of the student
+        course_id: ID of the course
+
+    Returns:
+        dict: video_id -> StudyHistory for each video the student has opened
+    """
+    histories = StudyHistory.query.join(
+        Video, StudyHistory.video_id == Video.id
+    ).filter(
+        StudyHistory.student_id == student_id,
+        Video.course_id == course_id
+    ).all()
+
+    return {history.video_id: history for history in histories}
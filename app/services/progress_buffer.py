@@ -0,0 +1,246 @@
+"""
+Video Progress Buffer
+Write-behind buffering for video progress heartbeats
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import bindparam, case, or_, update
+from app import db
+from app.models import StudyHistory
+from app.services.completion import apply_completions, claim_completions
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBuffer:
+    """
+    Collects progress heartbeats in memory and writes them to study_history
+    in bulk UPDATE batches.
+
+    Heartbeats are merged per (student_id, video_id): the furthest position,
+    highest completion and latest timestamp win. Pending entries are flushed
+    by a background timer, when the buffer reaches its size threshold, and
+    on interpreter shutdown.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.flush_interval = 5
+        self.batch_size = 500
+        self._pending = {}
+        self._known_keys = set()
+        self._max_known_keys = 100000
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the buffer to an application and read its settings"""
+        self.app = app
+        self.enabled = app.config.get('PROGRESS_BUFFER_ENABLED', True)
+        self.flush_interval = app.config.get('PROGRESS_FLUSH_INTERVAL', 5)
+        self.batch_size = app.config.get('PROGRESS_FLUSH_BATCH_SIZE', 500)
+        self._max_known_keys = app.config.get('PROGRESS_KNOWN_KEYS_LIMIT', 100000)
+        app.extensions['progress_buffer'] = self
+        atexit.register(self.shutdown)
+
+    def history_exists(self, student_id, video_id):
+        """
+        Check that a study history row exists for the pair.
+
+        Confirmed pairs are remembered, so steady-state heartbeats skip the lookup.
+        """
+        key = (student_id, video_id)
+        if key in self._known_keys:
+            return True
+
+        exists = db.session.query(StudyHistory.id).filter_by(
+            student_id=student_id, video_id=video_id
+        ).first() is not None
+
+        if exists:
+            with self._lock:
+                if len(self._known_keys) >= self._max_known_keys:
+                    self._known_keys.clear()
+                self._known_keys.add(key)
+        return exists
+
+    def add(self, student_id, video_id, watch_duration, completion_percentage):
+        """
+        Record a heartbeat and return the merged state for the pair
+
+        Args:
+            student_id: ID of the student watching
+            video_id: ID of the video being watched
+            watch_duration: Current position in seconds
+            completion_percentage: Completion percentage for this heartbeat
+
+        Returns:
+            dict: Merged pending state (watch_duration, completion_percentage,
+                  is_completed, completed, last_watched)
+        """
+        key = (student_id, video_id)
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = {
+                    'watch_duration': watch_duration,
+                    'completion_percentage': completion_percentage,
+                    'last_watched': now
+                }
+                self._pending[key] = entry
+            else:
+                entry['watch_duration'] = max(entry['watch_duration'], watch_duration)
+                entry['completion_percentage'] = max(entry['completion_percentage'], completion_percentage)
+                entry['last_watched'] = now
+
+            entry['is_completed'] = entry['completion_percentage'] >= 70
+            entry['completed'] = entry['completion_percentage'] >= 95
+            merged = dict(entry)
+            pending_count = len(self._pending)
+
+        if not self.enabled:
+            self.flush()
+        elif pending_count >= self.batch_size:
+            self._wakeup.set()
+
+        self._ensure_worker()
+        return merged
+
+    def flush(self):
+        """
+        Write all pending heartbeats to the database
+
+        Returns:
+            int: Number of (student, video) pairs written
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                pending, self._pending = self._pending, {}
+
+            rows = [
+                {
+                    'b_student_id': student_id,
+                    'b_video_id': video_id,
+                    'b_watch_duration': entry['watch_duration'],
+                    'b_completion_percentage': entry['completion_percentage'],
+                    'b_is_completed': entry['is_completed'],
+                    'b_completed': entry['completed'],
+                    'b_last_watched': entry['last_watched']
+                }
+                for (student_id, video_id), entry in pending.items()
+            ]
+
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        self._write(rows)
+                else:
+                    self._write(rows)
+            except Exception as e:
+                logger.error(f"Progress flush error: {str(e)}", exc_info=True)
+                self._requeue(pending)
+                return 0
+
+            logger.debug(f"Flushed {len(rows)} progress updates")
+            return len(rows)
+
+    def _write(self, rows):
+        """Execute the bulk UPDATE in batches of batch_size, counting new completions"""
+        table = StudyHistory.__table__
+        # Never move a row backwards: a late, lower heartbeat must not undo
+        # progress written by an earlier flush.
+        stmt = update(table).where(
+            table.c.student_id == bindparam('b_student_id'),
+            table.c.video_id == bindparam('b_video_id')
+        ).values(
+            watch_duration=case(
+                (table.c.watch_duration > bindparam('b_watch_duration'), table.c.watch_duration),
+                else_=bindparam('b_watch_duration')
+            ),
+            completion_percentage=case(
+                (table.c.completion_percentage > bindparam('b_completion_percentage'), table.c.completion_percentage),
+                else_=bindparam('b_completion_percentage')
+            ),
+            is_completed=or_(table.c.is_completed == True, bindparam('b_is_completed')),
+            completed=or_(table.c.completed == True, bindparam('b_completed')),
+            last_watched=bindparam('b_last_watched')
+        )
+
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                # Flip newly completed rows first so each completion is counted once
+                claimed = claim_completions(db.session.connection(), [
+                    (row['b_student_id'], row['b_video_id']) for row in batch if row['b_is_completed']
+                ])
+                db.session.execute(stmt, batch)
+                apply_completions(db.session.connection(),
+                                  [(student_id, video_id, 1) for student_id, video_id in claimed],
+                                  db.session)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _requeue(self, pending):
+        """Merge entries from a failed flush back into the buffer"""
+        with self._lock:
+            for key, entry in pending.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = entry
+                    continue
+                current['watch_duration'] = max(current['watch_duration'], entry['watch_duration'])
+                current['completion_percentage'] = max(current['completion_percentage'], entry['completion_percentage'])
+                current['is_completed'] = current['is_completed'] or entry['is_completed']
+                current['completed'] = current['completed'] or entry['completed']
+                current['last_watched'] = max(current['last_watched'], entry['last_watched'])
+
+    def _ensure_worker(self):
+        """Start the flush thread in this process if it is not running"""
+        if not self.enabled:
+            return
+        # Worker threads do not survive fork(), so track the owning pid
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='progress-buffer', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        """Background loop flushing on the timer or size threshold"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def pending_count(self):
+        """Number of (student, video) pairs waiting to be written"""
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self):
+        """Flush anything still pending before the process exits"""
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Progress buffer shutdown flush error: {str(e)}", exc_info=True)
+
+
+progress_buffer = ProgressBuffer()
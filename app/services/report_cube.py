@@ -0,0 +1,354 @@
+"""
+Report Cube
+Enrollments, completions, revenue and ticket volume pre-aggregated by
+course x month x category for the admin and management reports
+"""
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.constants import EnrollmentStatus, PaymentStatus
+from app.models import Course, Enrollment, Payment, SupportTicket, ReportCube, ReportCubeState
+from app.services.revenue import _bucket_expression, _as_date
+
+logger = logging.getLogger(__name__)
+
+UNCATEGORIZED = 'uncategorized'
+# Rows updated this long before the last refresh are checked again, covering
+# transactions that were still open and clocks that disagree slightly
+CHANGE_OVERLAP = timedelta(minutes=5)
+
+
+def _month_start(value):
+    """First day of the month containing a datetime"""
+    return value.date().replace(day=1)
+
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _in_months(column, start, months):
+    """Filter on a datetime column: from the start month onward, or within any of the months"""
+    clauses = [column >= datetime.combine(start, datetime.min.time())] if start else []
+    clauses.extend(
+        db.and_(column >= datetime.combine(month, datetime.min.time()),
+                column < datetime.combine(_next_month(month), datetime.min.time()))
+        for month in months
+    )
+    return db.or_(*clauses)
+
+
+def _changed_months(since, start):
+    """
+    Months before start whose facts changed after since
+
+    Covers status changes and late payments on old enrollments, ticket
+    edits, and courses moved to another category. Deleted rows are only
+    dropped by a full rebuild.
+
+    Args:
+        since: Time of the previous refresh
+        start: First month the refresh re-aggregates anyway
+
+    Returns:
+        set: Months (dates) to re-aggregate
+    """
+    months = set()
+    for date_column, updated_column in (
+        (Enrollment.enrollment_date, Enrollment.updated_at),
+        (Payment.payment_date, Payment.updated_at),
+        (SupportTicket.created_at, SupportTicket.updated_at)
+    ):
+        month = _bucket_expression('month', date_column)
+        months.update(_as_date(bucket) for (bucket,) in db.session.query(month).filter(
+            updated_column >= since,
+            date_column.isnot(None)
+        ).distinct())
+
+    # Cells are stored under the course's category at aggregation time
+    months.update(_as_date(bucket) for (bucket,) in db.session.query(ReportCube.month).join(
+        Course, Course.id == ReportCube.course_id
+    ).filter(
+        ReportCube.category != db.func.coalesce(Course.category, UNCATEGORIZED)
+    ).distinct())
+
+    return {month for month in months if start is None or month < start}
+
+
+def _aggregate(start, months=()):
+    """
+    Aggregate the base tables into cube cells
+
+    Args:
+        start: First month to aggregate (date), or None for all history
+        months: Earlier months to aggregate as well
+
+    Returns:
+        dict: (course_id, month, category) -> column values
+    """
+    categories = dict(db.session.query(Course.id, Course.category).all())
+    cells = {}
+
+    def cell(course_id, month, category):
+        key = (course_id, _as_date(month), category or UNCATEGORIZED)
+        if key not in cells:
+            cells[key] = {
+                'enrollments': 0,
+                'completed_enrollments': 0,
+                'payments': 0,
+                'revenue': 0.0,
+                'tickets': 0
+            }
+        return cells[key]
+
+    partial = start is not None or bool(months)
+
+    month = _bucket_expression('month', Enrollment.enrollment_date)
+    query = db.session.query(
+        Enrollment.course_id,
+        month,
+        db.func.count(Enrollment.id),
+        db.func.sum(db.case(
+            (db.or_(
+                Enrollment.status == EnrollmentStatus.COMPLETED,
+                Enrollment.completion_percentage >= 100
+            ), 1),
+            else_=0
+        ))
+    ).filter(Enrollment.enrollment_date.isnot(None))
+    if partial:
+        query = query.filter(_in_months(Enrollment.enrollment_date, start, months))
+    for course_id, bucket, total, completed in query.group_by(Enrollment.course_id, month).all():
+        values = cell(course_id, bucket, categories.get(course_id))
+        values['enrollments'] = total
+        values['completed_enrollments'] = completed or 0
+
+    month = _bucket_expression('month', Payment.payment_date)
+    query = db.session.query(
+        Payment.course_id,
+        month,
+        db.func.count(Payment.id),
+        db.func.sum(Payment.amount_npr)
+    ).filter(
+        Payment.status == PaymentStatus.COMPLETED,
+        Payment.payment_date.isnot(None)
+    )
+    if partial:
+        query = query.filter(_in_months(Payment.payment_date, start, months))
+    for course_id, bucket, total, revenue in query.group_by(Payment.course_id, month).all():
+        values = cell(course_id, bucket, categories.get(course_id))
+        values['payments'] = total
+        values['revenue'] = revenue or 0.0
+
+    month = _bucket_expression('month', SupportTicket.created_at)
+    query = db.session.query(
+        SupportTicket.category,
+        month,
+        db.func.count(SupportTicket.id)
+    ).filter(SupportTicket.created_at.isnot(None))
+    if partial:
+        query = query.filter(_in_months(SupportTicket.created_at, start, months))
+    for category, bucket, total in query.group_by(SupportTicket.category, month).all():
+        cell(None, bucket, category)['tickets'] = total
+
+    return cells
+
+
+def _lock_state():
+    """
+    Load the watermark row, holding its write lock until the refresh commits
+
+    Writing the row before reading anything serializes refreshes: on
+    PostgreSQL a concurrent refresh waits on the row lock, and on SQLite
+    the write takes the database lock. Two refreshes can therefore never
+    delete and re-insert the same cells at once.
+
+    Returns:
+        ReportCubeState: The locked row, read after the lock was taken
+    """
+    table = ReportCubeState.__table__
+    lock = db.update(table).where(table.c.id == ReportCubeState.SINGLETON_ID).values(
+        refreshed_at=table.c.refreshed_at
+    )
+    if not db.session.execute(lock).rowcount:
+        db.session.add(ReportCubeState(id=ReportCubeState.SINGLETON_ID))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another refresh created it first
+            db.session.rollback()
+        db.session.execute(lock)
+    return db.session.get(ReportCubeState, ReportCubeState.SINGLETON_ID, populate_existing=True)
+
+
+def refresh_report_cube(full=False, max_age=None):
+    """
+    Bring the report cube up to date
+
+    An incremental refresh re-aggregates the months from the oldest
+    watermark onward, plus any earlier month with rows updated since the
+    previous refresh. Every REPORT_CUBE_REBUILD_INTERVAL the cube is
+    rebuilt in full, which also drops the facts of deleted rows.
+
+    Args:
+        full: Rebuild every month instead of refreshing from the watermarks
+        max_age: Skip the refresh if another one finished within this many
+                 seconds while this one waited for the lock
+
+    Returns:
+        ReportCubeState: Updated watermarks
+    """
+    # Aggregating a lagging replica would store stale cells under fresh watermarks
+    db.session().use_primary()
+    try:
+        state = _lock_state()
+        now = datetime.utcnow()
+        if max_age is not None and not full and state.rebuilt_at and state.refreshed_at and (
+            now - state.refreshed_at < timedelta(seconds=max_age)
+        ):
+            db.session.commit()
+            return state
+
+        rebuild_interval = timedelta(seconds=current_app.config.get('REPORT_CUBE_REBUILD_INTERVAL', 86400))
+        if state.change_watermark is None or state.rebuilt_at is None or (
+            now - state.rebuilt_at >= rebuild_interval
+        ):
+            full = True
+
+        start = None
+        months = set()
+        if not full:
+            watermarks = [w for w in (
+                state.enrollment_watermark,
+                state.payment_watermark,
+                state.ticket_watermark
+            ) if w is not None]
+            if watermarks:
+                start = _month_start(min(watermarks))
+                months = _changed_months(state.change_watermark - CHANGE_OVERLAP, start)
+
+        # Read the new watermarks first so rows landing mid-refresh are picked up next time
+        enrollment_watermark = db.session.query(db.func.max(Enrollment.enrollment_date)).scalar()
+        payment_watermark = db.session.query(db.func.max(Payment.payment_date)).scalar()
+        ticket_watermark = db.session.query(db.func.max(SupportTicket.created_at)).scalar()
+
+        cells = _aggregate(start, months)
+
+        stale = ReportCube.query
+        if start:
+            stale = stale.filter(db.or_(ReportCube.month >= start, ReportCube.month.in_(months)))
+        stale.delete(synchronize_session=False)
+
+        if cells:
+            db.session.execute(db.insert(ReportCube), [
+                dict(course_id=course_id, month=month, category=category, **values)
+                for (course_id, month, category), values in cells.items()
+            ])
+
+        state.enrollment_watermark = enrollment_watermark or state.enrollment_watermark
+        state.payment_watermark = payment_watermark or state.payment_watermark
+        state.ticket_watermark = ticket_watermark or state.ticket_watermark
+        state.change_watermark = now
+        if start is None:
+            state.rebuilt_at = now
+        state.refreshed_at = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Report cube refreshed from {start or 'the beginning'}"
+                f"{f' and {len(months)} earlier months' if months else ''}: {len(cells)} cells")
+    return state
+
+
+def get_report_summary():
+    """
+    Read the reports page figures from the cube
+
+    The cube is refreshed first when it is older than REPORT_CUBE_REFRESH_INTERVAL.
+
+    Returns:
+        dict: 'totals', 'courses' (by revenue), 'categories' (by revenue),
+            'tickets_by_category' (by volume) and 'refreshed_at'
+    """
+    state = db.session.get(ReportCubeState, ReportCubeState.SINGLETON_ID)
+    interval = current_app.config.get('REPORT_CUBE_REFRESH_INTERVAL', 300)
+    if state is None or not state.refreshed_at or (
+        datetime.utcnow() - state.refreshed_at >= timedelta(seconds=interval)
+    ):
+        # Concurrent viewers queue on the refresh lock; all but the first reuse its result
+        state = refresh_report_cube(max_age=interval)
+
+    course_rows = db.session.query(
+        ReportCube.course_id,
+        db.func.sum(ReportCube.enrollments),
+        db.func.sum(ReportCube.completed_enrollments),
+        db.func.sum(ReportCube.payments),
+        db.func.sum(ReportCube.revenue)
+    ).filter(ReportCube.course_id.isnot(None)).group_by(ReportCube.course_id).all()
+    facts = {row[0]: row[1:] for row in course_rows}
+
+    def rate(completed, total):
+        return round(completed * 100.0 / total, 1) if total else 0.0
+
+    courses = []
+    categories = {}
+    for course_id, title, category, price in db.session.query(
+        Course.id, Course.title, Course.category, Course.price_npr
+    ).all():
+        enrollments, completed, payments, revenue = facts.get(course_id, (0, 0, 0, 0.0))
+        courses.append({
+            'id': course_id,
+            'title': title,
+            'category': category or UNCATEGORIZED,
+            'price': price or 0.0,
+            'enrollments': enrollments or 0,
+            'completion_rate': rate(completed or 0, enrollments or 0),
+            'payments': payments or 0,
+            'revenue': revenue or 0.0
+        })
+
+        group = categories.setdefault(category or UNCATEGORIZED, {
+            'category': category or UNCATEGORIZED,
+            'enrollments': 0,
+            'completed_enrollments': 0,
+            'revenue': 0.0
+        })
+        group['enrollments'] += enrollments or 0
+        group['completed_enrollments'] += completed or 0
+        group['revenue'] += revenue or 0.0
+
+    for group in categories.values():
+        group['completion_rate'] = rate(group['completed_enrollments'], group['enrollments'])
+
+    tickets_by_category = [
+        {'category': category, 'tickets': tickets}
+        for category, tickets in db.session.query(
+            ReportCube.category, db.func.sum(ReportCube.tickets)
+        ).filter(ReportCube.course_id.is_(None)).group_by(ReportCube.category).order_by(
+            db.func.sum(ReportCube.tickets).desc()
+        ).all()
+    ]
+
+    enrollments = sum(c['enrollments'] for c in courses)
+    completed = sum(g['completed_enrollments'] for g in categories.values())
+    totals = {
+        'revenue': sum(c['revenue'] for c in courses),
+        'payments': sum(c['payments'] for c in courses),
+        'enrollments': enrollments,
+        'completion_rate': rate(completed, enrollments),
+        'tickets': sum(t['tickets'] for t in tickets_by_category),
+        'courses': len(courses),
+        'average_price': sum(c['price'] for c in courses) / len(courses) if courses else 0.0
+    }
+
+    return {
+        'totals': totals,
+        'courses': sorted(courses, key=lambda c: (c['revenue'], c['enrollments']), reverse=True),
+        'categories': sorted(categories.values(), key=lambda g: g['revenue'], reverse=True),
+        'tickets_by_category': tickets_by_category,
+        'refreshed_at': state.refreshed_at
+    }
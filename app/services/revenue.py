@@ -0,0 +1,123 @@
+"""
+Revenue Time Series
+Completed-payment revenue bucketed by calendar month, week or day
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import joinedload
+from app import db
+from app.constants import PaymentStatus
+from app.models import Payment
+
+GRANULARITIES = ('month', 'week', 'day')
+
+LABEL_FORMATS = {
+    'month': '%b %Y',
+    'week': '%d %b %Y',
+    'day': '%d %b'
+}
+
+
+def _bucket_start(day, granularity):
+    """First day of the bucket containing the given date"""
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())  # weeks start on Monday
+    return day
+
+
+def _previous_bucket(start, granularity):
+    """Start of the bucket immediately before the one starting at start"""
+    if granularity == 'month':
+        return (start - timedelta(days=1)).replace(day=1)
+    if granularity == 'week':
+        return start - timedelta(days=7)
+    return start - timedelta(days=1)
+
+
+def _bucket_expression(granularity, column=Payment.payment_date):
+    """SQL expression truncating a datetime column to its bucket start"""
+    dialect = db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        return db.func.date_trunc(granularity, column)
+
+    # SQLite
+    if granularity == 'month':
+        return db.func.strftime('%Y-%m-01', column)
+    if granularity == 'week':
+        # 'weekday 0' moves forward to Sunday (or stays), -6 days lands on Monday
+        return db.func.date(column, 'weekday 0', '-6 days')
+    return db.func.date(column)
+
+
+def _as_date(value):
+    """Normalize a bucket value from either backend to a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def get_revenue_series(periods=6, granularity='month', end=None):
+    """
+    Get completed-payment revenue for the last N calendar buckets
+
+    All buckets come from one GROUP BY query; buckets without payments are
+    filled with zero.
+
+    Args:
+        periods: Number of buckets to return, oldest first
+        granularity: 'month', 'week' or 'day'
+        end: Date inside the most recent bucket (defaults to today, UTC)
+
+    Returns:
+        list: Dicts with 'start' (date), 'label' (str) and 'revenue' (float)
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    end = end or datetime.utcnow().date()
+    starts = [_bucket_start(end, granularity)]
+    for _ in range(periods - 1):
+        starts.append(_previous_bucket(starts[-1], granularity))
+    starts.reverse()
+
+    bucket = _bucket_expression(granularity)
+    rows = db.session.query(
+        bucket.label('bucket'),
+        db.func.sum(Payment.amount_npr)
+    ).filter(
+        Payment.status == PaymentStatus.COMPLETED,
+        Payment.payment_date >= datetime.combine(starts[0], datetime.min.time())
+    ).group_by(bucket).all()
+
+    totals = {_as_date(value): revenue or 0 for value, revenue in rows}
+
+    series = []
+    for start in starts:
+        series.append({
+            'start': start,
+            'label': start.strftime(LABEL_FORMATS[granularity]),
+            'revenue': totals.get(start, 0)
+        })
+    return series
+
+
+def get_recent_payments(limit=20):
+    """
+    Get the most recent completed payments with student and course loaded
+
+    Args:
+        limit: Maximum number of payments
+
+    Returns:
+        list: Payment objects, newest first
+    """
+    return Payment.query.options(
+        joinedload(Payment.student),
+        joinedload(Payment.course)
+    ).filter(
+        Payment.status == PaymentStatus.COMPLETED
+    ).order_by(Payment.payment_date.desc(), Payment.id.desc()).limit(limit).all()
@@ -0,0 +1,161 @@
+"""
+Schema Maintenance
+Brings existing databases up to the columns and indexes declared on the models
+"""
+import logging
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+from app import db
+from app.models import Certificate, StudyHistory
+
+logger = logging.getLogger(__name__)
+
+# Indexes replaced by differently named ones; dropped once the replacement exists
+SUPERSEDED_INDEXES = {
+    'certificate': {'ix_certificate_student_id_course_id': 'uq_certificate_student_course'},
+}
+
+
+def merge_duplicate_study_history():
+    """
+    Collapse duplicate study_history rows into one row per (student, video)
+
+    The surviving row keeps the furthest progress of the group, so adding the
+    unique index never loses watch data.
+
+    Returns:
+        int: Number of duplicate rows removed
+    """
+    duplicates = db.session.query(
+        StudyHistory.student_id, StudyHistory.video_id
+    ).group_by(
+        StudyHistory.student_id, StudyHistory.video_id
+    ).having(db.func.count(StudyHistory.id) > 1).all()
+
+    removed = 0
+    for student_id, video_id in duplicates:
+        rows = StudyHistory.query.filter_by(
+            student_id=student_id, video_id=video_id
+        ).order_by(StudyHistory.id).all()
+        keeper, extras = rows[0], rows[1:]
+
+        keeper.watch_duration = max(r.watch_duration or 0 for r in rows)
+        keeper.completion_percentage = max(r.completion_percentage or 0 for r in rows)
+        keeper.is_completed = any(r.is_completed for r in rows)
+        keeper.completed = any(r.completed for r in rows)
+        keeper.last_watched = max((r.last_watched for r in rows if r.last_watched), default=keeper.last_watched)
+
+        for row in extras:
+            db.session.delete(row)
+        removed += len(extras)
+
+    db.session.commit()
+    if removed:
+        logger.info(f"Merged {removed} duplicate study history rows")
+    return removed
+
+
+def merge_duplicate_certificates():
+    """
+    Keep one certificate per (student, course) so the unique index can be added
+
+    The survivor is the oldest certificate with a rendered PDF, or the
+    oldest one when none has a PDF.
+
+    Returns:
+        int: Number of duplicate certificates removed
+    """
+    duplicates = db.session.query(
+        Certificate.student_id, Certificate.course_id
+    ).group_by(
+        Certificate.student_id, Certificate.course_id
+    ).having(db.func.count(Certificate.id) > 1).all()
+
+    removed = 0
+    for student_id, course_id in duplicates:
+        rows = Certificate.query.filter_by(
+            student_id=student_id, course_id=course_id
+        ).order_by(Certificate.id).all()
+        keeper = next((r for r in rows if r.pdf_generated_at), rows[0])
+        for row in rows:
+            if row is not keeper:
+                db.session.delete(row)
+                removed += 1
+
+    db.session.commit()
+    if removed:
+        logger.info(f"Removed {removed} duplicate certificates")
+    return removed
+
+
+def ensure_columns():
+    """
+    Add columns declared on the models that existing tables are missing
+
+    Only columns that are nullable or carry a server default can be added
+    to populated tables; others are reported and skipped.
+
+    Returns:
+        list: 'table.column' names that were added
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                logger.warning(f"Cannot add {table.name}.{column.name}: NOT NULL without a server default")
+                continue
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}')
+            added.append(f'{table.name}.{column.name}')
+            logger.info(f"Added column {column.name} to {table.name}")
+
+    return added
+
+
+def ensure_indexes():
+    """
+    Create any index declared on the models that the database is missing
+
+    Safe to run repeatedly on SQLite and PostgreSQL; existing indexes are
+    left untouched.
+
+    Returns:
+        list: Names of the indexes that were created
+    """
+    ensure_columns()
+    merge_duplicate_study_history()
+    merge_duplicate_certificates()
+
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            index.create(bind=engine)
+            created.append(index.name)
+            logger.info(f"Created index {index.name} on {table.name}")
+
+        for old_name, new_name in SUPERSEDED_INDEXES.get(table.name, {}).items():
+            if old_name in existing and (new_name in existing or new_name in created):
+                db.Index(old_name, _table=table).drop(bind=engine)
+                logger.info(f"Dropped superseded index {old_name} on {table.name}")
+
+    return created
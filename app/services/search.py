@@ -0,0 +1,381 @@
+"""
+Full-Text Search
+Ranked search over courses and support tickets, backed by an SQLite FTS5
+table or a PostgreSQL tsvector column with a GIN index, and kept current by
+ORM flush hooks
+"""
+import logging
+import re
+from flask import current_app, has_app_context, request
+from sqlalchemy import column, event, func, inspect, literal_column, or_, select, table
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Course, SupportTicket, TicketResponse
+from app.utils.pagination import Page, get_per_page
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'search_document'
+
+# Document kind -> (model, code); doc_id = ref_id * 4 + code keeps one row per document
+SEARCH_KINDS = {
+    'course': (Course, 1),
+    'ticket': (SupportTicket, 2),
+}
+
+MAX_TERMS = 10
+
+_document = table(SEARCH_TABLE, column('doc_id'), column('kind'), column('ref_id'),
+                  column('title'), column('body'), column('document'))
+# FTS5 tables key documents by their rowid
+_fts_document = table(SEARCH_TABLE, column('rowid'), column('kind'), column('ref_id'),
+                      column('title'), column('body'))
+_ready = {}  # engine url -> whether the search table exists
+
+
+class RankedPage(Page):
+    """Page of search results in rank order; cursors are result offsets"""
+
+    ranked = True
+
+
+def _text_config():
+    name = current_app.config.get('SEARCH_TEXT_CONFIG', 'english')
+    if not re.fullmatch(r'\w+', name):
+        raise ValueError(f'Invalid SEARCH_TEXT_CONFIG {name!r}')
+    return name
+
+
+def _search_ddl(dialect_name, text_config='english'):
+    if dialect_name == 'postgresql':
+        return [
+            f"""CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (
+                doc_id BIGINT PRIMARY KEY,
+                kind VARCHAR(20) NOT NULL,
+                ref_id INTEGER NOT NULL,
+                title TEXT,
+                body TEXT,
+                document TSVECTOR GENERATED ALWAYS AS (
+                    setweight(to_tsvector('{text_config}', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('{text_config}', coalesce(body, '')), 'B')
+                ) STORED
+            )""",
+            f'CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)',
+        ]
+    if dialect_name == 'sqlite':
+        # prefix indexes make 2 and 3 letter autocomplete prefixes an index lookup
+        return [
+            f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+                kind UNINDEXED, ref_id UNINDEXED, title, body,
+                tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+            )"""
+        ]
+    return []
+
+
+def _create_search_table(connection):
+    text_config = current_app.config.get('SEARCH_TEXT_CONFIG', 'english') if has_app_context() else 'english'
+    statements = _search_ddl(connection.dialect.name, text_config)
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+    _ready.pop(str(connection.engine.url), None)
+    return bool(statements)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_with_tables(target, connection, **kw):
+    try:
+        with connection.begin_nested():
+            _create_search_table(connection)
+    except Exception as e:
+        logger.warning(f"Search index unavailable: {str(e)}")
+
+
+def ensure_search_index():
+    """
+    Create the search table if it is missing and fill it on first creation
+
+    Returns:
+        int: Number of documents indexed (0 when the index already existed)
+    """
+    engine = db.engine
+    existed = inspect(engine).has_table(SEARCH_TABLE)
+    with engine.begin() as connection:
+        if not _create_search_table(connection):
+            logger.warning(f"Full-text search is not supported on {engine.dialect.name}")
+            return 0
+    return 0 if existed else rebuild_search_index()
+
+
+def search_available(connection=None):
+    """Whether the search table exists on the current database"""
+    # Check the database the search query itself will run on
+    connection = connection or db.session.connection(bind_arguments={'clause': _document})
+    key = str(connection.engine.url)
+    if key not in _ready:
+        _ready[key] = inspect(connection).has_table(SEARCH_TABLE)
+    return _ready[key]
+
+
+def _doc_id(kind, ref_id):
+    return ref_id * 4 + SEARCH_KINDS[kind][1]
+
+
+def _document_rows(connection, kind, ids):
+    """(ref_id, title, body) for documents of one kind, read inside the current transaction"""
+    if kind == 'course':
+        course = Course.__table__
+        rows = connection.execute(
+            select(course.c.id, course.c.title, course.c.category, course.c.description)
+            .where(course.c.id.in_(ids))
+        ).all()
+        return [(row.id, row.title, ' '.join(filter(None, [row.category, row.description]))) for row in rows]
+
+    ticket = SupportTicket.__table__
+    response = TicketResponse.__table__
+    messages = {}
+    for ticket_id, message in connection.execute(
+        select(response.c.ticket_id, response.c.message)
+        .where(response.c.ticket_id.in_(ids))
+        .order_by(response.c.ticket_id, response.c.id)
+    ):
+        messages.setdefault(ticket_id, []).append(message or '')
+    rows = connection.execute(
+        select(ticket.c.id, ticket.c.title, ticket.c.description).where(ticket.c.id.in_(ids))
+    ).all()
+    return [(row.id, row.title, '\n'.join([row.description or ''] + messages.get(row.id, []))) for row in rows]
+
+
+def index_documents(connection, kind, ids):
+    """
+    Replace the search documents of the given rows, dropping rows that no longer exist
+
+    Args:
+        connection: Connection of the transaction that changed the rows
+        kind: Key of SEARCH_KINDS
+        ids: Primary keys of the changed rows
+    """
+    documents = _fts_document if connection.dialect.name == 'sqlite' else _document
+    key = documents.c[0]
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        connection.execute(documents.delete().where(key.in_([_doc_id(kind, ref_id) for ref_id in batch])))
+        rows = _document_rows(connection, kind, batch)
+        if rows:
+            connection.execute(documents.insert(), [
+                {key.name: _doc_id(kind, ref_id), 'kind': kind, 'ref_id': ref_id, 'title': title, 'body': body}
+                for ref_id, title, body in rows
+            ])
+
+
+def rebuild_search_index():
+    """
+    Reindex every course and support ticket
+
+    Returns:
+        int: Number of documents indexed
+    """
+    connection = db.session.connection()
+    if not search_available(connection):
+        return 0
+    total = 0
+    try:
+        connection.execute(_document.delete())
+        for kind, (model, _) in SEARCH_KINDS.items():
+            ids = [ref_id for (ref_id,) in db.session.query(model.id)]
+            index_documents(connection, kind, ids)
+            total += len(ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info(f"Indexed {total} search documents")
+    return total
+
+
+def _terms(text):
+    return re.findall(r'\w+', (text or '').lower())[:MAX_TERMS]
+
+
+def _match_subquery(kind, terms, titles_only=False, candidates=None):
+    """
+    Subquery of (ref_id, score) matching every term, the last one as a prefix; lower score is better
+
+    Scoring costs time per matching document, so only the newest
+    SEARCH_MAX_CANDIDATES matches are ranked. The window is taken after the
+    caller's filters, so rows the caller cannot see never push visible
+    matches out of it; this only changes results for terms found in most
+    of the visible documents.
+
+    Args:
+        candidates: SELECT of the ref_ids the caller's filters allow (optional)
+    """
+    code = SEARCH_KINDS[kind][1]
+    window = current_app.config.get('SEARCH_MAX_CANDIDATES', 2000)
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        weight = 'A' if titles_only else ''
+        query = func.to_tsquery(db.cast(_text_config(), REGCONFIG),
+                                ' & '.join([f'{term}:{weight}' if weight else term for term in terms[:-1]]
+                                           + [f'{terms[-1]}:*{weight}']))
+        key = _document.c.doc_id
+        matches = (_document.c.document.op('@@')(query), _document.c.kind == kind)
+        score = -func.ts_rank_cd(_document.c.document, query)
+        ref_id = _document.c.ref_id
+    else:
+        # FTS5 phrase syntax; quoting keeps operators typed by users literal
+        query = ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        if titles_only:
+            query = f'title : ({query})'
+        fts = literal_column(SEARCH_TABLE)
+        key = _fts_document.c.rowid
+        # kind and ref_id come from the rowid; reading UNINDEXED columns per match is much slower
+        matches = (fts.op('MATCH')(query), key % 4 == code)
+        score = func.bm25(fts, 0.0, 0.0, 10.0, 1.0)
+        ref_id = (key - code) // 4
+
+    if candidates is not None:
+        matches += (ref_id.in_(candidates),)
+    oldest = select(key).where(*matches).order_by(key.desc()).offset(window - 1).limit(1).scalar_subquery()
+    return select(ref_id.label('ref_id'), score.label('score')).where(
+        *matches, key >= func.coalesce(oldest, 0)
+    ).subquery()
+
+
+def _fallback_filter(kind, terms, titles_only=False):
+    """LIKE filter used when the database has no search table"""
+    model = SEARCH_KINDS[kind][0]
+    columns = [model.title]
+    if not titles_only:
+        columns += [model.description] + ([model.category] if kind == 'course' else [])
+    return [or_(*(col.ilike(f'%{term}%') for col in columns)) for term in terms]
+
+
+def search_query(kind, text, query=None, titles_only=False):
+    """
+    Restrict a query to rows matching a search, best matches first
+
+    Args:
+        kind: Key of SEARCH_KINDS
+        text: Search text typed by the user
+        query: ORM query over the kind's model with filters applied
+               (defaults to all rows of the model)
+        titles_only: Match titles only, as autocomplete does
+
+    Returns:
+        Query: Matching rows in rank order, or None when text has no words
+    """
+    model = SEARCH_KINDS[kind][0]
+    candidates = query.with_entities(model.id).order_by(None).statement if query is not None else None
+    query = query if query is not None else model.query
+    terms = _terms(text)
+    if not terms:
+        return None
+    if not search_available():
+        return query.filter(*_fallback_filter(kind, terms, titles_only)).order_by(model.id.desc())
+    match = _match_subquery(kind, terms, titles_only, candidates)
+    return query.join(match, match.c.ref_id == model.id).order_by(match.c.score, model.id.desc())
+
+
+def search_page(kind, text, query=None, offset=0, per_page=None):
+    """
+    One page of ranked search results
+
+    Args:
+        kind: Key of SEARCH_KINDS
+        text: Search text typed by the user
+        query: ORM query over the kind's model with filters applied
+        offset: Number of results to skip
+        per_page: Page size (defaults to get_per_page())
+
+    Returns:
+        RankedPage: Matching rows; next/prev cursors are result offsets
+    """
+    per_page = per_page or get_per_page()
+    offset = max(0, offset)
+    ranked = search_query(kind, text, query)
+    rows = ranked.offset(offset).limit(per_page + 1).all() if ranked is not None else []
+    next_cursor = str(offset + per_page) if len(rows) > per_page else None
+    prev_cursor = str(max(0, offset - per_page)) if offset else None
+    return RankedPage(rows[:per_page], per_page, next_cursor, prev_cursor)
+
+
+def search_suggestions(kind, text, query=None, limit=8):
+    """
+    Titles of the best matches for autocomplete
+
+    Args:
+        kind: Key of SEARCH_KINDS
+        text: Partial search text
+        query: ORM query over the kind's model with filters applied
+        limit: Maximum number of suggestions
+
+    Returns:
+        list: [{'id', 'title'}] best match first
+    """
+    model = SEARCH_KINDS[kind][0]
+    ranked = search_query(kind, text, query, titles_only=True)
+    if ranked is None:
+        return []
+    rows = ranked.with_entities(model.id, model.title).limit(limit).all()
+    return [{'id': ref_id, 'title': title} for ref_id, title in rows]
+
+
+def search_request(kind, query=None):
+    """
+    Search using the q, after/before and per_page query string arguments
+
+    Args:
+        kind: Key of SEARCH_KINDS
+        query: ORM query over the kind's model with filters applied
+
+    Returns:
+        RankedPage: Current page of results, or None when no search was made
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return None
+    offset = request.args.get('after', type=int)
+    if offset is None:
+        offset = request.args.get('before', 0, type=int)
+    return search_page(kind, text, query, offset=offset)
+
+
+_SEARCHED_COLUMNS = {
+    Course: ('title', 'description', 'category'),
+    SupportTicket: ('title', 'description'),
+}
+
+
+def _changed(obj, columns):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in columns)
+
+
+@event.listens_for(Session, 'after_flush')
+def _reindex_changed_documents(session, flush_context):
+    changed = {kind: set() for kind in SEARCH_KINDS}
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Course) and (obj in session.new or obj in session.deleted
+                                        or _changed(obj, _SEARCHED_COLUMNS[Course])):
+            changed['course'].add(obj.id)
+        elif isinstance(obj, SupportTicket) and (obj in session.new or obj in session.deleted
+                                                 or _changed(obj, _SEARCHED_COLUMNS[SupportTicket])):
+            changed['ticket'].add(obj.id)
+        elif isinstance(obj, TicketResponse) and (obj in session.new or obj in session.deleted
+                                                  or _changed(obj, ('message', 'ticket_id'))):
+            changed['ticket'].add(obj.ticket_id)
+            old_ticket = inspect(obj).attrs['ticket_id'].history.deleted
+            changed['ticket'].update(ticket_id for ticket_id in old_ticket if ticket_id is not None)
+
+    changed = {kind: ids - {None} for kind, ids in changed.items()}
+    if not any(changed.values()):
+        return
+    connection = session.connection()
+    if not search_available(connection):
+        return
+    for kind, ids in changed.items():
+        if ids:
+            index_documents(connection, kind, ids)
@@ -0,0 +1,441 @@
+"""
+Server-Side Sessions
+Session data kept in a shared SQLite file (or process memory) behind an
+in-memory LRU, with only an opaque session id in the cookie
+"""
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from collections.abc import MutableMapping
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from app.models import User
+from app.utils.decorators import forget_cached_role
+from app.utils.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Seconds a rotated-away session id stays valid for requests already in flight
+ROTATION_GRACE = 30
+
+_REVOKED_USERS = 'session_revoked_users'
+
+
+def _key(sid):
+    """Store key for a session id; a leaked store does not leak usable cookies"""
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+def _copy(values):
+    """Copy of session data that shares no mutable values with the cached one"""
+    return {key: deepcopy(value) if isinstance(value, (dict, list)) else value
+            for key, value in values.items()}
+
+
+class ServerSession(SessionMixin, MutableMapping):
+    """
+    Session dict that reads the store on first access
+
+    Requests that never touch the session (static files, JSON heartbeats,
+    metrics) do no store lookup and send no cookie.
+    """
+
+    def __init__(self, store, sid=None):
+        self.sid = sid
+        self.modified = False
+        self.accessed = False
+        self._store = store
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            self.accessed = True
+            data = self._store.load(self.sid) if self.sid else None
+            if data is None:
+                self.sid = None
+            self._data = data or {}
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def clear(self):
+        if self._load():
+            self._data.clear()
+            self.modified = True
+
+    def to_dict(self):
+        return dict(self._load())
+
+
+class MemorySessionBackend:
+    """Sessions held in this process only, for development and tests"""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        row = self._rows.get(key)
+        if row is None or row[2] < time.time():
+            return None
+        return row[1], row[2]
+
+    def set(self, key, user_id, data, expires_at):
+        with self._lock:
+            self._rows[key] = (user_id, data, expires_at)
+
+    def touch(self, key, expires_at):
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return False
+            self._rows[key] = (row[0], row[1], max(row[2], expires_at))
+            return True
+
+    def expire(self, key, expires_at):
+        with self._lock:
+            row = self._rows.get(key)
+            if row is not None:
+                self._rows[key] = (row[0], row[1], min(row[2], expires_at))
+
+    def delete(self, key):
+        with self._lock:
+            self._rows.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            keys = [key for key, row in self._rows.items() if row[0] == user_id]
+            for key in keys:
+                del self._rows[key]
+            return len(keys)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            keys = [key for key, row in self._rows.items() if row[2] < now]
+            for key in keys:
+                del self._rows[key]
+            return len(keys)
+
+
+class SQLiteSessionBackend(SQLiteStore):
+    """Sessions shared by every worker on the host through one SQLite file"""
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS session_store ('
+        'key TEXT PRIMARY KEY, user_id INTEGER, data TEXT NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_session_store_user_id ON session_store (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_session_store_expires_at ON session_store (expires_at)',
+    )
+
+    def get(self, key):
+        return self._connect().execute(
+            'SELECT data, expires_at FROM session_store WHERE key = ? AND expires_at >= ?',
+            (key, time.time())
+        ).fetchone()
+
+    def set(self, key, user_id, data, expires_at):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO session_store (key, user_id, data, expires_at) VALUES (?, ?, ?, ?)',
+            (key, user_id, data, expires_at)
+        )
+
+    def touch(self, key, expires_at):
+        return self._connect().execute(
+            'UPDATE session_store SET expires_at = MAX(expires_at, ?) WHERE key = ?',
+            (expires_at, key)
+        ).rowcount > 0
+
+    def expire(self, key, expires_at):
+        self._connect().execute(
+            'UPDATE session_store SET expires_at = MIN(expires_at, ?) WHERE key = ?',
+            (expires_at, key)
+        )
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM session_store WHERE key = ?', (key,))
+
+    def delete_user(self, user_id):
+        return self._connect().execute('DELETE FROM session_store WHERE user_id = ?', (user_id,)).rowcount
+
+    def sweep(self):
+        return self._connect().execute(
+            'DELETE FROM session_store WHERE expires_at < ?', (time.time(),)
+        ).rowcount
+
+
+class SessionStore:
+    """
+    Session storage with a per-process LRU in front of the backend
+
+    The data under a session id never changes: saving modified data writes
+    it under a new id, and the old id lapses after ROTATION_GRACE. A cached
+    entry can therefore never be stale, only revoked, and each worker
+    trusts its cached copy for SESSION_CACHE_TTL seconds before checking
+    the backend again. Expiry slides forward as the session is used.
+    """
+
+    SWEEP_EVERY = 500  # writes between expiry sweeps
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 7 * 24 * 3600
+        self.cache_ttl = 5
+        self.max_entries = 10000
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Create the configured backend and install the session interface"""
+        kind = app.config.get('SESSION_BACKEND', 'sqlite')
+        self.ttl = app.config.get('SESSION_IDLE_TIMEOUT', 7 * 24 * 3600)
+        self.cache_ttl = app.config.get('SESSION_CACHE_TTL', 5)
+        self.max_entries = app.config.get('SESSION_CACHE_MAX_ENTRIES', 10000)
+        with self._lock:
+            self._cache.clear()
+
+        if kind == 'sqlite':
+            path = app.config.get('SESSION_STORE_PATH') or os.path.join(app.instance_path, 'sessions.sqlite')
+            self.backend = SQLiteSessionBackend(path)
+        elif kind == 'memory':
+            self.backend = MemorySessionBackend()
+        else:
+            # Flask's signed cookie sessions
+            self.backend = None
+            return
+        app.session_interface = ServerSessionInterface(self)
+        app.extensions['session_store'] = self
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[3] < time.time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry
+
+    def _remember(self, key, values, expires_at):
+        with self._lock:
+            self._cache[key] = (values.get('user_id'), values, expires_at, time.time() + self.cache_ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def load(self, sid):
+        """
+        Read a session
+
+        Args:
+            sid: Session id from the cookie
+
+        Returns:
+            dict: Session data, or None when the id is unknown, expired or revoked
+        """
+        key = _key(sid)
+        now = time.time()
+        entry = self._cached(key)
+        if entry is not None:
+            values, expires_at = entry[1], entry[2]
+        else:
+            try:
+                row = self.backend.get(key)
+            except Exception as e:
+                logger.error(f"Session load error: {str(e)}", exc_info=True)
+                return None
+            if row is None:
+                return None
+            data, expires_at = row
+            values = session_json_serializer.loads(data)
+
+        if expires_at < now:
+            self._forget(key)
+            return None
+        if expires_at - now < self.ttl / 2:
+            # Slide the expiry forward at most every half TTL, not on every request
+            try:
+                if not self.backend.touch(key, now + self.ttl):
+                    self._forget(key)
+                    return None
+            except Exception as e:
+                logger.error(f"Session touch error: {str(e)}", exc_info=True)
+            expires_at = now + self.ttl
+
+        if entry is None or expires_at != entry[2]:
+            self._remember(key, values, expires_at)
+        # The cache keeps decoded data, so callers get a copy to mutate
+        return _copy(values)
+
+    def save(self, sid, values):
+        """
+        Store session data under a new id
+
+        Args:
+            sid: Current session id, or None for a new session
+            values: Session data
+
+        Returns:
+            str: New session id for the cookie
+        """
+        new_sid = secrets.token_urlsafe(32)
+        key = _key(new_sid)
+        user_id = values.get('user_id')
+        data = session_json_serializer.dumps(values)
+        expires_at = time.time() + self.ttl
+        self.backend.set(key, user_id, data, expires_at)
+        self._remember(key, _copy(values), expires_at)
+        if sid:
+            old_key = _key(sid)
+            self._forget(old_key)
+            self.backend.expire(old_key, time.time() + ROTATION_GRACE)
+        self._maybe_sweep()
+        return new_sid
+
+    def delete(self, sid):
+        """Remove a session, as on logout"""
+        key = _key(sid)
+        self._forget(key)
+        self.backend.delete(key)
+
+    def revoke_user(self, user_id):
+        """
+        Remove every session of a user
+
+        Other workers may serve a revoked session from their cache for up
+        to SESSION_CACHE_TTL seconds.
+
+        Args:
+            user_id: ID of the user
+
+        Returns:
+            int: Number of sessions removed from the backend
+        """
+        with self._lock:
+            for key in [key for key, entry in self._cache.items() if entry[0] == user_id]:
+                del self._cache[key]
+        if self.backend is None:
+            return 0
+        removed = self.backend.delete_user(user_id)
+        logger.info(f"Revoked {removed} sessions of user {user_id}")
+        return removed
+
+    def sweep(self):
+        """
+        Delete expired sessions
+
+        Returns:
+            int: Number of sessions removed
+        """
+        if self.backend is None:
+            return 0
+        return self.backend.sweep()
+
+    def _maybe_sweep(self):
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep error: {str(e)}", exc_info=True)
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface storing data in a SessionStore"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        return ServerSession(self.store, request.cookies.get(self.get_cookie_name(app)) or None)
+
+    def save_session(self, app, session, response):
+        if not session.accessed:
+            return
+        response.vary.add('Cookie')
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session.modified:
+            return
+        if not session:
+            if session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        try:
+            sid = self.store.save(session.sid, session.to_dict())
+        except Exception as e:
+            logger.error(f"Session save error: {str(e)}", exc_info=True)
+            return
+        response.set_cookie(name, sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+session_store = SessionStore()
+
+
+def revoke_user_sessions(user_id):
+    """Log a user out everywhere and forget their cached role; see SessionStore.revoke_user"""
+    forget_cached_role(user_id)
+    return session_store.revoke_user(user_id)
+
+
+@event.listens_for(User, 'after_update')
+def _collect_access_changes(mapper, connection, target):
+    """Queue users whose role changed or who were deactivated, to be logged out on commit"""
+    attrs = inspect(target).attrs
+    deactivated = attrs.is_active.history.has_changes() and not target.is_active
+    if attrs.role.history.has_changes() or deactivated:
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(_REVOKED_USERS, set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _revoke_changed_users(session):
+    for user_id in session.info.pop(_REVOKED_USERS, ()):
+        try:
+            revoke_user_sessions(user_id)
+        except Exception as e:
+            logger.error(f"Session revoke error: {str(e)}", exc_info=True)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop(_REVOKED_USERS, None)
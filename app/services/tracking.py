@@ -0,0 +1,70 @@
+"""
+Change Tracking
+Helpers for the flush hooks that keep denormalized counters in step with
+the rows they count
+"""
+from sqlalchemy import event, inspect, update
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+def track_old_values(*attributes):
+    """
+    Load an attribute's previous value whenever it is assigned
+
+    after_update hooks can then compute deltas from the attribute history
+    even when the attribute was expired by an earlier commit.
+
+    Args:
+        attributes: Mapped attributes, e.g. Payment.status
+    """
+    for attribute in attributes:
+        if not event.contains(attribute, 'set', _load_old_value):
+            event.listen(attribute, 'set', _load_old_value, active_history=True)
+
+
+def old_value(target, attr):
+    """
+    Value of an attribute before the pending change
+
+    Args:
+        target: Instance being flushed
+        attr: Attribute name, tracked with track_old_values
+
+    Returns:
+        The previous value; the current one when the attribute did not change
+    """
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        # History records no deleted value when the previous one was None
+        return None
+    return getattr(target, attr)
+
+
+def add_deltas(connection, table, where, deltas, **values):
+    """
+    Add deltas to counter columns inside the current transaction
+
+    Args:
+        connection: Connection of the flushing transaction
+        table: Table holding the counters
+        where: Clause selecting the rows to update
+        deltas: Column name -> amount to add; zero deltas are skipped
+        values: Other columns to set in the same UPDATE
+
+    Returns:
+        bool: Whether an UPDATE was issued
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return False
+    connection.execute(
+        update(table).where(where).values(
+            {**{column: table.c[column] + delta for column, delta in deltas.items()}, **values}
+        )
+    )
+    return True
@@ -0,0 +1,431 @@
+"""
+Video Transcoding
+Database-backed job queue whose workers turn uploaded videos into an HLS
+bitrate ladder with ffmpeg, extract a thumbnail and record the duration
+"""
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import Video, TranscodeJob
+
+logger = logging.getLogger(__name__)
+
+# Rendition name, output height, video and audio bitrate (kbit/s)
+HLS_LADDER = (
+    ('360p', 360, 800, 96),
+    ('480p', 480, 1400, 128),
+    ('720p', 720, 2800, 128),
+    ('1080p', 1080, 5000, 192),
+)
+SEGMENT_SECONDS = 6
+PROGRESS_STEP = 2  # percent between progress writes
+HEARTBEAT_SECONDS = 30  # longest gap between heartbeats while ffmpeg runs
+
+
+class TranscodeError(Exception):
+    """ffmpeg or ffprobe could not process a video"""
+
+
+class JobLost(TranscodeError):
+    """The job was requeued or removed while this worker was running it"""
+
+
+def enqueue_transcode(video):
+    """
+    Queue a video for transcoding unless it already has a pending job
+
+    Args:
+        video: Video with an uploaded file_path
+
+    Returns:
+        TranscodeJob: The queued or already pending job
+    """
+    job = video.transcode_jobs.filter(TranscodeJob.status.in_(TranscodeJob.ACTIVE_STATUSES)).first()
+    if job is not None:
+        return job
+
+    job = TranscodeJob(video_id=video.id)
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"Queued transcode job {job.id} for video {video.id}")
+    return job
+
+
+def enqueue_missing_transcodes():
+    """
+    Queue every uploaded video that has no HLS renditions and no pending job
+
+    Returns:
+        int: Number of jobs queued
+    """
+    pending = db.session.query(TranscodeJob.video_id).filter(
+        TranscodeJob.status.in_(TranscodeJob.ACTIVE_STATUSES)
+    )
+    video_ids = [video_id for (video_id,) in db.session.query(Video.id).filter(
+        Video.file_path.isnot(None),
+        Video.hls_path.is_(None),
+        Video.id.notin_(pending)
+    )]
+    db.session.add_all(TranscodeJob(video_id=video_id) for video_id in video_ids)
+    db.session.commit()
+    return len(video_ids)
+
+
+def get_latest_jobs(video_ids):
+    """
+    Most recent transcode job of each video
+
+    Args:
+        video_ids: Video IDs to look up
+
+    Returns:
+        dict: video_id -> TranscodeJob, for videos that have a job
+    """
+    if not video_ids:
+        return {}
+    latest = db.session.query(db.func.max(TranscodeJob.id)).filter(
+        TranscodeJob.video_id.in_(video_ids)
+    ).group_by(TranscodeJob.video_id)
+    jobs = TranscodeJob.query.filter(TranscodeJob.id.in_(latest)).all()
+    return {job.video_id: job for job in jobs}
+
+
+def _requeue_stalled():
+    """Give jobs of workers that stopped heartbeating back to the queue, or fail them"""
+    config = current_app.config
+    cutoff = datetime.utcnow() - timedelta(seconds=config.get('TRANSCODE_STALL_SECONDS', 600))
+    stalled = TranscodeJob.query.filter(
+        TranscodeJob.status == TranscodeJob.STATUS_RUNNING,
+        TranscodeJob.heartbeat_at < cutoff
+    )
+    exhausted = stalled.filter(TranscodeJob.attempts >= config.get('TRANSCODE_MAX_ATTEMPTS', 3)).update({
+        'status': TranscodeJob.STATUS_FAILED,
+        'error': 'Worker stopped responding',
+        'finished_at': datetime.utcnow()
+    }, synchronize_session=False)
+    requeued = stalled.update({'status': TranscodeJob.STATUS_QUEUED, 'worker': None}, synchronize_session=False)
+    db.session.commit()
+    if exhausted or requeued:
+        logger.warning(f"Stalled transcode jobs: {requeued} requeued, {exhausted} failed")
+
+
+def claim_next_job(worker):
+    """
+    Take the oldest queued job for a worker
+
+    The claim is a conditional UPDATE on the job's status, so concurrent
+    workers polling the same table never run a job twice.
+
+    Args:
+        worker: Name of the claiming worker
+
+    Returns:
+        TranscodeJob or None: The claimed job, or None when the queue is empty
+    """
+    _requeue_stalled()
+    while True:
+        job_id = db.session.query(TranscodeJob.id).filter_by(
+            status=TranscodeJob.STATUS_QUEUED
+        ).order_by(TranscodeJob.id).limit(1).scalar()
+        if job_id is None:
+            return None
+
+        now = datetime.utcnow()
+        claimed = TranscodeJob.query.filter_by(id=job_id, status=TranscodeJob.STATUS_QUEUED).update({
+            'status': TranscodeJob.STATUS_RUNNING,
+            'worker': worker,
+            'attempts': TranscodeJob.attempts + 1,
+            'progress': 0,
+            'error': None,
+            'started_at': now,
+            'heartbeat_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(TranscodeJob, job_id)
+        # Another worker took it first; try the next one
+
+
+def _report_progress(job, worker, progress):
+    """Store progress and heartbeat; raises JobLost if the job is no longer this worker's"""
+    updated = TranscodeJob.query.filter_by(
+        id=job.id, worker=worker, status=TranscodeJob.STATUS_RUNNING
+    ).update({'progress': progress, 'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if not updated:
+        raise JobLost(f'Job {job.id} is no longer assigned to {worker}')
+
+
+def probe_video(path):
+    """
+    Read duration, frame height and audio presence with ffprobe
+
+    Args:
+        path: Source video file
+
+    Returns:
+        dict: duration (seconds), height (pixels) and has_audio
+    """
+    result = subprocess.run(
+        [current_app.config.get('FFPROBE_BINARY', 'ffprobe'), '-v', 'error', '-print_format', 'json',
+         '-show_format', '-show_streams', path],
+        capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise TranscodeError(f'ffprobe failed: {result.stderr.strip()[-500:]}')
+
+    info = json.loads(result.stdout or '{}')
+    streams = info.get('streams', [])
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    if video_stream is None:
+        raise TranscodeError('File has no video stream')
+
+    return {
+        'duration': float(info.get('format', {}).get('duration') or video_stream.get('duration') or 0),
+        'height': int(video_stream.get('height') or 0),
+        'has_audio': any(s.get('codec_type') == 'audio' for s in streams)
+    }
+
+
+def select_ladder(source_height):
+    """Renditions no taller than the source, always keeping the lowest one"""
+    rungs = [rung for rung in HLS_LADDER if rung[1] <= source_height]
+    return rungs or list(HLS_LADDER[:1])
+
+
+def build_hls_command(source, output_dir, rungs, has_audio):
+    """
+    ffmpeg command encoding every rendition in one pass
+
+    The source is decoded once and split into scaled H.264/AAC streams with
+    keyframes forced on segment boundaries, so players can switch
+    renditions at any segment.
+
+    Args:
+        source: Source video file
+        output_dir: Directory receiving master.m3u8 and one folder per rendition
+        rungs: Renditions from select_ladder
+        has_audio: Whether the source has an audio stream to carry over
+
+    Returns:
+        list: Command line arguments
+    """
+    labels = ''.join(f'[s{i}]' for i in range(len(rungs)))
+    filters = [f'[0:v]split={len(rungs)}{labels}']
+    filters += [f'[s{i}]scale=-2:{height}[v{i}]' for i, (_, height, _, _) in enumerate(rungs)]
+
+    command = [
+        current_app.config.get('FFMPEG_BINARY', 'ffmpeg'), '-hide_banner', '-nostats', '-loglevel', 'error', '-y',
+        '-i', source, '-progress', 'pipe:1', '-filter_complex', ';'.join(filters)
+    ]
+    stream_map = []
+    for i, (name, _, video_kbps, audio_kbps) in enumerate(rungs):
+        command += [
+            '-map', f'[v{i}]', f'-c:v:{i}', 'libx264',
+            f'-b:v:{i}', f'{video_kbps}k', f'-maxrate:v:{i}', f'{video_kbps * 107 // 100}k',
+            f'-bufsize:v:{i}', f'{video_kbps * 2}k'
+        ]
+        entry = f'v:{i}'
+        if has_audio:
+            command += ['-map', '0:a:0', f'-c:a:{i}', 'aac', f'-b:a:{i}', f'{audio_kbps}k']
+            entry += f',a:{i}'
+        stream_map.append(f'{entry},name:{name}')
+
+    command += [
+        '-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p', '-ac', '2',
+        '-sc_threshold', '0', '-force_key_frames', f'expr:gte(t,n_forced*{SEGMENT_SECONDS})',
+        '-f', 'hls', '-hls_time', str(SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%05d.ts'),
+        '-master_pl_name', 'master.m3u8',
+        '-var_stream_map', ' '.join(stream_map),
+        os.path.join(output_dir, '%v', 'index.m3u8')
+    ]
+    return command
+
+
+def extract_thumbnail(source, destination, duration):
+    """Grab one frame a few seconds in (or from the middle of short clips) as a JPEG"""
+    at = min(5.0, duration / 2) if duration else 0
+    result = subprocess.run(
+        [current_app.config.get('FFMPEG_BINARY', 'ffmpeg'), '-hide_banner', '-loglevel', 'error', '-y',
+         '-ss', f'{at:.2f}', '-i', source, '-frames:v', '1', '-vf', 'scale=640:-2', '-q:v', '3', destination],
+        capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise TranscodeError(f'Thumbnail extraction failed: {result.stderr.strip()[-500:]}')
+
+
+def _run_ffmpeg(job, worker, command, duration):
+    """Run ffmpeg, turning its -progress output into job progress and heartbeats"""
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        reported, reported_at = 0, time.monotonic()
+        try:
+            for line in process.stdout:
+                key, _, value = line.strip().partition('=')
+                if key not in ('out_time_us', 'out_time_ms') or not duration or not value.isdigit():
+                    continue
+                # Both keys carry microseconds
+                progress = min(99, int(int(value) / 1e6 * 100 / duration))
+                if progress >= reported + PROGRESS_STEP or time.monotonic() - reported_at >= HEARTBEAT_SECONDS:
+                    _report_progress(job, worker, progress)
+                    reported, reported_at = progress, time.monotonic()
+            process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+
+        if process.returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode('utf-8', 'replace').strip()[-500:]
+            raise TranscodeError(f'ffmpeg exited with {process.returncode}: {message}')
+
+
+def run_job(job, worker):
+    """
+    Transcode a claimed job's video and record the results on it
+
+    Renditions are written to a scratch directory that replaces the
+    video's HLS directory only once ffmpeg succeeds.
+
+    Args:
+        job: TranscodeJob claimed by this worker
+        worker: Name of this worker
+    """
+    video = job.video
+    if video is None or not video.file_path:
+        raise TranscodeError('Video has no uploaded file')
+
+    media_root = current_app.config['MEDIA_FOLDER']
+    upload_root = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    source = os.path.join(media_root, video.file_path)
+    info = probe_video(source)
+
+    thumbnail_path = f'thumbnails/video_{video.id}.jpg'
+    extract_thumbnail(source, os.path.join(upload_root, thumbnail_path), info['duration'])
+
+    # Renditions stay out of the static folder so only stream_hls can serve them
+    final_dir = os.path.join(media_root, 'hls', str(video.id))
+    work_dir = f'{final_dir}.job{job.id}'
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    try:
+        rungs = select_ladder(info['height'])
+        for name, _, _, _ in rungs:
+            os.makedirs(os.path.join(work_dir, name))
+        _run_ffmpeg(job, worker, build_hls_command(source, work_dir, rungs, info['has_audio']), info['duration'])
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(work_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    video.hls_path = f'hls/{video.id}/master.m3u8'
+    video.thumbnail_path = thumbnail_path
+    if info['duration']:
+        video.duration_minutes = max(1, round(info['duration'] / 60))
+    job.status = TranscodeJob.STATUS_COMPLETED
+    job.progress = 100
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    logger.info(f"Transcode job {job.id} finished video {video.id}: {', '.join(r[0] for r in rungs)}")
+
+
+def process_next_job(worker):
+    """
+    Claim and run one job, retrying failures up to TRANSCODE_MAX_ATTEMPTS
+
+    Args:
+        worker: Name of this worker
+
+    Returns:
+        TranscodeJob or None: The job processed, or None when the queue was empty
+    """
+    job = claim_next_job(worker)
+    if job is None:
+        return None
+
+    try:
+        run_job(job, worker)
+    except JobLost as e:
+        db.session.rollback()
+        logger.warning(str(e))
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Transcode job {job.id} failed: {str(e)}", exc_info=not isinstance(e, TranscodeError))
+        retry = job.attempts < current_app.config.get('TRANSCODE_MAX_ATTEMPTS', 3)
+        TranscodeJob.query.filter_by(id=job.id, worker=worker).update({
+            'status': TranscodeJob.STATUS_QUEUED if retry else TranscodeJob.STATUS_FAILED,
+            'worker': None if retry else worker,
+            'error': str(e)[:1000],
+            'finished_at': None if retry else datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+    return job
+
+
+def run_worker(once=False, poll_interval=None):
+    """
+    Process transcode jobs until stopped
+
+    Args:
+        once: Return as soon as the queue is empty
+        poll_interval: Seconds to wait when the queue is empty (defaults to TRANSCODE_POLL_INTERVAL)
+
+    Returns:
+        int: Number of jobs processed
+    """
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    interval = poll_interval or current_app.config.get('TRANSCODE_POLL_INTERVAL', 5)
+    processed = 0
+    logger.info(f"Transcode worker {worker} started")
+    while True:
+        job = process_next_job(worker)
+        if job is not None:
+            processed += 1
+            continue
+        if once:
+            return processed
+        db.session.remove()
+        time.sleep(interval)
+
+
+def _worker_process(app, once):
+    with app.app_context():
+        # Connections inherited from the parent must not be shared across processes
+        db.engine.dispose(close=False)
+        run_worker(once=once)
+
+
+def run_worker_processes(app, count, once=False):
+    """
+    Run several workers as forked processes and wait for them
+
+    Args:
+        app: Flask application the workers run under
+        count: Number of worker processes
+        once: Stop each worker when the queue is empty
+    """
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_worker_process, args=(app, once), daemon=True) for _ in range(count)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
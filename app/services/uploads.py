@@ -0,0 +1,298 @@
+"""
+Resumable Video Uploads
+Chunked uploads streamed to disk, verified and turned into Video rows only
+after the whole file has arrived
+"""
+import glob
+import hashlib
+import logging
+import os
+import secrets
+import shutil
+from datetime import datetime, timedelta
+from flask import current_app, url_for
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from werkzeug.security import safe_join
+from app import db
+from app.constants import FileUpload
+from app.models import Video, VideoUpload
+from app.services.transcoding import enqueue_transcode
+from app.utils.helpers import generate_unique_filename
+from app.utils.validators import validate_video_file
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK = 1024 * 1024  # bytes read from the request or file at a time
+
+_DELETED_VIDEO_FILES = 'deleted_video_files'
+
+
+class UploadError(Exception):
+    """Upload request that cannot be applied; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, upload=None):
+        super().__init__(message)
+        self.status = status
+        self.upload = upload
+
+
+def _videos_dir():
+    return os.path.join(current_app.config['MEDIA_FOLDER'], 'videos')
+
+
+def _partial_path(upload):
+    return os.path.join(_videos_dir(), '.partial', f'{upload.upload_id}.part')
+
+
+def start_upload(course, user, filename, total_size, title, checksum=None,
+                 description=None, duration_minutes=None, order=0, is_free=False):
+    """
+    Register a new upload and reserve its partial file
+
+    Args:
+        course: Course the video will belong to
+        user: Uploading faculty member
+        filename: Original file name (extension must be an allowed video type)
+        total_size: Size of the whole file in bytes
+        title: Video title
+        checksum: Optional SHA-256 hex digest of the whole file
+        description, duration_minutes, order, is_free: Video details
+
+    Returns:
+        VideoUpload: The new upload
+    """
+    if not title:
+        raise UploadError('Title is required.')
+    if not filename or not validate_video_file(filename):
+        raise UploadError('Unsupported video file type.')
+    if not isinstance(total_size, int) or total_size <= 0:
+        raise UploadError('File size must be a positive number of bytes.')
+    max_size = current_app.config.get('MAX_VIDEO_UPLOAD_SIZE', FileUpload.MAX_VIDEO_SIZE)
+    if total_size > max_size:
+        raise UploadError(f'File exceeds the {max_size // (1024 * 1024)} MB limit.', 413)
+    if checksum and (len(checksum) != 64 or any(c not in '0123456789abcdef' for c in checksum.lower())):
+        raise UploadError('Checksum must be a SHA-256 hex digest.')
+
+    upload = VideoUpload(
+        upload_id=secrets.token_hex(16),
+        course_id=course.id,
+        uploader_id=user.id,
+        filename=filename[:255],
+        stored_filename=generate_unique_filename(filename),
+        total_size=total_size,
+        checksum=checksum.lower() if checksum else None,
+        title=title,
+        description=description,
+        duration_minutes=duration_minutes,
+        order=order or 0,
+        is_free=bool(is_free)
+    )
+
+    path = _partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+    db.session.add(upload)
+    db.session.commit()
+    logger.info(f"Upload {upload.upload_id} started by {user.username}: {filename} ({total_size} bytes)")
+    return upload
+
+
+def write_chunk(upload, offset, stream, length, chunk_checksum=None):
+    """
+    Stream one chunk from the request body into the partial file
+
+    Chunks must arrive in order: offset has to equal the bytes received so
+    far, so a client resumes by asking for the upload state and continuing
+    from received_bytes.
+
+    Args:
+        upload: VideoUpload in progress
+        offset: Byte offset of this chunk in the file
+        stream: File-like request body
+        length: Declared chunk length (Content-Length)
+        chunk_checksum: Optional SHA-256 hex digest of this chunk
+
+    Returns:
+        VideoUpload: Upload with received_bytes advanced
+    """
+    if upload.status != VideoUpload.STATUS_UPLOADING:
+        raise UploadError(f'Upload is {upload.status}.', 409, upload)
+    if offset != upload.received_bytes:
+        raise UploadError(f'Expected offset {upload.received_bytes}.', 409, upload)
+    if not length:
+        raise UploadError('Chunk is empty or has no Content-Length.', 411, upload)
+    if length > current_app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024):
+        raise UploadError('Chunk is larger than UPLOAD_CHUNK_SIZE.', 413, upload)
+    if offset + length > upload.total_size:
+        raise UploadError('Chunk runs past the declared file size.', 416, upload)
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(_partial_path(upload), 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            block = stream.read(min(READ_BLOCK, length - written))
+            if not block:
+                break
+            f.write(block)
+            digest.update(block)
+            written += len(block)
+
+    if written != length:
+        raise UploadError(f'Chunk truncated after {written} of {length} bytes.', 400, upload)
+    if chunk_checksum and digest.hexdigest() != chunk_checksum.lower():
+        raise UploadError('Chunk checksum mismatch.', 422, upload)
+
+    # Only advance if no concurrent request already did; the loser simply rewrote the same bytes
+    advanced = VideoUpload.query.filter_by(
+        id=upload.id, received_bytes=offset
+    ).update({'received_bytes': offset + written, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    db.session.refresh(upload)
+    if not advanced:
+        raise UploadError(f'Expected offset {upload.received_bytes}.', 409, upload)
+    return upload
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(upload, checksum=None):
+    """
+    Verify the assembled file and create its Video
+
+    Args:
+        upload: VideoUpload with every byte received
+        checksum: Optional SHA-256 hex digest (overrides the one given at start)
+
+    Returns:
+        Video: The new video
+    """
+    if upload.status == VideoUpload.STATUS_COMPLETED:
+        return upload.video
+    if upload.status != VideoUpload.STATUS_UPLOADING:
+        raise UploadError(f'Upload is {upload.status}.', 409, upload)
+    if upload.received_bytes != upload.total_size:
+        raise UploadError(f'Received {upload.received_bytes} of {upload.total_size} bytes.', 409, upload)
+
+    partial = _partial_path(upload)
+    if os.path.getsize(partial) != upload.total_size:
+        raise UploadError('Assembled file size does not match.', 409, upload)
+
+    expected = (checksum or upload.checksum or '').lower()
+    actual = _file_sha256(partial)
+    if expected and actual != expected:
+        upload.status = VideoUpload.STATUS_FAILED
+        upload.error = 'Checksum mismatch'
+        db.session.commit()
+        os.remove(partial)
+        raise UploadError('Checksum mismatch; the upload was discarded.', 422, upload)
+
+    final_path = os.path.join(_videos_dir(), upload.stored_filename)
+    os.replace(partial, final_path)
+
+    try:
+        video = Video(
+            title=upload.title,
+            description=upload.description,
+            video_url='',
+            file_path=f'videos/{upload.stored_filename}',
+            duration_minutes=upload.duration_minutes,
+            course_id=upload.course_id,
+            order=upload.order,
+            is_free=upload.is_free
+        )
+        db.session.add(video)
+        db.session.flush()
+        # Served through the enrollment-checked stream endpoint, not as a static file
+        video.video_url = url_for('student.stream_video', video_id=video.id)
+        upload.video_id = video.id
+        upload.checksum = actual
+        upload.status = VideoUpload.STATUS_COMPLETED
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # Put the file back so the client can retry completion
+        os.replace(final_path, partial)
+        raise
+
+    logger.info(f"Upload {upload.upload_id} completed as video {video.id}")
+    enqueue_transcode(video)
+    return video
+
+
+def purge_stale_uploads(max_age_hours=None):
+    """
+    Delete unfinished uploads that have not received data for a while
+
+    Args:
+        max_age_hours: Idle time before an upload is purged (defaults to UPLOAD_STALE_HOURS)
+
+    Returns:
+        int: Number of uploads purged
+    """
+    hours = max_age_hours or current_app.config.get('UPLOAD_STALE_HOURS', 24)
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    stale = VideoUpload.query.filter(
+        VideoUpload.status != VideoUpload.STATUS_COMPLETED,
+        VideoUpload.updated_at < cutoff
+    ).all()
+
+    for upload in stale:
+        path = _partial_path(upload)
+        if os.path.exists(path):
+            os.remove(path)
+        db.session.delete(upload)
+    db.session.commit()
+
+    if stale:
+        logger.info(f"Purged {len(stale)} stale uploads")
+    return len(stale)
+
+
+def _video_files(video):
+    """Absolute paths of a video's source file, HLS directories and thumbnail"""
+    media_root = current_app.config['MEDIA_FOLDER']
+    paths = []
+    if video.file_path:
+        paths.append(safe_join(media_root, video.file_path))
+    if video.hls_path:
+        hls_dir = safe_join(media_root, os.path.dirname(video.hls_path))
+        if hls_dir:
+            # Include work directories left by interrupted transcodes
+            paths.extend([hls_dir] + glob.glob(f'{glob.escape(hls_dir)}.job*'))
+    if video.thumbnail_path:
+        paths.append(safe_join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), video.thumbnail_path))
+    return [path for path in paths if path]
+
+
+@event.listens_for(Video, 'after_delete')
+def _collect_video_files(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_DELETED_VIDEO_FILES, []).extend(_video_files(target))
+
+
+@event.listens_for(Session, 'after_commit')
+def _remove_deleted_video_files(session):
+    """Delete the files of deleted videos once the deletion is committed"""
+    for path in session.info.pop(_DELETED_VIDEO_FILES, []):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.error(f"Video file removal error for {path}: {str(e)}", exc_info=True)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_video_files(session):
+    session.info.pop(_DELETED_VIDEO_FILES, None)
@@ -3,7 +3,15 @@ Utilities Package
 Provides decorators, filters, helpers, validators, and error handlers
 """
 
-from app.utils.decorators import login_required, admin_required, faculty_required, student_required, role_required
+from app.utils.decorators import (
+    login_required,
+    admin_required,
+    faculty_required,
+    student_required,
+    role_required,
+    use_primary,
+    get_current_user
+)
 from app.utils.filters import format_currency, time_ago, format_duration, truncate_text
 from app.utils.helpers import (
     allowed_file,
@@ -33,6 +41,8 @@ __all__ = [
     'faculty_required',
     'student_required',
     'role_required',
+    'use_primary',
+    'get_current_user',
     
     # Filters
     'format_currency',
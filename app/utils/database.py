@@ -0,0 +1,84 @@
+"""
+Database Engine Tuning
+Connection pool sizing derived from the server's worker and thread counts,
+and WAL mode with a busy timeout for SQLite
+"""
+import logging
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Connections a process needs beyond its request threads (progress buffer
+# flushes, certificate rendering, CLI work)
+BACKGROUND_CONNECTIONS = 2
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def pool_options(config):
+    """
+    Engine pool options for one server process
+
+    Every worker process holds its own pool, so DB_MAX_CONNECTIONS is shared
+    out across WEB_WORKERS: each gets a steady pool sized for its request
+    threads plus background work, and overflow up to its share.
+
+    Args:
+        config: Application config
+
+    Returns:
+        dict: pool_size, max_overflow and pool_timeout
+    """
+    workers = max(1, config.get('WEB_WORKERS', 1))
+    threads = max(1, config.get('WEB_THREADS', 1))
+    share = max(2, config.get('DB_MAX_CONNECTIONS', 100) // workers)
+    pool_size = min(threads + BACKGROUND_CONNECTIONS, share)
+    return {
+        'pool_size': pool_size,
+        'max_overflow': share - pool_size,
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10)
+    }
+
+
+def configure_engine_options(app):
+    """
+    Fill in pool sizing on SQLALCHEMY_ENGINE_OPTIONS before the engine is created
+
+    Options set explicitly in the config are kept.
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    # In-memory SQLite uses a single shared connection with no pool to size
+    if not _is_memory_sqlite(url) and 'poolclass' not in options:
+        for key, value in pool_options(app.config).items():
+            options.setdefault(key, value)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def init_sqlite_pragmas(app, engine):
+    """Apply WAL mode, a busy timeout and relaxed fsyncs to every new SQLite connection"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    busy_timeout = app.config.get('SQLITE_BUSY_TIMEOUT', 5000)
+    wal = app.config.get('SQLITE_WAL', True) and not _is_memory_sqlite(engine.url)
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+            if wal:
+                # WAL lets readers run alongside the single writer; NORMAL is durable under WAL
+                cursor.execute('PRAGMA journal_mode = WAL')
+                cursor.execute('PRAGMA synchronous = NORMAL')
+        finally:
+            cursor.close()
+
+    logger.debug(f"SQLite pragmas enabled (WAL={wal}, busy_timeout={busy_timeout}ms)")
@@ -1,10 +1,83 @@
 """
 Authentication and Authorization Decorators
 """
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
-from flask import session, redirect, url_for, flash, abort
+from flask import session, redirect, url_for, flash, abort, g, current_app
+from sqlalchemy import event
+from app import db
 from app.models import User
 
+# Process-wide LRU of user_id -> (role, expires_at) so role checks can skip the database
+_role_cache = OrderedDict()
+_role_cache_lock = threading.Lock()
+
+def get_current_user():
+    """
+    Get the logged-in user, loading it at most once per request
+
+    Returns:
+        User: The logged-in user, or None if nobody is logged in
+    """
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = db.session.get(User, user_id) if user_id is not None else None
+        if g.current_user is not None:
+            _cache_role(g.current_user.id, g.current_user.role)
+    return g.current_user
+
+def get_current_role():
+    """
+    Get the logged-in user's role
+
+    Uses the request's user if already loaded, then the short-TTL role
+    cache, and only queries the database on a miss.
+
+    Returns:
+        str: Role name, or None if nobody is logged in or the user no longer exists
+    """
+    if 'current_user' in g:
+        return g.current_user.role if g.current_user else None
+
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+
+    if current_app.config.get('ROLE_CACHE_TTL', 30):
+        with _role_cache_lock:
+            cached = _role_cache.get(user_id)
+            if cached is not None:
+                if cached[1] > time.monotonic():
+                    _role_cache.move_to_end(user_id)
+                    return cached[0]
+                del _role_cache[user_id]
+
+    user = get_current_user()
+    return user.role if user else None
+
+def _cache_role(user_id, role):
+    """Remember a user's role for ROLE_CACHE_TTL seconds, keeping at most ROLE_CACHE_MAX_ENTRIES users"""
+    ttl = current_app.config.get('ROLE_CACHE_TTL', 30)
+    if ttl:
+        max_entries = current_app.config.get('ROLE_CACHE_MAX_ENTRIES', 10000)
+        with _role_cache_lock:
+            _role_cache[user_id] = (role, time.monotonic() + ttl)
+            _role_cache.move_to_end(user_id)
+            while len(_role_cache) > max_entries:
+                _role_cache.popitem(last=False)
+
+def forget_cached_role(user_id):
+    """Drop a user's cached role in this process, as when their sessions are revoked"""
+    with _role_cache_lock:
+        _role_cache.pop(user_id, None)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _evict_cached_role(mapper, connection, target):
+    forget_cached_role(target.id)
+
 def login_required(f):
     """Decorator to require login for routes"""
     @wraps(f)
@@ -23,12 +96,12 @@ def role_required(*roles):
             if 'user_id' not in session:
                 flash('Please login to access this page.', 'warning')
                 return redirect(url_for('auth.login'))
-            
-            user = User.query.get(session['user_id'])
-            if not user or user.role not in roles:
+
+            role = get_current_role()
+            if role is None or role not in roles:
                 flash(f'Access denied. Required role: {", ".join(roles)}', 'danger')
                 abort(403)
-            
+
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -48,3 +121,11 @@ def management_required(f):
 def student_required(f):
     """Decorator to require student access"""
     return role_required('student')(f)
+
+def use_primary(f):
+    """Decorator to keep a GET route's reads on the primary database, for views that write"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g._db_use_primary = True
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,118 @@
+"""
+Byte-Range File Streaming
+Serves files with Range, ETag and Last-Modified support through the WSGI
+server's file_wrapper, so servers with sendfile support (gunicorn) copy the
+requested bytes to the socket without passing them through Python
+"""
+import mimetypes
+import os
+from datetime import datetime, timezone
+from flask import Response, request
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
+
+BLOCK_SIZE = 256 * 1024  # bytes per read when the server cannot sendfile
+
+
+class FileRange:
+    """
+    Open file limited to one byte range
+
+    sendfile-capable servers use fileno() and send Content-Length bytes from
+    the current offset; other servers call read(), which stops at the end of
+    the range.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _if_range_matches(etag, last_modified):
+    """Whether an If-Range precondition (if any) allows serving a partial response"""
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return last_modified <= if_range.date
+    return True
+
+
+def send_file_range(path, mimetype=None, max_age=3600):
+    """
+    Build a response for a file that honors Range and conditional request headers
+
+    Answers 304 when If-None-Match / If-Modified-Since match, 206 with the
+    requested bytes for a single satisfiable range, 416 for an unsatisfiable
+    one and 200 with the whole file otherwise (including multi-range
+    requests, which are rare for media players).
+
+    Args:
+        path: Absolute path of the file
+        mimetype: Content type (guessed from the file name when omitted)
+        max_age: Seconds the browser may reuse the file without revalidating
+
+    Returns:
+        Response: Response streaming the file or the requested part of it
+
+    Raises:
+        OSError: If the file cannot be opened
+    """
+    file = open(path, 'rb')
+    try:
+        # Stat the open descriptor so headers describe exactly what is sent
+        stat = os.fstat(file.fileno())
+    except OSError:
+        file.close()
+        raise
+
+    size = stat.st_size
+    etag = f'{stat.st_mtime_ns:x}-{size:x}-{stat.st_ino:x}'
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+
+    response = Response(mimetype=mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.accept_ranges = 'bytes'
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        file.close()
+        response.status_code = 304
+        return response
+
+    start, length = 0, size
+    byte_range = request.range
+    if byte_range is not None and len(byte_range.ranges) == 1 and _if_range_matches(etag, last_modified):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            file.close()
+            response.status_code = 416
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        start, stop = bounds
+        length = stop - start
+        response.status_code = 206
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+
+    response.response = wrap_file(request.environ, FileRange(file, start, length), BLOCK_SIZE)
+    response.direct_passthrough = True
+    response.content_length = length
+    return response
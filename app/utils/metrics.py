@@ -0,0 +1,376 @@
+"""
+Request Metrics
+Per-endpoint latency, SQL and template timings exposed in Prometheus text format,
+summed across the worker processes on the host
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from flask import Response, abort, current_app, g, has_request_context, request
+from flask import request_started, request_finished, got_request_exception
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.utils.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointStats:
+    """Accumulated measurements for one endpoint"""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.requests = 0
+        self.statuses = {}
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def observe(self, latency, status, sql_statements, sql_seconds, template_seconds):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.bucket_counts[i] += 1
+        self.latency_sum += latency
+        self.requests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.sql_statements += sql_statements
+        self.sql_seconds += sql_seconds
+        self.template_seconds += template_seconds
+
+    def to_dict(self):
+        return {
+            'bucket_counts': list(self.bucket_counts),
+            'latency_sum': self.latency_sum,
+            'requests': self.requests,
+            'statuses': {str(status): count for status, count in self.statuses.items()},
+            'sql_statements': self.sql_statements,
+            'sql_seconds': self.sql_seconds,
+            'template_seconds': self.template_seconds
+        }
+
+    def merge(self, data):
+        """Add the counts of another process's to_dict() snapshot"""
+        self.bucket_counts = [a + b for a, b in zip(self.bucket_counts, data['bucket_counts'])]
+        self.latency_sum += data['latency_sum']
+        self.requests += data['requests']
+        for status, count in data['statuses'].items():
+            self.statuses[int(status)] = self.statuses.get(int(status), 0) + count
+        self.sql_statements += data['sql_statements']
+        self.sql_seconds += data['sql_seconds']
+        self.template_seconds += data['template_seconds']
+
+
+def _merge_snapshots(snapshots):
+    """
+    Sum process snapshots
+
+    Args:
+        snapshots: Iterable of {'endpoints': {name: to_dict()}, 'fragment_cache': {...}}
+
+    Returns:
+        tuple: ({endpoint: EndpointStats}, {'hits', 'misses', 'errors'})
+    """
+    endpoints = {}
+    cache = {'hits': 0, 'misses': 0, 'errors': 0}
+    for snapshot in snapshots:
+        for endpoint, data in snapshot.get('endpoints', {}).items():
+            endpoints.setdefault(endpoint, EndpointStats()).merge(data)
+        for counter, value in snapshot.get('fragment_cache', {}).items():
+            cache[counter] = cache.get(counter, 0) + value
+    return endpoints, cache
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetricsStore(SQLiteStore):
+    """
+    Per-process metric snapshots in a SQLite file shared by the workers on the host
+
+    Each worker writes its cumulative counters under its own key, so a
+    scrape answered by any worker can sum them all. Rows of processes that
+    have exited are folded into one retired row, keeping their counts
+    without growing the table on every worker restart.
+    """
+
+    RETIRED = 'retired'
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS metrics_snapshot ('
+        'key TEXT PRIMARY KEY, pid INTEGER, data TEXT NOT NULL, updated_at REAL NOT NULL)',
+    )
+
+    def write(self, key, snapshot):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO metrics_snapshot (key, pid, data, updated_at) VALUES (?, ?, ?, ?)',
+            (key, os.getpid(), json.dumps(snapshot), time.time())
+        )
+
+    def read_all(self):
+        """
+        Snapshots of every process, after folding those of exited processes
+
+        Returns:
+            list: Snapshot dicts
+        """
+        conn = self._connect()
+        rows = conn.execute('SELECT key, pid, data FROM metrics_snapshot').fetchall()
+        dead = [row for row in rows if row[0] != self.RETIRED and not _alive(row[1])]
+        if not dead:
+            return [json.loads(data) for _, _, data in rows]
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('SELECT key, pid, data FROM metrics_snapshot').fetchall()
+            retired = [json.loads(data) for key, pid, data in rows
+                       if key == self.RETIRED or not _alive(pid)]
+            endpoints, cache = _merge_snapshots(retired)
+            folded = {'endpoints': {name: stats.to_dict() for name, stats in endpoints.items()},
+                      'fragment_cache': cache}
+            conn.executemany('DELETE FROM metrics_snapshot WHERE key = ?',
+                             [(key,) for key, pid, _ in rows if key != self.RETIRED and not _alive(pid)])
+            conn.execute(
+                'INSERT OR REPLACE INTO metrics_snapshot (key, pid, data, updated_at) VALUES (?, NULL, ?, ?)',
+                (self.RETIRED, json.dumps(folded), time.time())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [folded] + [json.loads(data) for key, pid, data in rows
+                           if key != self.RETIRED and _alive(pid)]
+
+
+class RequestMetrics:
+    """
+    Collects per-endpoint request metrics for this worker process
+
+    Flask request and template signals time each request and its template
+    rendering; engine cursor events count and time SQL statements issued
+    while a request is active. With more than one worker, each process
+    writes its counters to a SharedMetricsStore at most every
+    METRICS_FLUSH_INTERVAL seconds and a scrape reports the sum of all
+    workers.
+    """
+
+    def __init__(self, app=None):
+        self.endpoints = {}
+        self.store = None
+        self.fragment_cache = None
+        self.flush_interval = 5
+        self._lock = threading.Lock()
+        self._key = None
+        self._key_pid = None
+        self._flushed_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Connect signal handlers and register the /metrics endpoint"""
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        if app.config.get('METRICS_REQUIRE_TOKEN') and not app.config.get('METRICS_TOKEN'):
+            raise RuntimeError('METRICS_TOKEN must be set to serve metrics in this configuration '
+                               '(or set METRICS_ENABLED=false)')
+
+        self.fragment_cache = app.extensions.get('fragment_cache')
+        if app.config.get('WEB_WORKERS', 1) > 1:
+            path = app.config.get('METRICS_STORE_PATH') or os.path.join(app.instance_path, 'metrics.sqlite')
+            self.store = SharedMetricsStore(path)
+            self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+
+        request_started.connect(_request_started, app)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+        request_finished.connect(self._request_finished, app)
+        got_request_exception.connect(self._request_failed, app)
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.metrics_view)
+        app.extensions['request_metrics'] = self
+
+    def _record(self, app, status):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        latency = time.perf_counter() - started
+        endpoint = request.url_rule.endpoint if request.url_rule else '<unmatched>'
+
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.observe(
+                latency,
+                status,
+                g.get('metrics_sql_statements', 0),
+                g.get('metrics_sql_seconds', 0.0),
+                g.get('metrics_template_seconds', 0.0)
+            )
+
+        if self.store is not None and time.time() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+        threshold = app.config.get('SLOW_REQUEST_THRESHOLD_MS', 1000)
+        if threshold and latency * 1000 >= threshold:
+            app.logger.warning(
+                f"Slow request: {request.method} {request.path} endpoint={endpoint} status={status} "
+                f"duration={latency * 1000:.0f}ms sql={g.get('metrics_sql_statements', 0)} "
+                f"sql_time={g.get('metrics_sql_seconds', 0.0) * 1000:.0f}ms "
+                f"template_time={g.get('metrics_template_seconds', 0.0) * 1000:.0f}ms"
+            )
+
+    def _request_finished(self, sender, response, **extra):
+        self._record(sender, response.status_code)
+
+    def _request_failed(self, sender, exception, **extra):
+        self._record(sender, 500)
+
+    def _snapshot(self):
+        with self._lock:
+            endpoints = {name: stats.to_dict() for name, stats in self.endpoints.items()}
+        snapshot = {'endpoints': endpoints}
+        if self.fragment_cache is not None:
+            cache_stats = self.fragment_cache.stats()
+            snapshot['fragment_cache'] = {counter: cache_stats[counter] for counter in ('hits', 'misses', 'errors')}
+        return snapshot
+
+    def _process_key(self):
+        """Store key for this process; a preloaded app forks before any worker asks"""
+        if self._key is None or self._key_pid != os.getpid():
+            self._key = f'{os.getpid()}-{time.time():.6f}'
+            self._key_pid = os.getpid()
+            atexit.register(self.flush)
+        return self._key
+
+    def flush(self):
+        """Write this process's counters to the shared store"""
+        if self.store is None:
+            return
+        self._flushed_at = time.time()
+        try:
+            self.store.write(self._process_key(), self._snapshot())
+        except Exception as e:
+            logger.warning(f"Metrics flush failed: {str(e)}")
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        Returns:
+            str: Metrics document, summed across workers when a shared store is in use
+        """
+        snapshot = None
+        if self.store is not None:
+            self.flush()
+            try:
+                snapshot = _merge_snapshots(self.store.read_all())
+            except Exception as e:
+                logger.warning(f"Metrics store read failed, reporting this worker only: {str(e)}")
+        if snapshot is None:
+            snapshot = _merge_snapshots([self._snapshot()])
+        endpoints, cache_stats = snapshot
+        snapshot = sorted(endpoints.items())
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by endpoint',
+            '# TYPE http_request_duration_seconds histogram'
+        ]
+        for endpoint, stats in snapshot:
+            label = _escape(endpoint)
+            for bound, count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                lines.append(f'http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {stats.requests}')
+            lines.append(f'http_request_duration_seconds_sum{{endpoint="{label}"}} {stats.latency_sum:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{endpoint="{label}"}} {stats.requests}')
+
+        lines += ['# HELP http_requests_total Requests by endpoint and status', '# TYPE http_requests_total counter']
+        for endpoint, stats in snapshot:
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'http_requests_total{{endpoint="{_escape(endpoint)}",status="{status}"}} {count}')
+
+        counters = [
+            ('db_statements_total', 'SQL statements executed by endpoint', 'sql_statements', '{}'),
+            ('db_statement_seconds_total', 'Time spent in SQL by endpoint', 'sql_seconds', '{:.6f}'),
+            ('template_render_seconds_total', 'Time spent rendering templates by endpoint', 'template_seconds', '{:.6f}')
+        ]
+        for name, help_text, attr, fmt in counters:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for endpoint, stats in snapshot:
+                lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {fmt.format(getattr(stats, attr))}')
+
+        if self.fragment_cache is not None:
+            lines += [
+                '# HELP fragment_cache_requests_total Fragment cache lookups by result',
+                '# TYPE fragment_cache_requests_total counter',
+                f'fragment_cache_requests_total{{result="hit"}} {cache_stats["hits"]}',
+                f'fragment_cache_requests_total{{result="miss"}} {cache_stats["misses"]}',
+                f'fragment_cache_requests_total{{result="error"}} {cache_stats["errors"]}'
+            ]
+
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        """Serve metrics, requiring METRICS_TOKEN as a bearer token when configured"""
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _request_started(sender, **extra):
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql_statements = 0
+    g.metrics_sql_seconds = 0.0
+    g.metrics_template_seconds = 0.0
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('metrics_render_stack', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stack = g.get('metrics_render_stack')
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    # Only count the outermost render so nested render_template calls are not double counted
+    if not stack and 'metrics_template_seconds' in g:
+        g.metrics_template_seconds += elapsed
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_request_context() and 'metrics_sql_statements' in g:
+        g.metrics_sql_statements += 1
+        g.metrics_sql_seconds += elapsed
+
+
+request_metrics = RequestMetrics()
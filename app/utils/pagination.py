@@ -0,0 +1,209 @@
+"""
+Keyset Pagination
+Seek-based pagination on (timestamp, id) for admin and management list pages;
+rows without a timestamp sort after all others
+"""
+import base64
+import json
+import logging
+from datetime import datetime
+from flask import request, current_app
+from sqlalchemy import and_, or_, text
+from app import db
+from app.constants import Pagination
+
+logger = logging.getLogger(__name__)
+
+
+class Page:
+    """One page of keyset-paginated results"""
+
+    ranked = False  # results are in relevance order rather than newest-first
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None, total_is_estimate=False):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(sort_value, row_id):
+    """
+    Encode a (sort value, id) position as an opaque URL-safe cursor
+
+    Args:
+        sort_value: Value of the sort column (datetime or None)
+        row_id: Primary key of the row
+
+    Returns:
+        str: Cursor string
+    """
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor
+
+    Args:
+        cursor: Cursor string
+
+    Returns:
+        tuple: (sort value, id), or None if the cursor is missing or malformed
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def get_per_page():
+    """Read per_page from the query string, clamped to Pagination.MAX_PER_PAGE"""
+    default = current_app.config.get('ITEMS_PER_PAGE', Pagination.DEFAULT_PER_PAGE)
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, Pagination.MAX_PER_PAGE))
+
+
+def estimate_count(query):
+    """
+    Estimate the number of rows a query returns
+
+    PostgreSQL answers from the planner's row estimate without scanning;
+    other backends fall back to an exact COUNT.
+
+    Args:
+        query: SQLAlchemy ORM query
+
+    Returns:
+        tuple: (count, is_estimate)
+    """
+    query = query.order_by(None)
+    bind = db.engine
+    if bind.dialect.name == 'postgresql':
+        try:
+            compiled = query.statement.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True})
+            plan = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {compiled}')).scalar()
+            return int(plan[0]['Plan']['Plan Rows']), True
+        except Exception as e:
+            logger.warning(f"Row estimate failed, falling back to COUNT: {str(e)}")
+    return query.count(), False
+
+
+def paginate_keyset(query, sort_column, id_column, after=None, before=None, per_page=None, with_total=False):
+    """
+    Paginate a query newest-first by (sort_column, id_column) using seek cursors
+
+    Each page is fetched with a WHERE on the last seen position instead of
+    OFFSET, so deep pages cost the same as the first one. Rows whose sort
+    column is NULL come last on every backend, ordered by id.
+
+    Args:
+        query: SQLAlchemy ORM query with any filters applied (no ORDER BY)
+        sort_column: Timestamp column to sort by, descending
+        id_column: Primary key column used as a tie-breaker
+        after: Cursor of the last row of the previous page (go forward)
+        before: Cursor of the first row of the next page (go back)
+        per_page: Page size (defaults to get_per_page())
+        with_total: Also return a total count (estimated on PostgreSQL); costs
+                    a scan per page on other backends, so only for small lists
+
+    Returns:
+        Page: Items plus next/prev cursors
+    """
+    per_page = per_page or get_per_page()
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before) if after_key is None else None
+
+    total, total_is_estimate = (None, False)
+    if with_total:
+        total, total_is_estimate = estimate_count(query)
+
+    if before_key is not None:
+        sort_value, row_id = before_key
+        if sort_value is None:
+            seek = or_(sort_column.isnot(None), and_(sort_column.is_(None), id_column > row_id))
+        else:
+            seek = or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > row_id))
+        query = query.filter(seek).order_by(sort_column.asc().nulls_first(), id_column.asc())
+    else:
+        if after_key is not None:
+            sort_value, row_id = after_key
+            if sort_value is None:
+                seek = and_(sort_column.is_(None), id_column < row_id)
+            else:
+                # Comparisons with NULL are never true, so NULL rows are matched explicitly
+                seek = or_(
+                    sort_column < sort_value,
+                    and_(sort_column == sort_value, id_column < row_id),
+                    sort_column.is_(None)
+                )
+            query = query.filter(seek)
+        query = query.order_by(sort_column.desc().nulls_last(), id_column.desc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before_key is not None:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if before_key is not None:
+            next_cursor = cursor_for(rows[-1])
+            prev_cursor = cursor_for(rows[0]) if has_more else None
+        else:
+            next_cursor = cursor_for(rows[-1]) if has_more else None
+            prev_cursor = cursor_for(rows[0]) if after_key is not None else None
+
+    return Page(rows, per_page, next_cursor, prev_cursor, total, total_is_estimate)
+
+
+def paginate_request(query, sort_column, id_column, with_total=False):
+    """
+    Paginate using the after/before/per_page query string arguments
+
+    Args:
+        query: SQLAlchemy ORM query with any filters applied
+        sort_column: Timestamp column to sort by, descending
+        id_column: Primary key column used as a tie-breaker
+        with_total: Also return a total count; see paginate_keyset
+
+    Returns:
+        Page: Current page
+    """
+    return paginate_keyset(
+        query,
+        sort_column,
+        id_column,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        with_total=with_total
+    )
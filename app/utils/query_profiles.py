@@ -0,0 +1,98 @@
+"""
+Query Loader Profiles
+Named eager-loading option sets for list pages, and a detector that reports
+views issuing too many lazy loads
+"""
+import logging
+from collections import Counter
+from flask import g, request, has_request_context, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.models import Enrollment, Payment, SupportTicket, TicketResponse
+
+logger = logging.getLogger(__name__)
+
+# Many-to-one relationships are joined in (safe with LIMIT); collections use
+# selectinload so rows are not multiplied. Built on use because backref
+# attributes only exist once the mappers are configured.
+LOADER_PROFILES = {
+    'enrollment_list': lambda: (
+        joinedload(Enrollment.student),
+        joinedload(Enrollment.course),
+    ),
+    'payment_list': lambda: (
+        joinedload(Payment.student),
+        joinedload(Payment.course),
+    ),
+    'ticket_list': lambda: (
+        joinedload(SupportTicket.student),
+        joinedload(SupportTicket.assigned_user),
+    ),
+    'ticket_detail': lambda: (
+        joinedload(SupportTicket.student),
+        joinedload(SupportTicket.assigned_user),
+        selectinload(SupportTicket.responses).joinedload(TicketResponse.user),
+    ),
+}
+
+
+def with_profile(query, name):
+    """
+    Attach a named loader profile to a query
+
+    Args:
+        query: SQLAlchemy ORM query
+        name: Key of LOADER_PROFILES
+
+    Returns:
+        Query: Query with the profile's loader options applied
+    """
+    return query.options(*LOADER_PROFILES[name]())
+
+
+class LazyLoadLimitExceeded(RuntimeError):
+    """Raised in strict mode when a view issues more lazy loads than allowed"""
+
+
+def _count_lazy_load(orm_execute_state):
+    if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None or not has_request_context():
+        return
+    if 'lazy_loads' not in g:
+        g.lazy_loads = Counter()
+    source = orm_execute_state.lazy_loaded_from.class_.__name__
+    target = orm_execute_state.bind_mapper.class_.__name__ if orm_execute_state.bind_mapper else '?'
+    g.lazy_loads[f'{source}->{target}'] += 1
+
+
+def _check_lazy_loads(response):
+    lazy_loads = g.pop('lazy_loads', None)
+    if not lazy_loads:
+        return response
+
+    total = sum(lazy_loads.values())
+    threshold = current_app.config.get('LAZY_LOAD_THRESHOLD', 10)
+    if total > threshold:
+        top = ', '.join(f'{name} x{count}' for name, count in lazy_loads.most_common(3))
+        message = f"{request.endpoint} issued {total} lazy loads (threshold {threshold}): {top}"
+        if current_app.config.get('LAZY_LOAD_STRICT', False):
+            raise LazyLoadLimitExceeded(message)
+        logger.warning(message)
+    return response
+
+
+def init_lazy_load_detector(app):
+    """
+    Count SQL-issuing lazy loads per request and log views above LAZY_LOAD_THRESHOLD
+
+    Enabled by LAZY_LOAD_DETECTOR, which defaults to on in debug and testing.
+    With LAZY_LOAD_STRICT the request fails instead, so regressions break tests.
+    """
+    enabled = app.config.get('LAZY_LOAD_DETECTOR')
+    if enabled is None:
+        enabled = app.debug or app.testing
+    if not enabled:
+        return
+
+    if not event.contains(Session, 'do_orm_execute', _count_lazy_load):
+        event.listen(Session, 'do_orm_execute', _count_lazy_load)
+    app.after_request(_check_lazy_loads)
@@ -0,0 +1,45 @@
+"""
+Shared SQLite Stores
+Base class for small stores kept in one SQLite file that every worker
+process on the host reads and writes
+"""
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    SQLite file shared by the worker processes on one host
+
+    Each thread of each process gets its own autocommit connection; a
+    connection inherited through fork is never reused. WAL mode lets
+    readers run alongside the single writer, and writers wait up to
+    TIMEOUT seconds for the lock. Subclasses list their CREATE statements
+    in SCHEMA.
+    """
+
+    SCHEMA = ()
+    TIMEOUT = 5
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def _connect(self):
+        """Connection for the calling thread, opened on first use in each process"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,183 @@
+"""
+Index Benchmark
+Shows query plans and timings for the hot lookup paths before and after
+the composite indexes are created.
+
+Usage:
+    python benchmarks/index_plans.py [--students 2000] [--courses 100] [--videos-per-course 40]
+
+Runs against a throwaway SQLite database unless --database-url is given.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from config import Config
+from app import create_app, db
+from app.models import User, Course, Video, Enrollment, Payment, StudyHistory, SupportTicket, OnlineClass
+from app.services import ensure_indexes
+
+HOT_QUERIES = {
+    'study_history by student+video': (
+        'SELECT * FROM study_history WHERE student_id = :student_id AND video_id = :video_id', {}
+    ),
+    'videos of a course in order': (
+        'SELECT * FROM video WHERE course_id = :course_id ORDER BY "order"', {}
+    ),
+    'completed revenue since date': (
+        "SELECT SUM(amount_npr) FROM payment WHERE status = 'completed' AND payment_date >= :since", {}
+    ),
+    'enrollments of a course': (
+        'SELECT COUNT(*) FROM enrollment WHERE course_id = :course_id', {}
+    ),
+    'open tickets newest first': (
+        "SELECT * FROM support_ticket WHERE status = 'open' ORDER BY created_at DESC LIMIT 20", {}
+    ),
+    'upcoming classes of a course': (
+        'SELECT * FROM online_class WHERE course_id = :course_id AND scheduled_at >= :since ORDER BY scheduled_at', {}
+    ),
+}
+
+
+def seed(students, courses, videos_per_course):
+    """Fill the database with synthetic data"""
+    now = datetime.utcnow()
+    faculty = User(username='bench_faculty', email='faculty@bench.local', password='x', role='faculty', full_name='Faculty')
+    db.session.add(faculty)
+    db.session.flush()
+
+    course_rows = []
+    for c in range(courses):
+        course_rows.append({'title': f'Course {c}', 'description': 'Benchmark course', 'price_npr': 1000,
+                            'instructor_id': faculty.id, 'created_at': now})
+    db.session.execute(Course.__table__.insert(), course_rows)
+    course_ids = [row[0] for row in db.session.execute(text('SELECT id FROM course'))]
+
+    video_rows = []
+    for course_id in course_ids:
+        for order in range(videos_per_course):
+            video_rows.append({'title': f'Video {order}', 'video_url': 'https://example.com/v.mp4',
+                               'course_id': course_id, 'order': order, 'created_at': now})
+    db.session.execute(Video.__table__.insert(), video_rows)
+    videos_by_course = {}
+    for video_id, course_id in db.session.execute(text('SELECT id, course_id FROM video')):
+        videos_by_course.setdefault(course_id, []).append(video_id)
+
+    user_rows = [{'username': f'student{s}', 'email': f'student{s}@bench.local', 'password': 'x',
+                  'role': 'student', 'full_name': f'Student {s}', 'created_at': now} for s in range(students)]
+    db.session.execute(User.__table__.insert(), user_rows)
+    student_ids = [row[0] for row in db.session.execute(text("SELECT id FROM \"user\" WHERE role = 'student'"))]
+
+    enrollment_rows, payment_rows, history_rows, ticket_rows = [], [], [], []
+    for student_id in student_ids:
+        for course_id in random.sample(course_ids, min(3, len(course_ids))):
+            paid_at = now - timedelta(days=random.randint(0, 365))
+            enrollment_rows.append({'student_id': student_id, 'course_id': course_id, 'enrollment_date': paid_at})
+            payment_rows.append({'student_id': student_id, 'course_id': course_id, 'amount_npr': 1000,
+                                 'status': random.choice(['completed', 'completed', 'pending', 'failed']),
+                                 'payment_date': paid_at, 'transaction_id': f'TXN-{student_id}-{course_id}'})
+            for video_id in videos_by_course[course_id][:random.randint(0, videos_per_course)]:
+                history_rows.append({'student_id': student_id, 'video_id': video_id, 'watch_duration': 60,
+                                     'completion_percentage': 100.0, 'is_completed': True, 'last_watched': paid_at})
+        ticket_rows.append({'student_id': student_id, 'title': 'Help', 'description': 'Benchmark ticket',
+                            'status': random.choice(['open', 'in_progress', 'closed']),
+                            'created_at': now - timedelta(days=random.randint(0, 365))})
+
+    db.session.execute(Enrollment.__table__.insert(), enrollment_rows)
+    db.session.execute(Payment.__table__.insert(), payment_rows)
+    db.session.execute(StudyHistory.__table__.insert(), history_rows)
+    db.session.execute(SupportTicket.__table__.insert(), ticket_rows)
+    db.session.execute(OnlineClass.__table__.insert(), [
+        {'course_id': course_id, 'title': 'Live', 'scheduled_at': now + timedelta(days=d), 'created_by': faculty.id}
+        for course_id in course_ids for d in range(-30, 30, 3)
+    ])
+    db.session.commit()
+    return student_ids, course_ids, videos_by_course
+
+
+def drop_declared_indexes():
+    """Drop the model-declared indexes to reproduce a pre-migration database"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in ('ix_user_username', 'ix_user_email'):
+                continue
+            index.drop(bind=db.engine, checkfirst=True)
+
+
+def explain(sql, params):
+    """Return the query plan as text"""
+    if db.engine.dialect.name == 'postgresql':
+        rows = db.session.execute(text(f'EXPLAIN {sql}'), params).fetchall()
+        return '\n'.join(f'    {row[0]}' for row in rows)
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+    return '\n'.join(f'    {row[-1]}' for row in rows)
+
+
+def time_query(sql, params_list):
+    """Average milliseconds per execution over params_list"""
+    start = time.perf_counter()
+    for params in params_list:
+        db.session.execute(text(sql), params).fetchall()
+    return (time.perf_counter() - start) * 1000 / len(params_list)
+
+
+def report(label, samples):
+    print(f'\n=== {label} ===')
+    for name, (sql, _) in HOT_QUERIES.items():
+        params_list = samples[name]
+        print(f'\n{name}: {time_query(sql, params_list):.3f} ms/query')
+        print(explain(sql, params_list[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to benchmark (default: temporary SQLite file)')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--courses', type=int, default=100)
+    parser.add_argument('--videos-per-course', type=int, default=40)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        PROGRESS_BUFFER_ENABLED = False
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        drop_declared_indexes()
+        student_ids, course_ids, videos_by_course = seed(args.students, args.courses, args.videos_per_course)
+
+        since = datetime.utcnow() - timedelta(days=90)
+        samples = {}
+        for name in HOT_QUERIES:
+            params_list = []
+            for _ in range(args.samples):
+                course_id = random.choice(course_ids)
+                params_list.append({
+                    'student_id': random.choice(student_ids),
+                    'video_id': random.choice(videos_by_course[course_id]),
+                    'course_id': course_id,
+                    'since': since
+                })
+            samples[name] = params_list
+
+        report('Before: primary keys and user.username/email only', samples)
+        created = ensure_indexes()
+        db.session.execute(text('ANALYZE'))
+        print(f'\nCreated indexes: {", ".join(created)}')
+        report('After: declared composite indexes', samples)
+
+
+if __name__ == '__main__':
+    main()
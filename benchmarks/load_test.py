@@ -0,0 +1,167 @@
+"""
+Server Load Test
+Starts the production server (gunicorn.conf.py) with increasing worker
+counts and measures throughput and latency of the public catalog pages.
+
+Usage:
+    python benchmarks/load_test.py [--workers 1 2 4] [--threads 4] [--clients 16] [--duration 10]
+
+Runs against a throwaway SQLite database unless --database-url is given.
+Throughput can only scale up to the number of CPU cores on the machine.
+"""
+import argparse
+import http.client
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+from app import create_app, db
+from app.models import User, Course
+from app.services import rebuild_search_index
+
+PATHS = ['/courses', '/courses?q=course', '/courses?q=python', '/courses?page=2']
+
+
+def seed(database_url, courses):
+    """Create the schema and a catalog of courses"""
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        PROGRESS_BUFFER_ENABLED = False
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        faculty = User(username='bench_faculty', email='faculty@bench.local', password='x', role='faculty', full_name='Faculty')
+        db.session.add(faculty)
+        db.session.flush()
+        topics = ['Python', 'Flask', 'SQL', 'Design', 'Networking', 'Statistics']
+        db.session.execute(Course.__table__.insert(), [
+            {'title': f'{random.choice(topics)} Course {c}', 'description': f'Benchmark course about {random.choice(topics)}',
+             'price_npr': 1000, 'instructor_id': faculty.id, 'created_at': datetime.utcnow()}
+            for c in range(courses)
+        ])
+        db.session.commit()
+        rebuild_search_index()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, timeout=30):
+    """Block until the server answers, or raise"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/courses')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start within {timeout}s')
+
+
+def start_server(database_url, workers, threads, port):
+    env = dict(os.environ,
+               DATABASE_URL=database_url,
+               FLASK_CONFIG='production',
+               SECRET_KEY='load-test',
+               METRICS_TOKEN='load-test',
+               WEB_WORKERS=str(workers),
+               WEB_THREADS=str(threads),
+               WEB_BIND=f'127.0.0.1:{port}',
+               WEB_ACCESS_LOG='/dev/null',
+               WEB_LOG_LEVEL='warning')
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                            cwd=ROOT, env=env)
+
+
+def client(port, stop, latencies, errors):
+    """Issue requests over one keep-alive connection until stopped"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            conn.request('GET', random.choice(PATHS))
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+
+
+def run_load(port, clients, duration):
+    """Drive the server with concurrent clients and return (latencies_ms, errors)"""
+    stop = threading.Event()
+    latencies, errors = [], []
+    pool = [threading.Thread(target=client, args=(port, stop, latencies, errors), daemon=True)
+            for _ in range(clients)]
+    for thread in pool:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in pool:
+        thread.join()
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to serve (default: temporary SQLite file)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--courses', type=int, default=500)
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+    seed(database_url, args.courses)
+    print(f'CPU cores: {os.cpu_count()}, clients: {args.clients}, threads per worker: {args.threads}')
+    print(f'{"workers":>8} {"req/s":>10} {"p50 ms":>8} {"p95 ms":>8} {"errors":>7}')
+
+    for workers in args.workers:
+        port = free_port()
+        server = start_server(database_url, workers, args.threads, port)
+        try:
+            wait_for_server(port)
+            run_load(port, args.clients, 1)  # warm up every worker
+            latencies, errors = run_load(port, args.clients, args.duration)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        print(f'{workers:>8} {len(latencies) / args.duration:>10.1f} {percentile(latencies, 0.5):>8.1f} '
+              f'{percentile(latencies, 0.95):>8.1f} {len(errors):>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Login Benchmark
+Measures logins per second through the password hashing pool, and the
+latency of a catalog page requested during the login burst.
+
+Usage:
+    python benchmarks/login_throughput.py [--concurrency 1 2 32] [--clients 8] [--duration 10]
+
+Each --concurrency value is a PASSWORD_HASH_CONCURRENCY setting; one at
+least --clients wide behaves like hashing inline on every request thread.
+Runs against a throwaway SQLite database.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+from config import Config
+from app import create_app, db
+from app.models import User
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def build_app(database_url, iterations, concurrency, clients):
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        PROGRESS_BUFFER_ENABLED = False
+        SESSION_BACKEND = 'memory'
+        PASSWORD_HASH_ITERATIONS = iterations
+        PASSWORD_HASH_CONCURRENCY = concurrency
+        PASSWORD_HASH_QUEUE = clients  # every client waits rather than getting a 503
+
+    return create_app(BenchmarkConfig)
+
+
+def seed(app, users, iterations):
+    """Create users sharing one password hash made at the given cost"""
+    password_hash = generate_password_hash('benchmark', f'pbkdf2:sha256:{iterations}')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'user{u}', 'email': f'user{u}@bench.local', 'password': password_hash,
+             'role': 'student', 'full_name': f'User {u}'}
+            for u in range(users)
+        ])
+        db.session.commit()
+
+
+def login_client(app, users, offset, stop, latencies, failures):
+    client = app.test_client()
+    n = offset
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = client.post('/login', data={'username': f'user{n % users}', 'password': 'benchmark'})
+        if response.status_code == 302:
+            latencies.append(time.perf_counter() - start)
+        else:
+            failures.append(response.status_code)
+        client.get('/logout')
+        n += 1
+
+
+def probe_client(app, stop, latencies):
+    client = app.test_client()
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.get('/courses')
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+
+
+def run(app, users, clients, duration):
+    stop = threading.Event()
+    logins, failures, probes = [], [], []
+    threads = [threading.Thread(target=login_client, args=(app, users, i * 7, stop, logins, failures))
+               for i in range(clients)]
+    threads.append(threading.Thread(target=probe_client, args=(app, stop, probes)))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return logins, failures, probes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 32])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=600000, help='PASSWORD_HASH_ITERATIONS')
+    parser.add_argument('--stored-iterations', type=int, help='Cost of the seeded hashes (default: --iterations); '
+                                                               'a different value measures rehash-on-login')
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'login.db')
+    print(f'CPU cores: {os.cpu_count()}, login clients: {args.clients}, iterations: {args.iterations}')
+    print(f'{"concurrency":>11} {"logins/s":>9} {"login p50":>10} {"login p95":>10} '
+          f'{"page p50":>9} {"page p95":>9} {"rehashed":>9}')
+
+    for concurrency in args.concurrency:
+        app = build_app(database_url, args.iterations, concurrency, args.clients)
+        seed(app, args.users, args.stored_iterations or args.iterations)
+        logins, failures, probes = run(app, args.users, args.clients, args.duration)
+        with app.app_context():
+            rehashed = User.query.filter(User.password.like(f'pbkdf2:sha256:{args.iterations}$%')).count()
+        if args.stored_iterations in (None, args.iterations):
+            rehashed = 0
+        print(f'{concurrency:>11} {len(logins) / args.duration:>9.1f} '
+              f'{percentile(logins, 0.5) * 1000:>8.0f}ms {percentile(logins, 0.95) * 1000:>8.0f}ms '
+              f'{percentile(probes, 0.5) * 1000:>7.0f}ms {percentile(probes, 0.95) * 1000:>7.0f}ms '
+              f'{rehashed:>9}' + (f'  ({len(failures)} failed)' if failures else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,14 +22,107 @@ class Config:
         'pool_pre_ping': True,
         'pool_recycle': 300,
     }
+    # Pool size and overflow are derived from these (see app/utils/database.py)
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS') or 100)  # across all server workers
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # seconds to wait for a free connection
+    SQLITE_WAL = (os.environ.get('SQLITE_WAL') or 'true').lower() == 'true'
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)  # milliseconds
+    # Read replicas (comma-separated URLs); read-only GET requests are spread across them
+    SQLALCHEMY_REPLICA_URLS = [url.strip() for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()]
+    DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS') or 5)  # primary-only reads after a write
+    
+    # Production server (gunicorn.conf.py)
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS') or (os.cpu_count() or 1) * 2 + 1)
+    WEB_THREADS = int(os.environ.get('WEB_THREADS') or 4)  # threads per worker
     
     # Upload settings
-    UPLOAD_FOLDER = 'static/uploads'
+    UPLOAD_FOLDER = 'static/uploads'  # public: images, thumbnails, certificates; relative to the project root
+    # Private media (uploaded videos, HLS renditions), served only through enrollment-checked routes;
+    # defaults to instance/media and must not be inside the static folder
+    MEDIA_FOLDER = os.environ.get('MEDIA_FOLDER')
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500 MB max file size
     ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm'}
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE') or 8 * 1024 * 1024)  # max bytes per chunk request
+    MAX_VIDEO_UPLOAD_SIZE = int(os.environ.get('MAX_VIDEO_UPLOAD_SIZE') or 500 * 1024 * 1024)  # whole file
+    UPLOAD_STALE_HOURS = int(os.environ.get('UPLOAD_STALE_HOURS') or 24)  # unfinished uploads purged after this
+    VIDEO_STREAM_MAX_AGE = int(os.environ.get('VIDEO_STREAM_MAX_AGE') or 3600)  # browser cache for streamed videos (seconds)
+    
+    # Video transcoding (run workers with `flask transcode-worker`)
+    FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY') or 'ffmpeg'
+    FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY') or 'ffprobe'
+    TRANSCODE_MAX_ATTEMPTS = int(os.environ.get('TRANSCODE_MAX_ATTEMPTS') or 3)
+    TRANSCODE_STALL_SECONDS = int(os.environ.get('TRANSCODE_STALL_SECONDS') or 600)  # requeue jobs without a heartbeat
+    TRANSCODE_POLL_INTERVAL = int(os.environ.get('TRANSCODE_POLL_INTERVAL') or 5)  # seconds between queue checks
+    
+    # Resized image derivatives (generated on first request into UPLOAD_FOLDER/thumbnails)
+    IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY') or 80)
+    IMAGE_MAX_SOURCE_BYTES = int(os.environ.get('IMAGE_MAX_SOURCE_BYTES') or 10 * 1024 * 1024)
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS') or 40000000)  # decompression bomb guard
+    IMAGE_FETCH_TIMEOUT = int(os.environ.get('IMAGE_FETCH_TIMEOUT') or 5)  # seconds, remote sources
+    IMAGE_SOURCE_TTL = int(os.environ.get('IMAGE_SOURCE_TTL') or 86400)  # seconds before a source is re-checked
+    
+    # Certificate PDFs (rendered into UPLOAD_FOLDER/certificates)
+    CERTIFICATE_RENDER_ASYNC = True  # issue and render after commit on a background thread
+    CERTIFICATE_WORKERS = int(os.environ.get('CERTIFICATE_WORKERS') or os.cpu_count() or 2)  # 0 renders in-thread
+    CERTIFICATE_BATCH_SIZE = int(os.environ.get('CERTIFICATE_BATCH_SIZE') or 200)
+    CERTIFICATE_ISSUER = os.environ.get('CERTIFICATE_ISSUER') or 'The Innovative Group'
+    CERTIFICATE_FONT_PATH = os.environ.get('CERTIFICATE_FONT_PATH')  # TTF for names outside Latin-1
+    
+    # Full-text search (PostgreSQL text search configuration for stemming)
+    SEARCH_TEXT_CONFIG = os.environ.get('SEARCH_TEXT_CONFIG') or 'english'
+    SEARCH_MAX_CANDIDATES = int(os.environ.get('SEARCH_MAX_CANDIDATES') or 2000)  # newest matches ranked per query
+    
+    # Server-side sessions: 'sqlite' (shared by workers), 'memory' (one process) or 'cookie' (signed cookie)
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or 'sqlite'
+    SESSION_STORE_PATH = os.environ.get('SESSION_STORE_PATH')  # defaults to instance/sessions.sqlite
+    SESSION_IDLE_TIMEOUT = int(os.environ.get('SESSION_IDLE_TIMEOUT') or 7 * 24 * 3600)  # seconds without a request
+    SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL') or 5)  # seconds a worker trusts its copy; bounds revocation delay
+    SESSION_CACHE_MAX_ENTRIES = int(os.environ.get('SESSION_CACHE_MAX_ENTRIES') or 10000)
+    
+    # Password hashing (pbkdf2:sha256); `flask calibrate-password-hash` suggests an iteration count
+    PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS') or 600000)  # older hashes upgrade on login
+    PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY') or 1)  # hashes running at once per worker
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE') or 16)  # waiting hashes before logins get a 503
     
     # Application settings
     ITEMS_PER_PAGE = 10
+    ROLE_CACHE_TTL = int(os.environ.get('ROLE_CACHE_TTL') or 30)  # seconds, 0 disables
+    ROLE_CACHE_MAX_ENTRIES = int(os.environ.get('ROLE_CACHE_MAX_ENTRIES') or 10000)  # users per worker
+    
+    # Video progress write-behind buffer
+    PROGRESS_BUFFER_ENABLED = True
+    PROGRESS_FLUSH_INTERVAL = int(os.environ.get('PROGRESS_FLUSH_INTERVAL') or 5)  # seconds
+    PROGRESS_FLUSH_BATCH_SIZE = int(os.environ.get('PROGRESS_FLUSH_BATCH_SIZE') or 500)
+    
+    # Dashboard statistics snapshot (seconds between full reconciliations, 0 disables)
+    DASHBOARD_STATS_RECONCILE_INTERVAL = int(os.environ.get('DASHBOARD_STATS_RECONCILE_INTERVAL') or 3600)
+    
+    # Report cube (seconds between incremental refreshes, 0 refreshes on every view)
+    REPORT_CUBE_REFRESH_INTERVAL = int(os.environ.get('REPORT_CUBE_REFRESH_INTERVAL') or 300)
+    # Seconds between full rebuilds, which also drop the facts of deleted rows
+    REPORT_CUBE_REBUILD_INTERVAL = int(os.environ.get('REPORT_CUBE_REBUILD_INTERVAL') or 86400)
+    
+    # Rendered fragment cache: 'lru' (per process), 'sqlite' (shared by workers) or 'none';
+    # unset picks 'sqlite' when WEB_WORKERS > 1, and 'lru' is refused there
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND')
+    FRAGMENT_CACHE_PATH = os.environ.get('FRAGMENT_CACHE_PATH')  # defaults to instance/fragment_cache.sqlite
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL') or 300)  # seconds
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES') or 512)
+    
+    # Lazy-load detector (None = on in debug and testing)
+    LAZY_LOAD_DETECTOR = None
+    LAZY_LOAD_THRESHOLD = int(os.environ.get('LAZY_LOAD_THRESHOLD') or 10)  # lazy loads per request
+    LAZY_LOAD_STRICT = False  # fail the request instead of logging
+    
+    # Request metrics served in Prometheus text format
+    METRICS_ENABLED = (os.environ.get('METRICS_ENABLED') or 'true').lower() == 'true'
+    METRICS_PATH = '/metrics'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # require 'Authorization: Bearer <token>' when set
+    METRICS_REQUIRE_TOKEN = False  # refuse to start without METRICS_TOKEN
+    # With WEB_WORKERS > 1, workers write their counters here every METRICS_FLUSH_INTERVAL seconds
+    METRICS_STORE_PATH = os.environ.get('METRICS_STORE_PATH')  # defaults to instance/metrics.sqlite
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 5)
+    SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SLOW_REQUEST_THRESHOLD_MS') or 1000)  # 0 disables the slow log
     
     # Currency settings
     CURRENCY_CODE = 'NPR'
@@ -60,15 +153,23 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
-    # Override with secure settings
-    # SECRET_KEY = os.environ.get('SECRET_KEY')
-    # SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    SESSION_COOKIE_SECURE = (os.environ.get('SESSION_COOKIE_SECURE') or 'false').lower() == 'true'  # behind HTTPS
+    METRICS_REQUIRE_TOKEN = True
 
 class TestingConfig(Config):
     """Testing configuration"""
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
+    PROGRESS_BUFFER_ENABLED = False  # write heartbeats synchronously
+    CERTIFICATE_RENDER_ASYNC = False  # render certificates in the committing thread
+    CERTIFICATE_WORKERS = 0
+    SESSION_BACKEND = 'memory'
+    PASSWORD_HASH_ITERATIONS = 1000  # fast logins in tests
+    WEB_WORKERS = 1  # tests run in one process
+    FRAGMENT_CACHE_BACKEND = 'lru'
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,48 @@
+"""
+Gunicorn Configuration
+Production server settings, read from the environment:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The application is imported once in the master and forked into the workers
+(preload_app), so workers start fast and share its memory. Signals:
+    HUP             reload this file and gracefully replace the workers
+    USR2, then QUIT to the old master
+                    start a new master with new code, then retire the old one
+    TERM            graceful shutdown, waiting up to graceful_timeout
+
+WEB_WORKERS and WEB_THREADS also size each worker's database pool
+(app/utils/database.py), so set them here rather than with -w/--threads.
+"""
+import os
+from config import Config
+
+bind = os.environ.get('WEB_BIND') or '0.0.0.0:5000'
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+
+timeout = int(os.environ.get('WEB_TIMEOUT') or 60)
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT') or 30)
+keepalive = int(os.environ.get('WEB_KEEPALIVE') or 5)
+# Recycle workers periodically so slow leaks cannot grow without bound
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS') or 2000)
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('WEB_ACCESS_LOG') or '-'
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL') or 'info'
+
+# Worker heartbeat files on tmpfs; a disk-backed /tmp can stall heartbeats
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def post_fork(server, worker):
+    """Give each worker its own database connections instead of the master's"""
+    from app import db
+
+    with worker.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
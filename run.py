@@ -1,6 +1,7 @@
 """
 Application Entry Point
-Run this file to start the Flask application
+Run this file to start the Flask development server; production uses
+wsgi.py with gunicorn (see gunicorn.conf.py)
 """
 from app import create_app, db
 from app.models import User, Course, Video, Enrollment, Payment
@@ -0,0 +1,71 @@
+"""
+Test Fixtures
+Application on a throwaway SQLite database with helpers to create users and log in
+"""
+import os
+import pytest
+from flask.testing import FlaskClient
+from werkzeug.security import generate_password_hash
+from config import TestingConfig
+from app import create_app, db
+from app.models import User
+from app.utils import decorators
+
+# Hashed once; tests log in through the session, not the password
+PASSWORD_HASH = generate_password_hash('password123')
+
+
+class Client(FlaskClient):
+    """Test client giving each request its own application context and g, as in production"""
+
+    def open(self, *args, **kwargs):
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Application with an empty schema; logs and uploads go under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_path, 'test.db')
+        MEDIA_FOLDER = os.path.join(tmp_path, 'media')
+
+    app = create_app(Config)
+    app.test_client_class = Client
+    # User ids restart in every test database, so no role may carry over
+    decorators._role_cache.clear()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user with the given role"""
+    def make(username, role='student'):
+        user = User(username=username, email=f'{username}@example.com', role=role,
+                    password=PASSWORD_HASH, full_name=username.title())
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def login(client):
+    """Log the test client in as a user"""
+    def log_in(user):
+        with client.session_transaction() as session:
+            session['user_id'] = user.id
+            session['role'] = user.role
+            session['username'] = user.username
+    return log_in
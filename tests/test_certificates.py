@@ -0,0 +1,44 @@
+"""
+Certificate file locations
+Certificate URLs must point into the static folder whatever directory the
+server was started from
+"""
+import os
+import pytest
+from config import TestingConfig
+from app import create_app, db
+from app.models import Certificate, Course
+from app.services.certificates import _certificate_folder, _static_url, issue_pending_certificates
+
+
+def test_upload_folder_is_resolved_from_the_project_root(app):
+    # The app fixture runs from a temporary working directory
+    assert os.getcwd() != os.path.dirname(app.root_path)
+    assert app.config['UPLOAD_FOLDER'] == os.path.join(os.path.abspath(app.static_folder), 'uploads')
+
+    path = os.path.join(_certificate_folder(), 'CERT-1.pdf')
+    assert _static_url(path) == '/static/uploads/certificates/CERT-1.pdf'
+
+
+def test_upload_folder_outside_static_is_refused(tmp_path):
+    class Config(TestingConfig):
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        MEDIA_FOLDER = str(tmp_path / 'media')
+
+    with pytest.raises(RuntimeError, match='UPLOAD_FOLDER'):
+        create_app(Config)
+
+
+def test_certificates_with_escaping_urls_are_rendered_again(app, make_user):
+    student = make_user('student')
+    instructor = make_user('instructor', role='faculty')
+    course = Course(title='Course', description='Test course', instructor_id=instructor.id, price_npr=0)
+    db.session.add(course)
+    db.session.flush()
+    broken = Certificate(student_id=student.id, course_id=course.id, certificate_number='CERT-1',
+                         certificate_url='/static/../../../tmp/static/uploads/certificates/CERT-1.pdf')
+    broken.pdf_generated_at = broken.issue_date
+    db.session.add(broken)
+    db.session.commit()
+
+    assert issue_pending_certificates() == [broken.id]
@@ -0,0 +1,107 @@
+"""
+Course completion
+Enrollment progress follows completed study history and the course's video
+count, and finishing a course issues its certificate
+"""
+import pytest
+from app import db
+from app.constants import EnrollmentStatus
+from app.models import Course, Enrollment, StudyHistory, Video
+from app.services import certificate_renderer
+
+
+@pytest.fixture
+def issued(monkeypatch):
+    """(student_id, course_id) pairs handed to the certificate renderer after commit"""
+    pairs = set()
+    monkeypatch.setattr(certificate_renderer, 'issue', pairs.update)
+    return pairs
+
+
+@pytest.fixture
+def course(make_user):
+    instructor = make_user('instructor', role='faculty')
+    course = Course(title='Course', description='Test course', instructor_id=instructor.id, price_npr=0)
+    db.session.add(course)
+    db.session.flush()
+    db.session.add_all([Video(course_id=course.id, title=f'Lecture {n}', video_url=f'https://example.com/{n}',
+                              order=n) for n in range(2)])
+    db.session.commit()
+    return course
+
+
+def complete(student, video):
+    db.session.add(StudyHistory(student_id=student.id, video_id=video.id, watch_duration=60,
+                                completion_percentage=100.0, is_completed=True))
+    db.session.commit()
+
+
+def reload(enrollment):
+    db.session.expire_all()
+    return db.session.get(Enrollment, enrollment.id)
+
+
+@pytest.fixture
+def completed_enrollment(make_user, course, issued):
+    student = make_user('student')
+    enrollment = Enrollment(student_id=student.id, course_id=course.id)
+    db.session.add(enrollment)
+    db.session.commit()
+    for video in course.videos:
+        complete(student, video)
+    return reload(enrollment)
+
+
+def test_finishing_every_video_completes_the_enrollment(make_user, course, issued):
+    student = make_user('student')
+    enrollment = Enrollment(student_id=student.id, course_id=course.id)
+    db.session.add(enrollment)
+    db.session.commit()
+    first, second = course.videos.order_by(Video.order)
+
+    complete(student, first)
+    enrollment = reload(enrollment)
+    assert enrollment.completion_percentage == 50.0
+    assert enrollment.status == EnrollmentStatus.ACTIVE
+    assert not issued
+
+    complete(student, second)
+    enrollment = reload(enrollment)
+    assert enrollment.completed_video_count == 2
+    assert enrollment.completion_percentage == 100.0
+    assert enrollment.status == EnrollmentStatus.COMPLETED
+    assert issued == {(student.id, course.id)}
+
+
+def test_adding_a_video_reopens_and_deleting_it_completes_again(course, completed_enrollment, issued):
+    assert completed_enrollment.status == EnrollmentStatus.COMPLETED
+    issued.clear()
+
+    video = Video(course_id=course.id, title='Bonus lecture', video_url='https://example.com/bonus', order=2)
+    db.session.add(video)
+    db.session.commit()
+    enrollment = reload(completed_enrollment)
+    assert enrollment.completion_percentage == pytest.approx(200 / 3)
+    assert enrollment.status == EnrollmentStatus.ACTIVE
+
+    db.session.delete(video)
+    db.session.commit()
+    enrollment = reload(enrollment)
+    assert enrollment.completion_percentage == 100.0
+    assert enrollment.status == EnrollmentStatus.COMPLETED
+    assert issued == {(enrollment.student_id, course.id)}
+
+
+def test_enrolling_counts_videos_completed_before(make_user, course, issued):
+    student = make_user('student')
+    for video in course.videos:
+        complete(student, video)
+
+    enrollment = Enrollment(student_id=student.id, course_id=course.id)
+    db.session.add(enrollment)
+    db.session.commit()
+
+    enrollment = reload(enrollment)
+    assert enrollment.completed_video_count == 2
+    assert enrollment.status == EnrollmentStatus.COMPLETED
+    assert issued == {(student.id, course.id)}
@@ -0,0 +1,57 @@
+"""
+Course detail page
+The student view must cost the same number of SQL statements however many
+videos the course has
+"""
+from app import db
+from app.models import Course, Enrollment, StudyHistory, Video
+
+
+def make_course(instructor, student, videos):
+    """Published course with videos, the student enrolled and half of them watched"""
+    course = Course(title=f'Course with {videos} videos', description='Test course',
+                    instructor_id=instructor.id, price_npr=0, is_published=True)
+    db.session.add(course)
+    db.session.flush()
+    rows = [Video(course_id=course.id, title=f'Lecture {n}', video_url=f'https://example.com/{n}', order=n)
+            for n in range(videos)]
+    db.session.add_all(rows)
+    db.session.add(Enrollment(student_id=student.id, course_id=course.id))
+    db.session.flush()
+    db.session.add_all([
+        StudyHistory(student_id=student.id, video_id=video.id, watch_duration=60,
+                     completion_percentage=100.0, is_completed=True)
+        for video in rows[::2]
+    ])
+    db.session.commit()
+    return course.id
+
+
+def statements_for(app, client, url, endpoint):
+    """SQL statements one request issued, from the request metrics"""
+    stats = app.extensions['request_metrics'].endpoints
+
+    def count():
+        return stats[endpoint].sql_statements if endpoint in stats else 0
+
+    before = count()
+    response = client.get(url)
+    assert response.status_code == 200
+    return count() - before
+
+
+def test_course_detail_query_count_is_constant(app, client, make_user, login):
+    instructor = make_user('instructor', role='faculty')
+    student = make_user('student')
+    small_course = make_course(instructor, student, 1)
+    large_course = make_course(instructor, student, 40)
+    login(student)
+
+    counts = {}
+    for course_id in (small_course, large_course):
+        url = f'/student/course/{course_id}'
+        client.get(url)  # warm per-process caches
+        counts[course_id] = statements_for(app, client, url, 'student.course_detail')
+
+    assert counts[small_course] > 0
+    assert counts[small_course] == counts[large_course]
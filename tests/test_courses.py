@@ -0,0 +1,51 @@
+"""
+Course catalog page
+Students get the cached course cards; admin and management get the stats
+and table view, which read fields of each course
+"""
+import pytest
+from app import db
+from app.models import Course
+
+
+@pytest.fixture
+def course(make_user):
+    instructor = make_user('instructor', role='faculty')
+    course = Course(title='Applied Statistics', description='Regression and sampling',
+                    instructor_id=instructor.id, price_npr=1500, is_published=True)
+    db.session.add(course)
+    db.session.commit()
+    return course
+
+
+@pytest.mark.parametrize('role', ['admin', 'management'])
+def test_courses_table_for_staff(client, make_user, login, course, role):
+    login(make_user(role, role=role))
+
+    response = client.get('/student/courses')
+
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'Total Enrollments' in body
+    assert f'<td>{course.id}</td>' in body
+    assert 'Applied Statistics' in body
+
+
+def test_courses_search_for_admin(client, make_user, login, course):
+    login(make_user('admin', role='admin'))
+
+    response = client.get('/student/courses?q=statistics')
+
+    assert response.status_code == 200
+    assert 'Applied Statistics' in response.get_data(as_text=True)
+
+
+def test_courses_cards_for_student(client, make_user, login, course):
+    login(make_user('student'))
+
+    response = client.get('/student/courses')
+
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'Applied Statistics' in body
+    assert 'Total Enrollments' not in body
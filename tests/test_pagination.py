@@ -0,0 +1,67 @@
+"""
+Keyset pagination
+Paging through rows with NULL and repeated timestamps must visit every row
+exactly once, forwards and backwards
+"""
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import User
+from app.utils.pagination import paginate_keyset
+
+PER_PAGE = 3
+
+
+@pytest.fixture
+def users(make_user):
+    """Users with distinct, repeated and NULL created_at values"""
+    base = datetime(2024, 1, 1)
+    stamps = [base, None, base + timedelta(days=1), base, None, base + timedelta(days=2),
+              base, None, base + timedelta(days=1), None, base + timedelta(days=3)]
+    users = [make_user(f'user{n}') for n in range(len(stamps))]
+    for user, stamp in zip(users, stamps):
+        db.session.execute(User.__table__.update().where(User.id == user.id).values(created_at=stamp))
+    db.session.commit()
+    # Newest first, ties broken by id, NULL timestamps last
+    ordered = sorted(zip(stamps, (user.id for user in users)),
+                     key=lambda row: (row[0] is not None, row[0] or base, row[1]), reverse=True)
+    return [row_id for _, row_id in ordered]
+
+
+def page(**cursors):
+    return paginate_keyset(User.query, User.created_at, User.id, per_page=PER_PAGE, **cursors)
+
+
+def test_forward_pages_visit_every_row_once(users):
+    seen = []
+    current = page()
+    while True:
+        seen.extend(user.id for user in current)
+        if not current.has_next:
+            break
+        current = page(after=current.next_cursor)
+
+    assert seen == users
+
+
+def test_backward_pages_visit_every_row_once(users):
+    current = page()
+    while current.has_next:
+        current = page(after=current.next_cursor)
+
+    pages = [[user.id for user in current]]
+    while current.has_prev:
+        current = page(before=current.prev_cursor)
+        pages.append([user.id for user in current])
+
+    assert [row_id for ids in reversed(pages) for row_id in ids] == users
+    assert all(len(ids) == PER_PAGE for ids in pages[1:])
+
+
+def test_total_only_when_requested(users):
+    assert page().total is None
+    assert page(after=page().next_cursor).total is None
+
+    counted = paginate_keyset(User.query, User.created_at, User.id, per_page=PER_PAGE, with_total=True)
+    assert counted.total == len(users)
+    assert counted.total_is_estimate is False
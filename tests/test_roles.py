@@ -0,0 +1,64 @@
+"""
+Role checks
+The per-worker role cache stays bounded, and a user whose role changes or
+who is deactivated loses their sessions and cached role at once
+"""
+import pytest
+from app import db
+from app.utils import decorators
+
+
+@pytest.fixture
+def admin_client(app, make_user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        admin = make_user('admin', role='admin')
+        session['user_id'] = admin.id
+        session['role'] = admin.role
+    return client
+
+
+def test_demoted_user_loses_access(client, admin_client, make_user, login):
+    manager = make_user('manager', role='management')
+    login(manager)
+    assert client.get('/management/tickets').status_code == 200
+    assert manager.id in decorators._role_cache
+
+    response = admin_client.post(f'/admin/management/remove/{manager.id}')
+    assert response.status_code == 302
+    assert manager.id not in decorators._role_cache
+
+    response = client.get('/management/tickets')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_deactivated_user_is_logged_out(client, admin_client, make_user, login):
+    student = make_user('student')
+    login(student)
+    assert client.get('/student/profile').status_code == 200
+
+    admin_client.post(f'/admin/user/{student.id}/toggle')
+
+    response = client.get('/student/profile')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_other_user_changes_keep_sessions(client, make_user, login):
+    student = make_user('student')
+    login(student)
+    student.full_name = 'Renamed Student'
+    db.session.commit()
+
+    assert client.get('/student/profile').status_code == 200
+
+
+def test_role_cache_is_bounded(app, monkeypatch):
+    monkeypatch.setattr(decorators, '_role_cache', type(decorators._role_cache)())
+    app.config['ROLE_CACHE_MAX_ENTRIES'] = 2
+
+    for user_id in (1, 2, 3):
+        decorators._cache_role(user_id, 'student')
+
+    assert list(decorators._role_cache) == [2, 3]
@@ -0,0 +1,16 @@
+"""
+Production WSGI Entry Point
+Served by gunicorn with the settings in gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+FLASK_CONFIG selects the configuration (production by default).
+"""
+import os
+from config import config
+from app import create_app
+
+app = create_app(config[os.environ.get('FLASK_CONFIG') or 'production'])
+
+if not os.environ.get('SECRET_KEY') and not app.debug:
+    app.logger.warning('SECRET_KEY is the development default; set SECRET_KEY in the environment')